@@ -0,0 +1,63 @@
+"""Times create_operation_plan on growing inputs to check that block parsing scales linearly.
+
+    python benchmarks/bench_block_parser.py [--sizes 1 2 4 8] [--repeat 3]
+
+For each input shape the time per megabyte should stay roughly flat as the input doubles.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from google_docs.markdown_parser import create_operation_plan
+
+def mixed_document(size: int) -> str:
+    """Headings, paragraphs, lists, tables, quotes and code, repeated to `size` bytes."""
+    section = (
+        "# Section heading\n\n"
+        "A paragraph with **bold**, *italic* and a [link](https://example.com).\n"
+        "It runs on over a second line.\n\n"
+        "- first item\n- second item\n\n- third item after a blank line\n\n"
+        "1. one\n2. two\n\n"
+        "| Name | Value |\n|------|-------|\n| a | 1 |\n| b | 2 |\n\n"
+        "> quoted text\n> more quoted text\n\n"
+        "```\ncode line\n```\n\n---\n\n"
+    )
+    return section * max(1, size // len(section))
+
+def spaced_list(size: int, blank_run: int = 200) -> str:
+    """One long list whose items are separated by long runs of blank lines."""
+    item = "- item\n" + "\n" * blank_run
+    return item * max(1, size // len(item))
+
+SHAPES = {
+    "mixed": mixed_document,
+    "spaced-list": spaced_list,
+}
+
+def time_parse(text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        create_operation_plan(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4, 8], help="Input sizes in megabytes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the fastest is reported.")
+    args = parser.parse_args()
+
+    print(f"{'shape':<12} {'MB':>6} {'seconds':>9} {'s/MB':>8}")
+    for name, make in SHAPES.items():
+        for megabytes in args.sizes:
+            text = make(int(megabytes * 1024 * 1024))
+            seconds = time_parse(text, args.repeat)
+            actual = len(text) / (1024 * 1024)
+            print(f"{name:<12} {actual:>6.2f} {seconds:>9.3f} {seconds / actual:>8.3f}")
+
+if __name__ == "__main__":
+    main()
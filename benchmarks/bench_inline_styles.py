@@ -0,0 +1,85 @@
+"""Times handle_inline_styles on the lines of test_data/, long Chinese paragraphs and unclosed links.
+
+    python benchmarks/bench_inline_styles.py [--repeat 5] [--baseline REV]
+
+--baseline loads markdown_parser.py as it was at a git revision and reports the speedup
+of the working tree over it, after checking that both produce the same requests.
+"""
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import time
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from google_docs import markdown_parser
+
+PARSER_PATH = 'src/google_docs/markdown_parser.py'
+
+def test_data_lines() -> list:
+    lines = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'test_data', '*.md'))):
+        with open(path, 'r') as f:
+            lines.extend(f.read().splitlines())
+    return lines
+
+def chinese_paragraphs(count: int = 200) -> list:
+    """Long CJK paragraphs with the occasional bold phrase, link, inline code and emoji."""
+    sentence = '本协议规定了客户端与服务器之间的数据交换格式，所有字段均采用网络字节序。'
+    styled = ('请参阅**接口说明**与[设计文档](https://example.com/design)，'
+              '调用 `sync()` 之前必须先完成*身份验证*。🚀')
+    return [(sentence * 6 + styled) * (1 + i % 4) for i in range(count)]
+
+def unclosed_markers(count: int = 20) -> list:
+    """Lines full of link openers that never close, which a backtracking matcher rescans."""
+    return ['中文[说明](' * 2000 for _ in range(count)]
+
+CORPORA = {
+    'test_data': test_data_lines,
+    'chinese': chinese_paragraphs,
+    'unclosed': unclosed_markers,
+}
+
+def load_baseline(revision: str):
+    source = subprocess.run(['git', 'show', f'{revision}:{PARSER_PATH}'], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    module = types.ModuleType('baseline_markdown_parser')
+    exec(compile(source, f'{revision}:{PARSER_PATH}', 'exec'), module.__dict__)
+    return module
+
+def time_lines(handle_inline_styles, lines: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for line in lines:
+            handle_inline_styles(line, 1)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per corpus; the fastest is reported.')
+    parser.add_argument('--baseline', help='Git revision to compare against, e.g. a commit before a parser change.')
+    args = parser.parse_args()
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    print(f"{'corpus':<10} {'lines':>6} {'chars':>9} {'ms':>9} {'baseline ms':>12} {'speedup':>8}")
+    for name, make in CORPORA.items():
+        lines = make()
+        chars = sum(len(line) for line in lines)
+        seconds = time_lines(markdown_parser.handle_inline_styles, lines, args.repeat)
+        row = f"{name:<10} {len(lines):>6} {chars:>9} {seconds * 1000:>9.2f}"
+        if baseline:
+            for line in lines:
+                if baseline.handle_inline_styles(line, 1) != markdown_parser.handle_inline_styles(line, 1):
+                    sys.exit(f"Requests differ from {args.baseline} for line: {line!r}")
+            baseline_seconds = time_lines(baseline.handle_inline_styles, lines, args.repeat)
+            row += f" {baseline_seconds * 1000:>12.2f} {baseline_seconds / seconds:>7.2f}x"
+        print(row)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Times compiling the test_data/ documents with and without the plan cache.
+
+    python benchmarks/bench_plan_cache.py [--rounds 200]
+
+Each round compiles every document at a different start index, as the MCP server does when
+the same sections are written into different documents. The cold run clears the cache
+before every round; the warm run keeps it, so only the first round compiles.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from google_docs import markdown_parser
+from google_docs.content_installer import compile_operation_plan
+from google_docs.plan_cache import configure_plan_cache, get_plan_cache, plan_cache_stats
+
+def load_plans() -> list:
+    plans = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'test_data', '*.md'))):
+        with open(path, 'r') as f:
+            plans.append(markdown_parser.create_operation_plan(f.read()))
+    return plans
+
+def run(plans: list, rounds: int, warm: bool) -> float:
+    configure_plan_cache(get_plan_cache().max_entries)
+    started = time.perf_counter()
+    for start_index in range(1, rounds + 1):
+        if not warm:
+            get_plan_cache().clear()
+        for plan in plans:
+            compile_operation_plan(plan, start_index)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200, help='Times every document is compiled.')
+    args = parser.parse_args()
+    plans = load_plans()
+
+    cold = run(plans, args.rounds, warm=False)
+    warm = run(plans, args.rounds, warm=True)
+    print(f"cold: {cold * 1000 / args.rounds:.2f} ms per round")
+    print(f"warm: {warm * 1000 / args.rounds:.2f} ms per round ({cold / warm:.2f}x)")
+    print(f"warm cache: {plan_cache_stats()}")
+
+if __name__ == '__main__':
+    main()
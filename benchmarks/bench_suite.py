@@ -0,0 +1,200 @@
+"""Times parsing, compiling and every write path on the synthetic corpus and compares with a baseline.
+
+    python benchmarks/bench_suite.py [--sizes small medium] [--cases parse append ...] [--repeat 3]
+                                     [--latency 0] [--baseline benchmarks/baseline.json] [--save_baseline] [--check]
+
+Parser and compiler cases call create_operation_plan, handle_inline_styles, get_list_requests
+and compile_operation_plan (with a cold plan cache) directly. Write cases run install_content,
+append_to_google_doc, replace_markdown_placeholders and update_google_doc against the
+in-memory emulator, each on a fresh workspace prepared outside the timing. For every case
+the fastest run is reported with:
+
+    ms        wall time
+    client_ms wall time minus the time spent inside emulated API calls
+    calls     HTTP round trips
+    requests  batchUpdate requests sent
+    bytes     JSON payload sent
+
+client_ms is compared with the baseline, as it does not depend on the emulator's own speed or
+on --latency; any increase in calls, requests or bytes is reported as well. With --check the
+script exits with status 1 if anything regressed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from corpus import SIZES, generate
+from google_docs import append_to_google_doc, install_content, replace_markdown_placeholders, update_google_doc
+from google_docs.content_installer import compile_operation_plan
+from google_docs.markdown_parser import create_operation_plan, get_list_requests, handle_inline_styles
+from google_docs.plan_cache import configure_plan_cache, get_plan_cache
+from google_emulator import EmulatorState, FakeWorkspace
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+COUNTERS = ('calls', 'requests', 'bytes')
+# Growth of client_ms below this many milliseconds is timer noise, never a regression.
+MIN_REGRESSION_MS = 1.0
+# Number of {{partN}} placeholders the replace case fills.
+REPLACE_PARTS = 8
+
+def _blocks(text: str) -> list:
+    return [block for block in text.split('\n\n') if block.strip()]
+
+def _edited(text: str) -> str:
+    """text with every tenth block changed, as a typical overwrite would."""
+    blocks = _blocks(text)
+    return '\n\n'.join(block + ' (edited)' if i % 10 == 5 else block for i, block in enumerate(blocks)) + '\n'
+
+def _parts(text: str) -> dict:
+    """Splits text into REPLACE_PARTS runs of whole blocks, keyed by placeholder."""
+    blocks = _blocks(text)
+    size = -(-len(blocks) // REPLACE_PARTS)
+    return {f'{{{{part{i}}}}}': '\n\n'.join(blocks[start:start + size])
+            for i, start in enumerate(range(0, len(blocks), size))}
+
+def _document(workspace: FakeWorkspace, text: str = None) -> str:
+    document_id = workspace.new_document()
+    if text:
+        workspace.document(document_id).apply([{'insertText': {'location': {'index': 1}, 'text': text}}])
+    return document_id
+
+def _inline(text: str):
+    lines = [line for line in text.splitlines() if line.strip()]
+    return lambda: [handle_inline_styles(line, 1) for line in lines]
+
+def _lists(text: str):
+    lists = [operation for operation in create_operation_plan(text) if operation['type'] == 'list']
+    return lambda: [get_list_requests(operation['lines'], operation['list_type'], 1) for operation in lists]
+
+def _compile(text: str):
+    plan = create_operation_plan(text)
+    return lambda: compile_operation_plan(plan, 1)
+
+def _install(workspace: FakeWorkspace, docs, text: str):
+    document_id = _document(workspace)
+    return lambda: install_content(docs, document_id, text, 1)
+
+def _append(workspace: FakeWorkspace, docs, text: str):
+    document_id = _document(workspace, 'Existing introduction\n')
+    return lambda: append_to_google_doc(docs, document_id, text)
+
+def _replace(workspace: FakeWorkspace, docs, text: str):
+    parts = _parts(text)
+    document_id = _document(workspace, ''.join(f'Section {i}: {key}\n' for i, key in enumerate(parts)))
+    return lambda: replace_markdown_placeholders(docs, document_id, parts)
+
+def _overwrite(workspace: FakeWorkspace, docs, text: str):
+    document_id = _document(workspace)
+    update_google_doc(docs, document_id, text)
+    edited = _edited(text)
+    return lambda: update_google_doc(docs, document_id, edited)
+
+# Parser and compiler cases: setup(text) returns the function to time.
+MICRO_CASES = {
+    'parse': lambda text: lambda: create_operation_plan(text),
+    'inline': _inline,
+    'lists': _lists,
+    'compile': _compile,
+}
+
+# Write cases: setup(workspace, docs, text) prepares a document and returns the function to time.
+WRITE_CASES = {
+    'install': _install,
+    'append': _append,
+    'replace': _replace,
+    'overwrite': _overwrite,
+}
+
+def run_case(name: str, text: str, repeat: int, latency: float) -> dict:
+    best = None
+    for _ in range(repeat):
+        workspace = FakeWorkspace(EmulatorState(latency=latency))
+        if name in MICRO_CASES:
+            run = MICRO_CASES[name](text)
+        else:
+            run = WRITE_CASES[name](workspace, workspace.services()['docs'], text)
+            workspace.state.reset_log()
+        # Every run compiles from a cold plan cache.
+        configure_plan_cache(get_plan_cache().max_entries)
+        started = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - started
+        if isinstance(result, dict) and result.get('status') != 'success':
+            raise RuntimeError(f"{name} failed: {result.get('message')}")
+        calls = workspace.state.calls
+        measured = {
+            'ms': round(seconds * 1000, 2),
+            'client_ms': round((seconds - sum(call['seconds'] for call in calls)) * 1000, 2),
+            'calls': workspace.state.count(),
+            'requests': sum(call['requests'] for call in calls),
+            'bytes': sum(call['payload_bytes'] for call in calls),
+        }
+        if best is None or measured['ms'] < best['ms']:
+            best = measured
+    return best
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Describes every way current is worse than baseline; client_ms may grow by tolerance."""
+    problems = []
+    growth = current['client_ms'] - baseline['client_ms']
+    if growth > baseline['client_ms'] * tolerance and growth > MIN_REGRESSION_MS:
+        problems.append(f"client_ms {baseline['client_ms']} -> {current['client_ms']}")
+    for counter in COUNTERS:
+        if current[counter] > baseline[counter]:
+            problems.append(f"{counter} {baseline[counter]} -> {current[counter]}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cases = list(MICRO_CASES) + list(WRITE_CASES)
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=['small', 'medium'], help='Corpus sizes to run.')
+    parser.add_argument('--cases', nargs='+', choices=cases, default=cases)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is reported.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each emulated API call takes.')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus seed; baselines are only comparable for the same seed.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON file of earlier results.')
+    parser.add_argument('--save_baseline', action='store_true', help='Store these results as the baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative growth of client_ms.')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if any case regressed.')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = 0
+    print(f"{'case':<10} {'size':<7} {'ms':>9} {'client_ms':>10} {'calls':>6} {'requests':>9} {'bytes':>10}  baseline")
+    for size in args.sizes:
+        text = generate(SIZES[size], args.seed)
+        for name in args.cases:
+            key = f'{name}/{size}'
+            result = run_case(name, text, args.repeat, args.latency)
+            results[key] = result
+            if key not in baseline:
+                verdict = '-'
+            else:
+                problems = compare(result, baseline[key], args.tolerance)
+                regressions += bool(problems)
+                change = result['client_ms'] / baseline[key]['client_ms'] if baseline[key]['client_ms'] else 1.0
+                verdict = f"{change:.2f}x" + (f" REGRESSED: {', '.join(problems)}" if problems else '')
+            print(f"{name:<10} {size:<7} {result['ms']:>9.2f} {result['client_ms']:>10.2f} {result['calls']:>6} "
+                  f"{result['requests']:>9} {result['bytes']:>10}  {verdict}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(baseline, **results), f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} results to {args.baseline}")
+    if args.check and regressions:
+        print(f"{regressions} case(s) regressed.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Generates synthetic markdown for the benchmarks, or writes it to files.
+
+    python benchmarks/corpus.py OUTPUT_DIR [--sizes small medium large] [--seed 0]
+
+Documents mix headings, English and Chinese paragraphs with inline styles and emoji,
+nested bulleted and numbered lists, tables, code blocks, quotes and rules, in fixed
+proportions. The same size and seed always give the same text.
+"""
+import argparse
+import os
+import random
+
+# Approximate document sizes in bytes of UTF-8.
+SIZES = {
+    'small': 8 * 1024,
+    'medium': 64 * 1024,
+    'large': 512 * 1024,
+}
+
+WORDS = ('request', 'document', 'index', 'batch', 'style', 'paragraph', 'table', 'quota', 'latency',
+         'revision', 'header', 'range', 'segment', 'client', 'server', 'payload', 'token', 'cache')
+CJK_PHRASES = ('本协议规定了数据交换格式', '所有字段均采用网络字节序', '客户端必须先完成身份验证', '服务器按修订版本处理请求',
+               '表格单元格支持行内样式', '列表可以多级嵌套', '引用块保留原有换行', '代码块使用等宽字体')
+EMOJI = ('🚀', '📄', '✅', '😀', '🔧')
+CODE_LINES = ('def handler(request):', '    result = compile(request)', '    if not result:', '        return None',
+              '    # 返回编译后的请求', '    return optimize(result)')
+
+def _words(rng: random.Random, count: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+def _styled(rng: random.Random, text: str) -> str:
+    """Wraps a few words of text in bold, italic, code or link markup."""
+    words = text.split(' ')
+    for _ in range(rng.randint(0, 3)):
+        position = rng.randrange(len(words))
+        style = rng.choice(('**{}**', '*{}*', '`{}`', '[{}](https://example.com/{})'))
+        words[position] = style.format(words[position], position)
+    return ' '.join(words)
+
+def paragraph(rng: random.Random) -> str:
+    if rng.random() < 0.4:
+        text = '，'.join(rng.choice(CJK_PHRASES) for _ in range(rng.randint(2, 6))) + '。'
+        if rng.random() < 0.5:
+            text += f"请参阅**{rng.choice(CJK_PHRASES)}**{rng.choice(EMOJI)}"
+        return text
+    return _styled(rng, _words(rng, rng.randint(12, 60)).capitalize()) + '.'
+
+def nested_list(rng: random.Random) -> str:
+    lines = []
+    level = 0
+    for _ in range(rng.randint(3, 12)):
+        level = max(0, min(level + rng.choice((-1, 0, 0, 1)), 2))
+        marker = '-' if rng.random() < 0.6 else f'{rng.randint(1, 9)}.'
+        text = rng.choice(CJK_PHRASES) if rng.random() < 0.3 else _styled(rng, _words(rng, rng.randint(3, 10)))
+        lines.append(f"{'  ' * level}{marker} {text}")
+    return '\n'.join(lines)
+
+def table(rng: random.Random) -> str:
+    columns = rng.randint(2, 5)
+    rows = [' | '.join(_words(rng, 1).capitalize() for _ in range(columns))]
+    rows.append(' | '.join('---' for _ in range(columns)))
+    for _ in range(rng.randint(2, 8)):
+        rows.append(' | '.join(rng.choice(CJK_PHRASES) if rng.random() < 0.3 else _styled(rng, _words(rng, rng.randint(1, 4)))
+                               for _ in range(columns)))
+    return '\n'.join(f'| {row} |' for row in rows)
+
+def code_block(rng: random.Random) -> str:
+    return '```\n' + '\n'.join(rng.choice(CODE_LINES) for _ in range(rng.randint(3, 15))) + '\n```'
+
+def quote(rng: random.Random) -> str:
+    return '\n'.join(f'> {paragraph(rng)}' for _ in range(rng.randint(1, 4)))
+
+def heading(rng: random.Random) -> str:
+    title = rng.choice(CJK_PHRASES) if rng.random() < 0.3 else _words(rng, rng.randint(2, 5)).title()
+    return f"{'#' * rng.randint(1, 4)} {title}"
+
+# Relative frequency of each kind of block.
+BLOCKS = (
+    (paragraph, 10),
+    (heading, 3),
+    (nested_list, 4),
+    (table, 2),
+    (code_block, 2),
+    (quote, 2),
+    (lambda rng: '---', 1),
+)
+
+def generate(size: int, seed: int = 0) -> str:
+    """Markdown of about size bytes; blocks are separated by blank lines."""
+    rng = random.Random(seed)
+    makers = [maker for maker, weight in BLOCKS for _ in range(weight)]
+    blocks = []
+    total = 0
+    while total < size:
+        block = rng.choice(makers)(rng)
+        blocks.append(block)
+        total += len(block.encode('utf-8')) + 2
+    return '\n\n'.join(blocks) + '\n'
+
+def corpus(names=tuple(SIZES), seed: int = 0) -> dict:
+    """Maps each size name to its generated document."""
+    return {name: generate(SIZES[name], seed) for name in names}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output_dir')
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=list(SIZES))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, text in corpus(args.sizes, args.seed).items():
+        path = os.path.join(args.output_dir, f'{name}.md')
+        with open(path, 'w') as f:
+            f.write(text)
+        print(f"{path}: {len(text.encode('utf-8'))} bytes")
+
+if __name__ == '__main__':
+    main()
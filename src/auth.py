@@ -1,39 +1,105 @@
-import os
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import threading
+from collections.abc import Mapping
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials as ServiceAccountCredentials
+from quota import QuotaAwareHttpRequest
+from token_manager import get_credential_manager
+from transport import authorized_http
 
 # Define the scope of permissions we are requesting
 SCOPES = ["https://www.googleapis.com/auth/documents", "https://www.googleapis.com/auth/presentations", "https://www.googleapis.com/auth/drive.file"]
 
+API_VERSIONS = {"docs": "v1", "slides": "v1", "drive": "v3"}
+
+def get_oauth_credentials(client_secrets_path: str, token_path: str = "token.json"):
+    """Returns valid user credentials from the process-wide manager for token_path.
+
+    The token is refreshed, or the OAuth 2.0 flow is run, only when needed, under a file
+    lock shared with other processes using the same token file.
+    """
+    return get_credential_manager(client_secrets_path, token_path, SCOPES).credentials()
+
+def build_service(name: str, creds):
+    """Builds one API client from the discovery document bundled with google-api-python-client.
+
+    All clients share the process-wide pooled transport, so they can be used from several threads.
+    """
+    return build(name, API_VERSIONS[name], http=authorized_http(creds), requestBuilder=QuotaAwareHttpRequest,
+                 static_discovery=True, cache_discovery=False)
+
 def get_services_with_oauth(client_secrets_path: str, token_path: str = "token.json"):
     """Handles the OAuth 2.0 flow and returns authorized service objects for Docs, Slides and Drive."""
-    creds = None
-    if os.path.exists(token_path):
-        creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_path, SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        with open(token_path, 'w') as token:
-            token.write(creds.to_json())
-            print(f"OAuth token has been saved to {token_path} for future use.")
-            
-    docs_service = build("docs", "v1", credentials=creds)
-    slides_service = build("slides", "v1", credentials=creds)
-    drive_service = build("drive", "v3", credentials=creds)
-    return {"docs": docs_service, "slides": slides_service, "drive": drive_service}
+    creds = get_oauth_credentials(client_secrets_path, token_path)
+    return {name: build_service(name, creds) for name in API_VERSIONS}
 
 def get_services_with_service_account(sa_file_path: str):
-    """Handles Service Account authentication and returns authorized service objects for Docs, Slides and Drive."""
-    creds = ServiceAccountCredentials.from_service_account_file(sa_file_path, scopes=SCOPES)
-    docs_service = build("docs", "v1", credentials=creds)
-    slides_service = build("slides", "v1", credentials=creds)
-    drive_service = build("drive", "v3", credentials=creds)
-    return {"docs": docs_service, "slides": slides_service, "drive": drive_service}
+    """Handles Service Account authentication and returns authorized service objects for Docs, Slides and Drive.
+
+    Requests are authorized with self-signed JWTs, so no call to the OAuth token endpoint is needed.
+    """
+    creds = ServiceAccountCredentials.from_service_account_file(sa_file_path, scopes=SCOPES, always_use_jwt_access=True)
+    return {name: build_service(name, creds) for name in API_VERSIONS}
+
+class ServiceRegistry:
+    """Process-lifetime cache of API clients.
+
+    Credentials are loaded on first use and each service is built the first time it is
+    asked for. Everything is dropped and rebuilt only when `fingerprint()` changes, e.g.
+    because the credentials now belong to a different grant.
+    """
+
+    def __init__(self, credentials_loader, fingerprint=None):
+        self._credentials_loader = credentials_loader
+        self._fingerprint = fingerprint or (lambda: None)
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._key = None
+        self._services = {}
+        self.builds = 0
+
+    def get(self, name: str):
+        with self._lock:
+            if self._credentials is None or self._fingerprint() != self._key:
+                self._credentials = self._credentials_loader()
+                # Taken after loading, so a token the loader itself saves does not look like a change.
+                self._key = self._fingerprint()
+                self._services = {}
+            if name not in self._services:
+                self._services[name] = build_service(name, self._credentials)
+                self.builds += 1
+            return self._services[name]
+
+    def invalidate(self):
+        with self._lock:
+            self._credentials = None
+            self._services = {}
+
+    def services(self) -> "LazyServices":
+        return LazyServices(self)
+
+class LazyServices(Mapping):
+    """The {"docs", "slides", "drive"} services dict, with each client built on first access."""
+
+    def __init__(self, registry: ServiceRegistry):
+        self._registry = registry
+
+    def __getitem__(self, name: str):
+        if name not in API_VERSIONS:
+            raise KeyError(name)
+        return self._registry.get(name)
+
+    def __iter__(self):
+        return iter(API_VERSIONS)
+
+    def __len__(self):
+        return len(API_VERSIONS)
+
+def oauth_service_registry(client_secrets_path: str, token_path: str) -> ServiceRegistry:
+    """A ServiceRegistry for OAuth user credentials, refreshed in the background.
+
+    Access-token refreshes update the credentials in place; services are rebuilt only when
+    the token file starts holding a different grant.
+    """
+    manager = get_credential_manager(client_secrets_path, token_path, SCOPES)
+    manager.start()
+    return ServiceRegistry(manager.credentials, lambda: manager.identity)
@@ -1,15 +1,29 @@
 import argparse
+import glob
+import json
 import os
+import signal
+import threading
+import time
 from auth import get_services_with_oauth, get_services_with_service_account
-from google_docs import append_to_google_doc, clear_google_doc, write_to_google_doc, replace_markdown_placeholders, read_google_doc
+from google_emulator import get_services_with_emulator
+from google_docs import append_to_google_doc, clear_google_doc, write_to_google_doc, write_many_to_google_docs, replace_markdown_placeholders, read_google_doc, RevisionTracker
+from google_docs.follow import FOLLOW_FLUSH_BYTES, FOLLOW_FLUSH_INTERVAL, follow_file
+from google_docs.markdown_parser import iter_file_lines
+from google_docs.operations import MAX_CHUNK_BYTES, MAX_CHUNK_REQUESTS
 from google_slider import create_presentation_from_markdown
+from quota import count_calls, quota_stats
 
 def main():
     parser = argparse.ArgumentParser(description="Google Office Tool CLI")
-    parser.add_argument("--auth_method", choices=["oauth", "service_account"], default="oauth", help="Authentication method")
+    parser.add_argument("--auth_method", choices=["oauth", "service_account", "emulator"], default="oauth",
+                        help="Authentication method; emulator runs against in-memory fakes of the Google APIs, without credentials")
     parser.add_argument("--creds_path", default="credentials/oauth-credentials.json", help="Path to credentials file")
     parser.add_argument("--token_path", default="credentials/token.json", help="Path to token file")
     parser.add_argument("--sa_path", default="credentials/docs-writer-credentials.json", help="Path to service account file")
+    parser.add_argument("--poll_consistency", action="store_true", help="After each write, poll the document revision with backoff until reads observe it")
+    parser.add_argument("--max_batch_requests", type=int, default=MAX_CHUNK_REQUESTS, help="Maximum number of requests sent in one batchUpdate call")
+    parser.add_argument("--max_batch_bytes", type=int, default=MAX_CHUNK_BYTES, help="Maximum payload size in bytes of one batchUpdate call")
 
     subparsers = parser.add_subparsers(dest="tool")
 
@@ -24,19 +38,35 @@ def main():
     write_parser.add_argument("--folder_id")
     write_parser.add_argument("--header_image", help="Path to local image file to add as header")
     write_parser.add_argument("--no-header", action="store_true", help="Do not add a header image")
+    write_parser.add_argument("--stream", action="store_true", help="Read, compile and send the file piece by piece with bounded memory")
+    write_parser.add_argument("--diff", action="store_true", help="With --doc_id, rewrite only the blocks that changed instead of clearing the document; "
+                              "without it, tag the blocks of the new document so later --diff writes are incremental")
+
+    write_many_parser = docs_subparsers.add_parser("write-many", help="Create one document per markdown file, writing several at once")
+    write_many_parser.add_argument("source", help="Directory (searched recursively for *.md) or glob pattern")
+    write_many_parser.add_argument("--folder_id")
+    write_many_parser.add_argument("--workers", type=int, default=8, help="Number of documents written at the same time")
+    write_many_parser.add_argument("--header_image", help="Path to local image file to add as header")
+    write_many_parser.add_argument("--no-header", action="store_true", help="Do not add a header image")
 
     append_parser = docs_subparsers.add_parser("append")
     append_parser.add_argument("doc_id")
     append_parser.add_argument("text", nargs="?")
     append_parser.add_argument("--file", help="Path to a markdown file to append")
+    append_parser.add_argument("--stream", action="store_true", help="With --file, read, compile and send the file piece by piece with bounded memory")
+    append_parser.add_argument("--follow", metavar="FILE", help="Keep running and append whatever is written to FILE, like tail -f")
+    append_parser.add_argument("--from_start", action="store_true", help="With --follow, append the file's existing content first")
+    append_parser.add_argument("--flush_interval", type=float, default=FOLLOW_FLUSH_INTERVAL, help="With --follow, seconds between appends of new content")
+    append_parser.add_argument("--flush_bytes", type=int, default=FOLLOW_FLUSH_BYTES, help="With --follow, append as soon as this many bytes are waiting")
 
     clear_parser = docs_subparsers.add_parser("clear")
     clear_parser.add_argument("doc_id")
 
     replace_parser = docs_subparsers.add_parser("replace")
     replace_parser.add_argument("doc_id")
-    replace_parser.add_argument("placeholder")
-    replace_parser.add_argument("markdown_or_text")
+    replace_parser.add_argument("placeholder", nargs="?")
+    replace_parser.add_argument("markdown_or_text", nargs="?")
+    replace_parser.add_argument("--map", help="Path to a JSON file mapping each placeholder to markdown text or a markdown file path")
 
     read_parser = docs_subparsers.add_parser("read")
     read_parser.add_argument("doc_id")
@@ -55,14 +85,15 @@ def main():
 
     if args.auth_method == "oauth":
         services = get_services_with_oauth(args.creds_path, args.token_path)
+    elif args.auth_method == "emulator":
+        services = get_services_with_emulator()
     else:
         services = get_services_with_service_account(args.sa_path)
 
     if args.tool == "docs":
+        revision_tracker = RevisionTracker(poll=args.poll_consistency, max_chunk_requests=args.max_batch_requests,
+                                           max_chunk_bytes=args.max_batch_bytes)
         if args.command == "write":
-            with open(args.markdown_file, "r") as f:
-                content = f.read()
-            
             header_image_path = None
             if args.no_header:
                 header_image_path = None
@@ -75,16 +106,72 @@ def main():
                 if os.path.exists(default_logo):
                     header_image_path = default_logo
             
-            result = write_to_google_doc(services["docs"], services["drive"], content, args.title, args.doc_id, args.folder_id, header_image_path)
+            if args.diff and args.stream:
+                print("--diff cannot be combined with --stream")
+                return
+            with open(args.markdown_file, "r") as f:
+                content = iter_file_lines(f) if args.stream else f.read()
+                result = write_to_google_doc(services["docs"], services["drive"], content, args.title, args.doc_id, args.folder_id, header_image_path, revision_tracker,
+                                             incremental=args.diff)
             if result["status"] == "success":
                 print(f"Successfully created and wrote to document: https://docs.google.com/document/d/{result['document_id']}")
                 print(f"Document ID: {result['document_id']}")
+                if "blocks" in result:
+                    blocks = result["blocks"]
+                    print(f"Blocks kept: {blocks['kept']}, deleted: {blocks['deleted']}, inserted: {blocks['inserted']}")
             else:
                 print(f"An error occurred: {result['message']}")
+        elif args.command == "write-many":
+            if os.path.isdir(args.source):
+                markdown_paths = sorted(glob.glob(os.path.join(args.source, "**", "*.md"), recursive=True))
+            else:
+                markdown_paths = sorted(glob.glob(args.source, recursive=True))
+            if not markdown_paths:
+                print(f"No markdown files found for {args.source}")
+                return
+
+            header_image_path = None
+            if args.header_image:
+                header_image_path = args.header_image
+            elif not args.no_header:
+                base_dir = os.path.dirname(os.path.abspath(__file__))
+                default_logo = os.path.join(base_dir, "assets", "default_header_logo.png")
+                if os.path.exists(default_logo):
+                    header_image_path = default_logo
+
+            started = time.perf_counter()
+            calls_before = quota_stats()["calls"]
+            results = []
+            for result in write_many_to_google_docs(services["docs"], services["drive"], markdown_paths, args.folder_id,
+                                                    header_image_path, args.workers, call_counter=count_calls):
+                results.append(result)
+                outcome = f"https://docs.google.com/document/d/{result['document_id']}" if result["status"] == "success" else f"error: {result['message']}"
+                print(f"[{len(results)}/{len(markdown_paths)}] {result['path']} {result['seconds']:.2f}s {result['api_calls']} calls -> {outcome}")
+
+            elapsed = time.perf_counter() - started
+            succeeded = sum(1 for result in results if result["status"] == "success")
+            latencies = sorted(result["seconds"] for result in results)
+            print(f"Wrote {succeeded}/{len(results)} documents in {elapsed:.1f}s with {args.workers} workers, "
+                  f"{quota_stats()['calls'] - calls_before} API calls; "
+                  f"per-file latency median {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s")
         elif args.command == "append":
             content = ""
             content_source = ""
-            if args.file:
+            result = None
+            if args.follow:
+                # Ctrl-C stops watching; what has been read is still appended.
+                stop_event = threading.Event()
+                signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+                print(f"Following {args.follow} into document {args.doc_id} (Ctrl-C to stop)")
+                for result in follow_file(services["docs"], args.doc_id, args.follow, args.from_start, args.flush_bytes,
+                                          args.flush_interval, stop_event=stop_event, revision_tracker=revision_tracker):
+                    print(result["message"] if result["status"] == "success" else f"An error occurred: {result['message']}")
+                return
+            elif args.file and args.stream:
+                with open(args.file, "r") as f:
+                    result = append_to_google_doc(services["docs"], args.doc_id, iter_file_lines(f), revision_tracker)
+                content_source = f"from {args.file}"
+            elif args.file:
                 with open(args.file, "r") as f:
                     content = f.read()
                 content_source = f"from {args.file}"
@@ -93,7 +180,8 @@ def main():
                 content_source = "text"
 
             if content:
-                result = append_to_google_doc(services["docs"], args.doc_id, content)
+                result = append_to_google_doc(services["docs"], args.doc_id, content, revision_tracker)
+            if result:
                 if result.get("status") == "success":
                     print(f"Appended content {content_source} to document {args.doc_id}")
                 else:
@@ -102,16 +190,26 @@ def main():
             clear_google_doc(services["docs"], args.doc_id)
             print(f"Document {args.doc_id} cleared")
         elif args.command == "replace":
-            content = ""
-            if os.path.isfile(args.markdown_or_text):
-                with open(args.markdown_or_text, "r") as f:
-                    content = f.read()
-            else:
-                content = args.markdown_or_text
-            replacements = {args.placeholder: content}
-            result = replace_markdown_placeholders(services["docs"], args.doc_id, replacements)
+            sources = {}
+            if args.map:
+                with open(args.map, "r") as f:
+                    sources.update(json.load(f))
+            if args.placeholder and args.markdown_or_text is not None:
+                sources[args.placeholder] = args.markdown_or_text
+            if not sources:
+                replace_parser.error("give a placeholder and its content, or --map")
+
+            replacements = {}
+            for placeholder, markdown_or_text in sources.items():
+                if os.path.isfile(markdown_or_text):
+                    with open(markdown_or_text, "r") as f:
+                        replacements[placeholder] = f.read()
+                else:
+                    replacements[placeholder] = markdown_or_text
+            result = replace_markdown_placeholders(services["docs"], args.doc_id, replacements, revision_tracker)
             if result.get("status") == "success":
-                print(f"Replaced placeholder '{args.placeholder}' in document {args.doc_id}")
+                for placeholder, count in result["replacements"].items():
+                    print(f"Replaced {count} occurrence(s) of '{placeholder}' in document {args.doc_id}")
             else:
                 print(f"An error occurred: {result.get('message', 'Unknown error')}")
         elif args.command == "read":
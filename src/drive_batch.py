@@ -0,0 +1,93 @@
+import time
+from googleapiclient.errors import HttpError
+from metrics import timed_call
+from quota import MAX_RETRIES, backoff_delay, get_bucket, is_idempotent, is_retryable, note_call
+
+# Drive accepts at most 100 calls in one batch request.
+MAX_BATCH_SIZE = 100
+
+class DriveBatch:
+    """Collects independent Drive metadata calls and sends them as multipart batch requests.
+
+    Each call still counts against the Drive quota, so a token is taken per call, but up to
+    MAX_BATCH_SIZE calls share one HTTP round trip. Calls that are rate limited and
+    idempotent calls that hit a server error are sent again in a later batch with backoff.
+    Only use it for calls that do not depend on each other's results; media uploads
+    cannot be batched.
+    """
+
+    def __init__(self, drive_service):
+        self.drive_service = drive_service
+        self._pending = []
+
+    def add(self, request, key=None):
+        """Queues a built request, e.g. drive_service.files().create(...). Returns its key."""
+        key = key if key is not None else len(self._pending)
+        self._pending.append((key, request))
+        return key
+
+    def create(self, metadata: dict, fields: str = 'id', key=None):
+        return self.add(self.drive_service.files().create(body=metadata, fields=fields), key)
+
+    def copy(self, file_id: str, metadata: dict, fields: str = 'id', key=None):
+        return self.add(self.drive_service.files().copy(fileId=file_id, body=metadata, fields=fields), key)
+
+    def grant_permission(self, file_id: str, permission: dict, key=None):
+        return self.add(self.drive_service.permissions().create(fileId=file_id, body=permission), key)
+
+    def move(self, file_id: str, add_parents: str, remove_parents: str = None, key=None):
+        return self.add(self.drive_service.files().update(fileId=file_id, addParents=add_parents,
+                                                          removeParents=remove_parents, fields='id, parents'), key)
+
+    def set_app_properties(self, file_id: str, app_properties: dict, key=None):
+        return self.add(self.drive_service.files().update(fileId=file_id, body={'appProperties': app_properties},
+                                                          fields='id, appProperties'), key)
+
+    def execute(self) -> dict:
+        """Sends every queued call and returns {key: response}; failed calls map to their HttpError."""
+        pending, self._pending = self._pending, []
+        results = {}
+        attempt = 0
+        while pending:
+            retry = []
+            for start in range(0, len(pending), MAX_BATCH_SIZE):
+                group = pending[start:start + MAX_BATCH_SIZE]
+                retry.extend(self._execute_group(group, results, retry_allowed=attempt < MAX_RETRIES))
+            pending = retry
+            if pending:
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+        return results
+
+    def _execute_group(self, group: list, results: dict, retry_allowed: bool) -> list:
+        bucket = get_bucket('drive', 'write')
+        retry = []
+
+        def callback(request_id, response, exception):
+            key, request = group[int(request_id)]
+            if exception is not None and retry_allowed and is_retryable(exception, _idempotent(request)):
+                retry.append((key, request))
+            else:
+                results[key] = exception if exception is not None else response
+
+        batch = self.drive_service.new_batch_http_request(callback=callback)
+        for position, (_, request) in enumerate(group):
+            if bucket is not None:
+                bucket.acquire()
+            batch.add(request, request_id=str(position))
+        note_call()
+        try:
+            # One round trip carrying every call in the group.
+            with timed_call('drive.batch', [request.body for _, request in group], requests=len(group)):
+                batch.execute()
+        except HttpError as err:
+            # After a server error some of the calls may have run, so the group is only sent
+            # again if it was rate limited or every call in it is idempotent.
+            if retry_allowed and is_retryable(err, all(_idempotent(request) for _, request in group)):
+                return list(group)
+            for key, _ in group:
+                results[key] = err
+        return retry
+
+def _idempotent(request) -> bool:
+    return is_idempotent(request.method, request.methodId, request.body)
@@ -1,6 +1,10 @@
 from .append import append_to_google_doc
 from .clear import clear_google_doc
-from .write import write_to_google_doc
+from .write import write_to_google_doc, write_many_to_google_docs
+from .overwrite import update_google_doc, tag_google_doc_blocks
+from .follow import AppendFollower, follow_file
 from .replace import replace_markdown_placeholders
 from .read import read_google_doc
-from .content_installer import install_content
\ No newline at end of file
+from .content_installer import install_content
+from .consistency import RevisionTracker
+from .plan_cache import plan_cache_stats, configure_plan_cache
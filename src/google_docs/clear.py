@@ -9,7 +9,7 @@ def clear_google_doc(docs_service, document_id: str) -> dict:
             end_index = body_content[-1].get('endIndex', 1)
             if end_index > 2:
                 requests = [{'deleteContentRange': {'range': {'startIndex': 1, 'endIndex': end_index - 1}}}]
-                return execute_batch_update(docs_service, document_id, requests)
+                return execute_batch_update(docs_service, document_id, requests, required_revision_id=doc.get('revisionId'))
         return {"status": "success", "message": "Document is already empty."}
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred: {e}"}
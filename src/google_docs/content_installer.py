@@ -1,182 +1,114 @@
 # src/google_docs/content_installer.py
 
-import time
 from . import markdown_parser
-from .operations import execute_batch_update
+from .consistency import RevisionTracker
+from .plan_cache import CompiledBlock, get_plan_cache
+from .request_optimizer import optimize_requests, optimize_request_stream, combine_reports
 
-def install_content(docs_service, document_id: str, markdown_content: str, start_index: int):
-    """Processes and installs mixed content at a specific index in a document."""
+# Lines of simple text compiled as one block when streaming.
+STREAM_SIMPLE_LINES = 200
+
+def install_content(docs_service, document_id: str, markdown_content: str, start_index: int, revision_tracker: RevisionTracker = None):
+    """Processes and installs mixed content at a specific index in a document.
+
+    Every block, tables included, is compiled against a locally tracked insertion index
+    and the whole document is sent in a single batchUpdate.
+    """
     
     operation_plan = markdown_parser.create_operation_plan(markdown_content)
     if not operation_plan:
         return {"status": "success", "message": "No content to install."}
 
-    current_index = start_index
+    tracker = revision_tracker or RevisionTracker()
+    tracker.note_blocks(len(operation_plan))
+    requests, _ = compile_operation_plan(operation_plan, start_index)
+    requests, optimization = optimize_requests(requests)
+    result = tracker.execute(docs_service, document_id, requests)
+    if result['status'] != 'success': return result
+
+    return {"status": "success", "message": "Successfully installed all content blocks.", "consistency": tracker.report(), "optimization": optimization}
+
+def install_content_stream(docs_service, document_id: str, lines, start_index: int, revision_tracker: RevisionTracker = None,
+                           newline_before_tables: bool = True):
+    """Installs markdown read line by line at start_index without holding the whole document.
+
+    Parsing, compilation, optimization and chunking are chained generators feeding
+    the chunked batchUpdate, which cuts the next chunk while the previous one is in flight.
+    Memory stays bounded by the chunk caps, the optimizer window and STREAM_SIMPLE_LINES,
+    except for a single list, table, code block or quote, which is held whole.
+    The document comes out the same as with install_content; with newline_before_tables=False
+    tables get no leading newline, as with append_to_google_doc.
+    """
+    tracker = revision_tracker or RevisionTracker()
+    optimization_reports = []
+    operations = tracker.counting_blocks(markdown_parser.iter_operation_plan(lines, max_simple_lines=STREAM_SIMPLE_LINES))
+    compiled = iter_compiled_requests(operations, start_index, newline_before_tables=newline_before_tables)
+    requests = optimize_request_stream(compiled, optimization_reports)
+    result = tracker.execute(docs_service, document_id, requests)
+    if result['status'] != 'success': return result
+    if not result.get('chunks'):
+        return {"status": "success", "message": "No content to install."}
+
+    return {"status": "success", "message": "Successfully installed all content blocks.", "consistency": tracker.report(), "optimization": combine_reports(optimization_reports)}
 
+def compile_operation_plan(operation_plan: list, start_index: int, leading_newlines: bool = True):
+    """Compiles an operation plan into a single request list anchored at start_index.
+
+    Blocks are laid out back to back: each one is compiled at the index where the previous
+    one ends, so every insert lands after the content already placed and nothing later in
+    the list shifts anything earlier. Returns the requests and the total UTF-16 length.
+    """
+    requests = []
+    current_index = start_index
     for operation in operation_plan:
-        if operation['type'] == 'simple':
-            result = _handle_simple_insertion_at_index(docs_service, document_id, operation['content'], current_index)
-            if result['status'] != 'success': return result
-            current_index = _get_end_index(docs_service, document_id)
-
-        elif operation['type'] == 'table':
-            result = _handle_table_insertion_at_index(docs_service, document_id, operation['data'], current_index)
-            if result['status'] != 'success': return result
-            current_index = _get_end_index(docs_service, document_id)
-
-        elif operation['type'] == 'list':
-            result = _handle_list_insertion_at_index(docs_service, document_id, operation['lines'], operation['list_type'], current_index)
-            if result['status'] != 'success': return result
-            current_index = _get_end_index(docs_service, document_id)
-
-        elif operation['type'] == 'hr':
-            result = _handle_hr_insertion_at_index(docs_service, document_id, current_index)
-            if result['status'] != 'success': return result
-            current_index = _get_end_index(docs_service, document_id)
-
-        elif operation['type'] == 'code_block':
-            result = _handle_code_block_insertion_at_index(docs_service, document_id, operation['content'], current_index)
-            if result['status'] != 'success': return result
-            current_index = _get_end_index(docs_service, document_id)
-
-        elif operation['type'] == 'blockquote':
-            result = _handle_blockquote_insertion_at_index(docs_service, document_id, operation['content'], current_index)
-            if result['status'] != 'success': return result
-            current_index = _get_end_index(docs_service, document_id)
-
-    return {"status": "success", "message": "Successfully installed all content blocks."}
-
-def _get_end_index(docs_service, document_id: str) -> int:
-    """Helper to find the last writable index in the document body."""
-    try:
-        doc = docs_service.documents().get(documentId=document_id, fields='body(content(endIndex))').execute()
-        body_content = doc.get('body', {}).get('content', [])
-        for element in reversed(body_content):
-            if 'endIndex' in element:
-                return element['endIndex'] - 1
-        return 1
-    except Exception:
-        return 1
-
-def _handle_table_insertion_at_index(docs_service, document_id: str, table_data: tuple, start_index: int):
-    """Executes the three-step process for a single table at a specific index."""
-    try:
-        num_rows, num_cols, cell_contents = table_data
-        # Add leading newline to match append behavior
-        requests_insert = [
-            {'insertText': {'location': {'index': start_index}, 'text': '\n'}},
-            {'insertTable': {'rows': num_rows, 'columns': num_cols, 'location': {'index': start_index + 1}}}
-        ]
-        
-        insert_result = execute_batch_update(docs_service, document_id, requests_insert)
-        if insert_result['status'] != 'success':
-            return insert_result
-
-        time.sleep(1)
-
-        doc = docs_service.documents().get(documentId=document_id).execute()
-        populate_requests = markdown_parser.find_table_and_get_cell_requests(doc.get('body', {}), num_rows, num_cols, cell_contents, start_index + 1)
-        
-        if not populate_requests:
-            return {"status": "error", "message": "Could not find table to populate cells."}
-
-        return execute_batch_update(docs_service, document_id, populate_requests)
-
-    except Exception as e:
-        return {"status": "error", "message": f"An error occurred during table insertion: {e}"}
-
-def _handle_simple_insertion_at_index(docs_service, document_id: str, markdown_content: str, start_index: int):
-    try:
-        # Add leading newline to match append behavior
-        requests = [{'insertText': {'location': {'index': start_index}, 'text': '\n'}}]
-        simple_requests, _ = markdown_parser.get_simple_markdown_requests(markdown_content, start_index + 1)
-        requests.extend(simple_requests)
-        
-        if not simple_requests:
-             return {"status": "success", "message": "No content to append."}
-
-        result = execute_batch_update(docs_service, document_id, requests)
-        if result['status'] == 'success':
-            time.sleep(1)
-        return result
-
-    except Exception as e:
-        return {"status": "error", "message": f"An error occurred during simple insertion: {e}"}
-
-def _handle_list_insertion_at_index(docs_service, document_id: str, list_lines: list, list_type: str, start_index: int):
-    try:
-        # Add leading newline to match append behavior
-        requests = [{'insertText': {'location': {'index': start_index}, 'text': '\n'}}]
-        list_requests, _ = markdown_parser.get_list_requests(list_lines, list_type, start_index + 1)
-        requests.extend(list_requests)
-        
-        if not list_requests:
-             return {"status": "success", "message": "No list content to append."}
-
-        result = execute_batch_update(docs_service, document_id, requests)
-        if result['status'] == 'success':
-            time.sleep(1)
-        return result
-
-    except Exception as e:
-        return {"status": "error", "message": f"An error occurred during list insertion: {e}"}
-
-def _handle_hr_insertion_at_index(docs_service, document_id: str, start_index: int):
-    try:
-        requests = [
-            {'insertText': {'location': {'index': start_index}, 'text': '\n'}},
-            {
-                'updateParagraphStyle': {
-                    'range': {'startIndex': start_index, 'endIndex': start_index + 1},
-                    'paragraphStyle': {
-                        'borderBottom': {
-                            'color': {'color': {'rgbColor': {'red': 0, 'green': 0, 'blue': 0}}},
-                            'width': {'magnitude': 1, 'unit': 'PT'},
-                            'padding': {'magnitude': 0, 'unit': 'PT'},
-                            'dashStyle': 'SOLID'
-                        }
-                    },
-                    'fields': 'borderBottom'
-                }
-            },
-            {'insertText': {'location': {'index': start_index + 1}, 'text': '\n'}}
-        ]
-        
-        result = execute_batch_update(docs_service, document_id, requests)
-        if result['status'] == 'success':
-            time.sleep(1)
-        return result
-
-    except Exception as e:
-        return {"status": "error", "message": f"An error occurred during HR insertion: {e}"}
-
-def _handle_code_block_insertion_at_index(docs_service, document_id: str, code_content: str, start_index: int):
-    try:
-        # Add leading newline to match append behavior
-        requests = [{'insertText': {'location': {'index': start_index}, 'text': '\n'}}]
-        code_requests, _ = markdown_parser.get_code_block_requests(code_content, start_index + 1)
-        requests.extend(code_requests)
-        
-        result = execute_batch_update(docs_service, document_id, requests)
-        if result['status'] == 'success':
-            time.sleep(1)
-        return result
-
-    except Exception as e:
-        return {"status": "error", "message": f"An error occurred during code block insertion: {e}"}
-
-def _handle_blockquote_insertion_at_index(docs_service, document_id: str, blockquote_content: str, start_index: int):
-    try:
-        # Add leading newline to match append behavior
-        requests = [{'insertText': {'location': {'index': start_index}, 'text': '\n'}}]
-        quote_requests, _ = markdown_parser.get_blockquote_requests(blockquote_content, start_index + 1)
-        requests.extend(quote_requests)
-        
-        result = execute_batch_update(docs_service, document_id, requests)
-        if result['status'] == 'success':
-            time.sleep(1)
-        return result
-
-    except Exception as e:
-        return {"status": "error", "message": f"An error occurred during blockquote insertion: {e}"}
+        block_requests, block_len = compile_operation(operation, current_index, leading_newlines)
+        requests.extend(block_requests)
+        current_index += block_len
+    return requests, current_index - start_index
 
+def iter_compiled_requests(operation_plan, start_index: int, leading_newlines: bool = True, newline_before_tables: bool = True):
+    """Yields the requests of compile_operation_plan block by block, for any iterable of operations."""
+    current_index = start_index
+    for operation in operation_plan:
+        leading_newline = leading_newlines and (newline_before_tables or operation['type'] != 'table')
+        block_requests, block_len = compile_operation(operation, current_index, leading_newline)
+        yield from block_requests
+        current_index += block_len
+
+def compile_operation(operation: dict, start_index: int, leading_newline: bool = True):
+    """Returns the requests for a block and the UTF-16 length it adds to the document.
+
+    Blocks are compiled once at index 0 and kept in the plan cache; later uses of the
+    same block, at any start index, only rebase the cached requests.
+    """
+    block = get_plan_cache().get_or_compile(
+        operation, leading_newline, lambda: CompiledBlock(*_compile_block(operation, 0, leading_newline)))
+    return block.rebase(start_index), block.length
+
+def _compile_block(operation: dict, start_index: int, leading_newline: bool = True):
+    if operation['type'] == 'hr':
+        return markdown_parser.get_hr_requests(start_index)
+
+    # Every other block gets a leading newline to match append behavior, except the later
+    # pieces of a simple-text run that was split while streaming.
+    requests = []
+    prefix_len = 0
+    if leading_newline and not operation.get('continued'):
+        requests.append({'insertText': {'location': {'index': start_index}, 'text': '\n'}})
+        prefix_len = 1
+    block_start = start_index + prefix_len
+    if operation['type'] == 'simple':
+        block_requests, block_len = markdown_parser.get_simple_markdown_requests(operation['content'], block_start)
+    elif operation['type'] == 'list':
+        block_requests, block_len = markdown_parser.get_list_requests(operation['lines'], operation['list_type'], block_start)
+    elif operation['type'] == 'code_block':
+        block_requests, block_len = markdown_parser.get_code_block_requests(operation['content'], block_start)
+    elif operation['type'] == 'blockquote':
+        block_requests, block_len = markdown_parser.get_blockquote_requests(operation['content'], block_start)
+    elif operation['type'] == 'table':
+        block_requests, block_len = markdown_parser.get_table_requests(operation['data'], block_start)
+    else:
+        raise ValueError(f"Unknown operation type: {operation['type']}")
+
+    requests.extend(block_requests)
+    return requests, prefix_len + block_len
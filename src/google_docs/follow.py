@@ -0,0 +1,265 @@
+import codecs
+import json
+import os
+import threading
+import time
+from . import markdown_parser
+from .append import _get_end_index
+from .consistency import RevisionTracker
+from .content_installer import compile_operation
+from .request_optimizer import optimize_requests
+
+# A follower flushes once this many bytes are waiting, or this many seconds after the last flush.
+FOLLOW_FLUSH_BYTES = 64 * 1024
+FOLLOW_FLUSH_INTERVAL = 2.0
+# How often the followed file is checked for new bytes.
+FOLLOW_POLL_INTERVAL = 0.25
+
+class AppendFollower:
+    """Appends markdown to the end of a document as it arrives, a chunk at a time.
+
+    Fed text need not end on a line or block boundary. Only complete lines are parsed,
+    and a block that later lines could still extend, such as a list or an open code block,
+    is held back until the next block starts or the source goes quiet; an open code block
+    or a table is held until the final flush. Held-back simple text is sent as it comes
+    and continued without a leading newline, so the document reads as if the whole text
+    had been appended at once. The end index is read once and then tracked locally; if
+    the document was edited elsewhere it is read again.
+    """
+
+    def __init__(self, docs_service, document_id: str, revision_tracker: RevisionTracker = None):
+        self.docs_service = docs_service
+        self.document_id = document_id
+        self.tracker = revision_tracker or RevisionTracker()
+        self.end_index = None
+        self.appended_blocks = 0
+        self._partial = ''
+        self._lines = []
+        self._pending_bytes = 0
+        self._continued = False
+        # Blocks parsed by a flush that failed before appending them.
+        self._unsent = []
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def feed(self, text: str):
+        """Adds text to the end of the source; a trailing partial line waits for its newline."""
+        self._pending_bytes += len(text.encode('utf-8'))
+        complete, newline, self._partial = (self._partial + text).rpartition('\n')
+        if newline:
+            # Split as iter_file_lines would, so a trailing blank line is kept.
+            for line in complete.split('\n'):
+                self._lines.extend((line + '\n').splitlines())
+
+    def flush(self, quiet: bool = False, final: bool = False) -> dict:
+        """Appends every complete block, and an unfinished one if quiet or final.
+
+        A quiet flush still holds back an open code block or a table. With final=True a
+        trailing partial line is taken as complete too. Blocks a failed flush did not
+        append are kept and sent first by the next flush.
+        """
+        if final and self._partial:
+            self._lines.extend(self._partial.splitlines())
+            self._partial = ''
+
+        lines = self._lines
+        operations, start, end = markdown_parser.split_complete_blocks(lines)
+        last = operations.pop() if operations else None
+        rest = lines[start:] if last else lines
+        continued = False
+        if self._continued:
+            # Blank lines after text sent earlier belong to that text's block, unless more text follows.
+            blanks = next((i for i, line in enumerate(lines) if line.strip()), len(lines))
+            first = operations[0] if operations else last
+            if first is None:
+                if final and blanks:
+                    operations.append({'type': 'simple', 'content': '\n'.join(lines), 'continued': True})
+                    rest = []
+                continued = not final
+            elif first['type'] == 'simple':
+                first['continued'] = True
+            elif blanks:
+                operations.insert(0, {'type': 'simple', 'content': '\n'.join(lines[:blanks]), 'continued': True})
+
+        if last is not None:
+            if final or (quiet and last['type'] != 'simple' and not _extendable(last, lines[start:end])):
+                operations.append(last)
+                rest = lines[end:]
+            elif last['type'] == 'simple':
+                # Send the text so far and continue the block without a leading newline. Trailing
+                # blank lines wait, since they are dropped if the block ends with them.
+                # A last line starting with a pipe waits too, as it may turn out to be a table header.
+                while end > start and (not lines[end - 1].strip() or (end == len(lines) and lines[end - 1].lstrip().startswith('|'))):
+                    end -= 1
+                if any(line.strip() for line in lines[start:end]):
+                    last['content'] = '\n'.join(lines[start:end] + [''])
+                    operations.append(last)
+                    rest = lines[end:]
+                    continued = True
+                else:
+                    continued = self._continued
+            if final and rest:
+                operations.extend(markdown_parser.iter_operation_plan(rest))
+                rest = []
+
+        operations = self._unsent + operations
+        waiting = self._pending_bytes
+        result, sent, chunks = self._append(operations) if operations else ({"status": "success"}, 0, [])
+        # Only now is the buffer moved past what was parsed; blocks not appended stay queued.
+        self._continued = continued
+        self._lines = rest
+        self._unsent = operations[sent:]
+        self._pending_bytes = waiting if self._unsent else \
+            sum(len(line.encode('utf-8')) + 1 for line in rest) + len(self._partial.encode('utf-8'))
+        self.appended_blocks += sent
+        if result['status'] != 'success':
+            return dict(result, blocks=sent)
+        if not operations:
+            return {"status": "success", "message": "Nothing to append.", "blocks": 0}
+        return {"status": "success", "message": f"Appended {sent} block(s).", "blocks": sent, "chunks": chunks}
+
+    def _append(self, operations: list):
+        """Appends operations in batches that end on block boundaries and fit in one chunk.
+
+        Returns the result, the number of operations appended and the chunks sent. A failed
+        batch is retried once after reading the end index again: batches already appended
+        are not sent again, a write that timed out is only repeated if the end shows it did
+        not land, and the rest of a block too large for one chunk is only sent if the
+        document did not change. Blocks whose outcome is unknown count as appended, so they
+        are never sent twice.
+        """
+        sent = 0
+        chunks = []
+        retried = False
+        result = {"status": "success"}
+        while sent < len(operations):
+            if self.end_index is None:
+                self.end_index = _get_end_index(self.docs_service, self.document_id, self.tracker)
+            start = self.end_index
+            count, requests, length = self._compile_batch(operations[sent:], start)
+            result = self._execute(requests, chunks)
+            if result['status'] != 'success' and not retried:
+                retried = True
+                applied = result.get('chunks_applied', 0)
+                end = _get_end_index(self.docs_service, self.document_id, self.tracker)
+                if applied and self.tracker.revision_id == result.get('revision_id'):
+                    # Nothing else changed the document, so the rest of the block is still valid as compiled.
+                    done = sum(chunk['requests'] for chunk in result['chunks'][:applied])
+                    result = self._execute(requests[done:], chunks)
+                elif applied:
+                    # Part of the block is in the document and the rest no longer fits it: do not send it again.
+                    sent += count
+                    return dict(result, message=f"A block was only partly appended and the document changed since: {result['message']}"), sent, chunks
+                elif result.get('uncertain') and end == start + length:
+                    # The write that timed out did land; chunks after it only restyle that text.
+                    done = sum(chunk['requests'] for chunk in result['chunks'])
+                    result = self._execute(requests[done:], chunks)
+                elif result.get('uncertain') and end != start:
+                    sent += count
+                    return dict(result, message=f"Blocks may or may not have been appended: {result['message']}"), sent, chunks
+                else:
+                    start = end
+                    count, requests, length = self._compile_batch(operations[sent:], start)
+                    result = self._execute(requests, chunks)
+            if result['status'] != 'success':
+                self.end_index = None
+                return result, sent, chunks
+            self.end_index = start + length
+            self.tracker.note_blocks(count)
+            sent += count
+        return result, sent, chunks
+
+    def _compile_batch(self, operations: list, start: int):
+        """Compiles the longest prefix of operations, at least one, that fits the tracker's chunk caps.
+
+        Returns the number of operations taken, their optimized requests and the length they add.
+        """
+        requests = []
+        request_bytes = 0
+        index = start
+        count = 0
+        for operation in operations:
+            block_requests, block_len = compile_operation(operation, index, leading_newline=operation['type'] != 'table')
+            block_bytes = sum(len(json.dumps(request)) + 2 for request in block_requests)
+            if count and (len(requests) + len(block_requests) > self.tracker.max_chunk_requests or
+                          request_bytes + block_bytes > self.tracker.max_chunk_bytes):
+                break
+            requests.extend(block_requests)
+            request_bytes += block_bytes
+            index += block_len
+            count += 1
+        requests, _ = optimize_requests(requests)
+        return count, requests, index - start
+
+    def _execute(self, requests: list, chunks: list) -> dict:
+        result = self.tracker.execute(self.docs_service, self.document_id, requests)
+        chunks.extend(result.get('chunks', []))
+        # A long-running follower keeps no per-chunk history.
+        self.tracker.chunks.clear()
+        return result
+
+def follow_file(docs_service, document_id: str, path: str, from_start: bool = False, flush_bytes: int = FOLLOW_FLUSH_BYTES,
+                flush_interval: float = FOLLOW_FLUSH_INTERVAL, poll_interval: float = FOLLOW_POLL_INTERVAL,
+                stop_event: threading.Event = None, revision_tracker: RevisionTracker = None):
+    """Watches a markdown file and appends what is written to it, like tail -f.
+
+    Only bytes added after the file's current end are read, unless from_start is set.
+    Appends are flushed once flush_bytes are waiting or flush_interval seconds have passed,
+    so one batchUpdate carries many small writes. A truncated or replaced file is read
+    again from the start. Yields the result of every flush that sent something or failed;
+    setting stop_event flushes what is left and stops.
+    """
+    follower = AppendFollower(docs_service, document_id, revision_tracker)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    file = open(path, 'rb')
+    try:
+        identity = os.fstat(file.fileno()).st_ino
+        if not from_start:
+            file.seek(0, os.SEEK_END)
+        last_flush = last_data = time.monotonic()
+        held_bytes = 0
+        while not (stop_event and stop_event.is_set()):
+            data = file.read()
+            now = time.monotonic()
+            if data:
+                follower.feed(decoder.decode(data))
+                last_data = now
+            elif _replaced(path, identity, file.tell()):
+                file.close()
+                file = open(path, 'rb')
+                identity = os.fstat(file.fileno()).st_ino
+                decoder.reset()
+                continue
+
+            # Bytes held back in an unfinished block do not count towards the next size-triggered flush.
+            if follower.pending_bytes - held_bytes >= flush_bytes or (follower.pending_bytes and now - last_flush >= flush_interval):
+                result = follower.flush(quiet=now - last_data >= flush_interval)
+                last_flush = now
+                held_bytes = follower.pending_bytes
+                if result['status'] != 'success' or result['blocks']:
+                    yield result
+            if not data:
+                (stop_event.wait if stop_event else time.sleep)(poll_interval)
+
+        follower.feed(decoder.decode(b'', final=True))
+        result = follower.flush(final=True)
+        if result['status'] != 'success' or result['blocks']:
+            yield result
+    finally:
+        file.close()
+
+def _extendable(operation: dict, lines: list) -> bool:
+    """True for a table, or a code block still waiting for its closing fence, read from lines."""
+    if operation['type'] == 'table':
+        return True
+    return operation['type'] == 'code_block' and (len(lines) < 2 or not lines[-1].strip().startswith('```'))
+
+def _replaced(path: str, identity: int, position: int) -> bool:
+    """True if the file at path was truncated below position or is no longer the same file."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return stat.st_ino != identity or stat.st_size < position
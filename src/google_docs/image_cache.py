@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from googleapiclient.errors import HttpError
+from .operations import upload_public_image
+
+CACHE_DIR_ENV_VAR = 'GOOGLE_OFFICE_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'google-office-tool')
+# A cached Drive file is checked again after this many seconds within one process.
+VERIFY_INTERVAL = 600.0
+
+class ImageCache:
+    """Maps an account and the SHA-256 of an image file to the public Drive copy uploaded for it.
+
+    Entries are stored in a JSON file, so a logo uploaded by one run is reused by every
+    later run of the same account; other accounts may not be able to see that file. Before
+    a cached file is used it is checked to still exist and not be in the trash; that check
+    is repeated at most every VERIFY_INTERVAL seconds per process. Services whose account
+    cannot be told, such as the emulator's, always upload.
+    """
+
+    def __init__(self, path: str = None):
+        cache_dir = os.environ.get(CACHE_DIR_ENV_VAR, DEFAULT_CACHE_DIR)
+        self.path = path or os.path.join(cache_dir, 'image_cache.json')
+        self.hits = 0
+        self.misses = 0
+        self._verified = {}
+        self._lock = threading.Lock()
+
+    def get_or_upload(self, drive_service, file_path: str) -> dict:
+        """Returns upload_public_image-style info for file_path, uploading only on a cache miss."""
+        account = account_key(drive_service)
+        if account is None:
+            return upload_public_image(drive_service, file_path)
+        key = f'{account}/{file_digest(file_path)}'
+        with self._lock:
+            entry = self._load().get(key)
+            if entry and self._still_exists(drive_service, key, entry):
+                self.hits += 1
+                return dict(entry)
+
+            self.misses += 1
+            info = upload_public_image(drive_service, file_path)
+            entries = self._load()
+            entries[key] = info
+            self._save(entries)
+            self._verified[key] = time.monotonic()
+            return dict(info)
+
+    def _still_exists(self, drive_service, key: str, entry: dict) -> bool:
+        checked = self._verified.get(key)
+        if checked is not None and time.monotonic() - checked < VERIFY_INTERVAL:
+            return True
+        if not entry.get('file_id'):
+            return False
+        try:
+            file = drive_service.files().get(fileId=entry['file_id'], fields='id, trashed').execute()
+        except HttpError as err:
+            if err.resp.status in (403, 404):
+                return False
+            raise
+        if file.get('trashed'):
+            return False
+        self._verified[key] = time.monotonic()
+        return True
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self, entries: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+def account_key(drive_service):
+    """Identifies the account drive_service acts as from its credentials, or None if it has none.
+
+    Service accounts are named by their email; OAuth users by a hash of their grant, so the
+    refresh token itself is never written to the cache.
+    """
+    creds = getattr(getattr(drive_service, '_http', None), 'credentials', None)
+    if creds is None:
+        return None
+    email = getattr(creds, 'service_account_email', None)
+    if email:
+        return f'service_account:{email}'
+    refresh_token = getattr(creds, 'refresh_token', None)
+    if refresh_token:
+        grant = f"{getattr(creds, 'client_id', '')}:{refresh_token}"
+        return f"oauth:{hashlib.sha256(grant.encode('utf-8')).hexdigest()[:16]}"
+    return None
+
+def file_digest(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def upload_public_image_cached(drive_service, file_path: str) -> dict:
+    """upload_public_image through the process-wide ImageCache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+    return _default_cache.get_or_upload(drive_service, file_path)
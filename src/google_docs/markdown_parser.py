@@ -1,128 +1,203 @@
 import re
+from collections import deque
+from bisect import bisect_left
+
+# Block-level patterns, compiled once and applied to each line a single time.
+HR_PATTERN = re.compile(r'^\s*([-*_])\s*(?:\1\s*){2,}\s*$')
+TABLE_SEPARATOR_PATTERN = re.compile(r'^\|[-|: ]+\|$')
+UNORDERED_ITEM_PATTERN = re.compile(r'^[-*]\s+')
+ORDERED_ITEM_PATTERN = re.compile(r'^\d+\.\s+')
+QUOTE_MARKER_PATTERN = re.compile(r'^\s*>\s?')
+_RULE_MARKERS = frozenset('-*_')
+_ITEM_MARKERS = frozenset('-*0123456789')
+
+class _Line:
+    """A source line with everything the block scanner asks about it worked out once."""
+    __slots__ = ('text', 'blank', 'fence', 'quote', 'pipe', 'separator', 'hr', 'list_type')
+
+    def __init__(self, text: str):
+        stripped = text.strip()
+        first = stripped[:1]
+        self.text = text
+        self.blank = not stripped
+        self.fence = first == '`' and stripped.startswith('```')
+        self.quote = first == '>'
+        self.pipe = first == '|'
+        self.separator = self.pipe and TABLE_SEPARATOR_PATTERN.match(stripped) is not None
+        # Only lines starting with a marker character can be a rule or a list item.
+        self.hr = first in _RULE_MARKERS and HR_PATTERN.match(text) is not None
+        self.list_type = _list_type(stripped) if first in _ITEM_MARKERS else None
+
+class _LineReader:
+    """Reads _Lines from an iterable of strings with lookahead and push-back.
+
+    consumed counts the lines taken so far; block_start is where the current block began.
+    """
 
-def create_operation_plan(markdown_text: str) -> list:
-    """Parses markdown into a list of operation blocks (simple text, table, or list)."""
-    plan = []
-    lines = markdown_text.splitlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        
-        # Check for Code Block (``` ... ```)
-        if line.strip().startswith('```'):
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = deque()
+        self.consumed = 0
+        self.block_start = 0
+
+    def peek(self, offset: int = 0):
+        while len(self._buffer) <= offset:
+            text = next(self._lines, None)
+            if text is None:
+                return None
+            self._buffer.append(_Line(text))
+        return self._buffer[offset]
+
+    def next(self):
+        line = self.peek()
+        if line is not None:
+            self._buffer.popleft()
+            self.consumed += 1
+        return line
+
+    def push_back(self, lines: list):
+        self._buffer.extendleft(reversed(lines))
+        self.consumed -= len(lines)
+
+def iter_operation_plan(lines, max_simple_lines: int = None):
+    """Yields operation blocks from an iterable of markdown lines in one forward scan.
+
+    Every line is stripped and classified once. Blank lines inside a list are held back
+    until the next non-blank line shows whether the list goes on, so each blank line is
+    looked at a bounded number of times however long the run is.
+
+    With max_simple_lines, a run of simple text is yielded in pieces of at most that many
+    lines once it has some text; every piece after the first is marked 'continued' and is
+    compiled without the leading newline, so the document comes out the same.
+    """
+    return _iter_blocks(_LineReader(lines), max_simple_lines)
+
+def split_complete_blocks(lines: list):
+    """Parses lines that may stop partway through a block.
+
+    Returns the blocks and the span [start, end) of lines the last one was read from.
+    Further lines could still extend that block, as they would an unfinished list or code
+    block; the lines after it are blank lines the next block may start with.
+    """
+    reader = _LineReader(lines)
+    operations = []
+    start = end = 0
+    for operation in _iter_blocks(reader):
+        operations.append(operation)
+        start, end = reader.block_start, reader.consumed
+    return operations, start, end
+
+def _iter_blocks(reader: _LineReader, max_simple_lines: int = None):
+    while True:
+        reader.block_start = reader.consumed
+        line = reader.peek()
+        if line is None:
+            return
+
+        if line.fence:
+            reader.next()
             code_lines = []
-            j = i + 1
-            while j < len(lines) and not lines[j].strip().startswith('```'):
-                code_lines.append(lines[j])
-                j += 1
-            
-            # Use content of code block, stripping language hint if present on first line
-            plan.append({'type': 'code_block', 'content': '\n'.join(code_lines)})
-            i = j + 1
+            while (inner := reader.next()) is not None and not inner.fence:
+                code_lines.append(inner.text)
+            yield {'type': 'code_block', 'content': '\n'.join(code_lines)}
             continue
 
-        # Check for Blockquote (> text)
-        if line.strip().startswith('>'):
+        if line.quote:
             quote_lines = []
-            j = i
-            while j < len(lines) and lines[j].strip().startswith('>'):
-                # Strip the leading '>' and optional space
-                content_line = re.sub(r'^\s*>\s?', '', lines[j])
-                quote_lines.append(content_line)
-                j += 1
-            
-            plan.append({'type': 'blockquote', 'content': '\n'.join(quote_lines)})
-            i = j
+            while (inner := reader.peek()) is not None and inner.quote:
+                quote_lines.append(QUOTE_MARKER_PATTERN.sub('', reader.next().text, count=1))
+            yield {'type': 'blockquote', 'content': '\n'.join(quote_lines)}
             continue
 
-        # Check for Horizontal Rule (---, ***, ___)
-        if re.match(r'^\s*([-*_])\s*(?:\1\s*){2,}\s*$', line):
-            plan.append({'type': 'hr'})
-            i += 1
+        if line.hr:
+            reader.next()
+            yield {'type': 'hr'}
             continue
 
-        # Check for Table
-        if line.strip().startswith('|') and (i + 1) < len(lines) and re.match(r'^\|[-|: ]+\|$', lines[i+1].strip()):
+        if _starts_table(reader, 0):
             table_lines = []
-            j = i
-            while j < len(lines) and lines[j].strip().startswith('|'):
-                table_lines.append(lines[j])
-                j += 1
-            
-            table_markdown = '\n'.join(table_lines)
-            table_data = parse_markdown_table(table_markdown)
+            while (inner := reader.peek()) is not None and inner.pipe:
+                table_lines.append(reader.next().text)
+            table_data = parse_markdown_table('\n'.join(table_lines))
             if table_data:
-                plan.append({'type': 'table', 'data': table_data})
-                i = j
+                yield {'type': 'table', 'data': table_data}
                 continue
+            reader.push_back([_Line(text) for text in table_lines])
 
-        # Check for List
-        list_type = get_list_type(line)
-        if list_type:
-            list_lines = []
-            j = i
-            while j < len(lines):
-                next_line = lines[j]
-                if not next_line.strip():
-                    # Check ahead to see if the list continues after this empty line
-                    k = j + 1
-                    list_continues = False
-                    while k < len(lines):
-                        if not lines[k].strip():
-                            k += 1
-                        elif get_list_type(lines[k]):
-                            list_continues = True
-                            break
-                        else:
-                            break
-                    if list_continues:
-                        j += 1
-                        continue
-                    else:
-                        break
-                
-                next_type = get_list_type(next_line)
-                if next_type:
-                    list_lines.append(next_line)
-                    j += 1
-                else:
-                    break
-            
-            plan.append({'type': 'list', 'lines': list_lines, 'list_type': list_type})
-            i = j
+        if line.list_type:
+            yield {'type': 'list', 'lines': _read_list_lines(reader), 'list_type': line.list_type}
             continue
-        
-        # Simple Text
+
         simple_text_lines = []
-        j = i
-        while j < len(lines):
+        has_text = False
+        continued = False
+        while (inner := reader.peek()) is not None:
             # Stop if we hit a table, a list, a horizontal rule, code block or blockquote
-            if (lines[j].strip().startswith('|') and (j + 1) < len(lines) and re.match(r'^\|[-|: ]+\|$', lines[j+1].strip())):
+            if inner.list_type or inner.hr or inner.fence or inner.quote or _starts_table(reader, 0):
                 break
-            if get_list_type(lines[j]):
+            if max_simple_lines and has_text and len(simple_text_lines) >= max_simple_lines:
+                # Terminate every line so a trailing blank line survives splitlines() when compiled.
+                simple_text_lines.append('')
+                yield _simple_block(simple_text_lines, continued)
+                simple_text_lines = []
+                continued = True
+            simple_text_lines.append(inner.text)
+            has_text = has_text or not inner.blank
+            reader.next()
+        if has_text:
+            yield _simple_block(simple_text_lines, continued)
+        elif not simple_text_lines:
+            # A table header whose table could not be parsed; keep it as text.
+            reader.next()
+            yield {'type': 'simple', 'content': line.text}
+
+def _simple_block(lines: list, continued: bool) -> dict:
+    block = {'type': 'simple', 'content': '\n'.join(lines)}
+    if continued:
+        block['continued'] = True
+    return block
+
+def _read_list_lines(reader: _LineReader) -> list:
+    list_lines = []
+    while (line := reader.peek()) is not None:
+        if line.blank:
+            # The list only continues past blank lines if the next non-blank line is an item.
+            blanks = []
+            while (line := reader.peek()) is not None and line.blank:
+                blanks.append(reader.next())
+            if line is None or not line.list_type:
+                reader.push_back(blanks)
                 break
-            if re.match(r'^\s*([-*_])\s*(?:\1\s*){2,}\s*$', lines[j]):
-                break
-            if lines[j].strip().startswith('```'):
-                break
-            if lines[j].strip().startswith('>'):
-                break
-            
-            simple_text_lines.append(lines[j])
-            j += 1
-        
-        if any(line.strip() for line in simple_text_lines):
-            plan.append({'type': 'simple', 'content': '\n'.join(simple_text_lines)})
-        i = j
+            continue
+        if not line.list_type:
+            break
+        list_lines.append(reader.next().text)
+    return list_lines
+
+def _starts_table(reader: _LineReader, offset: int) -> bool:
+    line = reader.peek(offset)
+    if line is None or not line.pipe:
+        return False
+    following = reader.peek(offset + 1)
+    return following is not None and following.separator
+
+def iter_file_lines(file):
+    """Yields the lines of an open text file as str.splitlines() would split its contents."""
+    for line in file:
+        yield from line.splitlines()
 
-    return plan
+def create_operation_plan(markdown_text: str) -> list:
+    """Parses markdown into a list of operation blocks (simple text, table, or list)."""
+    return list(iter_operation_plan(markdown_text.splitlines()))
 
 def get_list_type(line: str):
     """Determines if a line is a list item and returns its type ('unordered' or 'ordered')."""
-    stripped = line.strip()
-    if re.match(r'^[-*]\s+', stripped):
+    return _list_type(line.strip())
+
+def _list_type(stripped: str):
+    if UNORDERED_ITEM_PATTERN.match(stripped):
         return 'unordered'
-    if re.match(r'^\d+\.\s+', stripped):
+    if ORDERED_ITEM_PATTERN.match(stripped):
         return 'ordered'
     return None
 
@@ -152,38 +227,35 @@ def parse_markdown_table(markdown_text: str):
     num_rows = len(data_rows) + 1
     return num_rows, num_columns, all_cell_contents
 
-def find_table_and_get_cell_requests(doc_body: dict, table_rows: int, table_cols: int, cell_contents: list, expected_index: int):
-    """Finds the table closest to the expected index and creates text insertion requests."""
-    content = doc_body.get('content', [])
-    best_match_table = None
-    min_distance = float('inf')
-
-    # Find the best matching table (the one closest to our insertion point)
-    for element in content:
-        if 'table' in element and element['table']['rows'] == table_rows and element['table']['columns'] == table_cols:
-            distance = abs(element['startIndex'] - expected_index)
-            if distance < min_distance:
-                min_distance = distance
-                best_match_table = element['table']
-
-    if not best_match_table:
-        return []
+def get_table_cell_index(table_start_index: int, num_cols: int, row: int, col: int) -> int:
+    """Returns the index of the (empty) paragraph in a cell of a freshly inserted table.
 
-    # Now, generate requests for the best-matched table
-    requests = []
-    content_pointer = len(cell_contents) - 1
-    for row in reversed(best_match_table.get('tableRows', [])):
-        for cell in reversed(row.get('tableCells', [])):
-            if content_pointer >= 0:
-                if cell.get('content') and cell['content'][0].get('startIndex'):
-                    cell_start_index = cell['content'][0]['startIndex']
-                    text_to_insert = cell_contents[content_pointer]
-                    if text_to_insert:
-                        # Process cell content for inline styles (e.g., bold)
-                        inline_requests, _ = handle_inline_styles(text_to_insert, cell_start_index)
-                        requests.extend(inline_requests)
-                content_pointer -= 1
-    return requests
+    insertTable puts a newline at the requested index, so the table itself starts one index later.
+    The table start, every row start and every cell start each take one index, and each empty
+    cell holds a single newline, so the layout is fixed by the table's dimensions.
+    """
+    return table_start_index + 4 + row * (2 * num_cols + 1) + 2 * col
+
+def get_table_requests(table_data: tuple, start_index: int):
+    """Generates API requests that insert a table at start_index and fill its cells."""
+    num_rows, num_cols, cell_contents = table_data
+    requests = [{'insertTable': {'rows': num_rows, 'columns': num_cols, 'location': {'index': start_index}}}]
+    # Leading newline + table start + rows, each with one start index plus two per empty cell.
+    total_len = 2 + num_rows * (2 * num_cols + 1)
+
+    # Fill cells back to front so that earlier cell indices stay valid.
+    for position in reversed(range(len(cell_contents))):
+        text_to_insert = cell_contents[position]
+        if not text_to_insert:
+            continue
+        row, col = divmod(position, num_cols)
+        cell_start_index = get_table_cell_index(start_index, num_cols, row, col)
+        # Process cell content for inline styles (e.g., bold)
+        inline_requests, inserted_len = handle_inline_styles(text_to_insert, cell_start_index)
+        requests.extend(inline_requests)
+        total_len += inserted_len
+
+    return requests, total_len
 
 def get_list_requests(list_lines: list, list_type: str, start_index: int):
     """Generates API requests for a list block."""
@@ -200,6 +272,7 @@ def get_list_requests(list_lines: list, list_type: str, start_index: int):
     else:
         indent_unit = 2
 
+    tab_count = 0
     for line in list_lines:
         # Calculate indentation based on detected unit
         leading_spaces = len(line) - len(line.lstrip(' '))
@@ -225,6 +298,7 @@ def get_list_requests(list_lines: list, list_type: str, start_index: int):
                 }
             })
             current_index += indent_level
+            tab_count += indent_level
             
         # 2. Insert Content with Styles
         inline_reqs, inserted_len = handle_inline_styles(content, current_index)
@@ -241,7 +315,9 @@ def get_list_requests(list_lines: list, list_type: str, start_index: int):
         current_index += 1
 
     # 4. Apply Bullets to the whole block
-    total_len = current_index - start_index
+    # createParagraphBullets turns the leading tabs into nesting levels and removes them,
+    # so they do not count towards the length the block finally occupies.
+    total_len = current_index - start_index - tab_count
     bullet_preset = 'BULLET_DISC_CIRCLE_SQUARE' if list_type == 'unordered' else 'NUMBERED_DECIMAL_ALPHA_ROMAN'
     
     requests.append({
@@ -297,171 +373,198 @@ def utf16_len(s: str) -> int:
     """Calculates the length of a string in UTF-16 code units."""
     return len(s.encode('utf-16-le')) // 2
 
+# Characters that can open an inline token: bold/italic, link, inline code.
+INLINE_TOKEN_START = re.compile(r'[*\[`]')
+ASTRAL_CHARACTER = re.compile('[\U00010000-\U0010ffff]')
+
+PLAIN_TEXT_FIELDS = 'bold,italic,underline,strikethrough,backgroundColor,link,weightedFontFamily'
+
+def _plain_text_style():
+    # Explicitly reset all styles for plain text to avoid inheritance
+    return {
+        'bold': False,
+        'italic': False,
+        'underline': False,
+        'strikethrough': False,
+        'backgroundColor': {},
+        'link': None,
+        'weightedFontFamily': {
+            'fontFamily': 'Arial' # Reset font to a default
+        }
+    }
+
+def _inline_code_style():
+    return {
+        'weightedFontFamily': {
+            'fontFamily': 'Courier New'
+        },
+        'backgroundColor': {
+            'color': {
+                'rgbColor': {
+                    'red': 0.93, 'green': 0.93, 'blue': 0.93
+                }
+            }
+        }
+    }
+
+class _InlineScanner:
+    """Splits a line into inline tokens in one left-to-right pass.
+
+    Tokens are matched exactly as the earlier re.split based parser matched them, corner
+    cases included: '**' with no closing pair is an empty italic token, and text after a
+    link inside bold or italic text is dropped.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        # needle -> (start, position of its first occurrence at or after start). Scan
+        # positions only move forward, so each needle's search reads the text at most once.
+        self._found = {}
+
+    def _find(self, needle: str, start: int) -> int:
+        found = self._found.get(needle)
+        if found is None or start < found[0] or -1 < found[1] < start:
+            found = (start, self.text.find(needle, start))
+            self._found[needle] = found
+        return found[1]
+
+    def tokens(self):
+        """Yields (kind, start, end, url) with kind one of 'plain', 'bold', 'italic', 'link' and 'code'.
+
+        start and end delimit the token's text without its markers; url is only set for links.
+        """
+        text = self.text
+        plain_start = 0
+        position = 0
+        while (candidate := INLINE_TOKEN_START.search(text, position)) is not None:
+            position = candidate.start()
+            token = self._token_at(position)
+            if token is None:
+                position += 1
+                continue
+            yield 'plain', plain_start, position, None
+            yield token[:4]
+            plain_start = position = token[4]
+        yield 'plain', plain_start, len(text), None
+
+    def _token_at(self, position: int):
+        """Returns (kind, start, end, url, token_end) for a token opening at position, or None."""
+        text = self.text
+        char = text[position]
+        if char == '*':
+            line_end = self._line_end(position)
+            if text.startswith('*', position + 1):
+                close = self._find('**', position + 2)
+                if close != -1 and close < line_end:
+                    return 'bold', position + 2, close, None, close + 2
+            close = self._find('*', position + 1)
+            if close != -1 and close < line_end:
+                return 'italic', position + 1, close, None, close + 1
+            return None
+        if char == '`':
+            close = self._find('`', position + 1)
+            if close != -1 and close < self._line_end(position):
+                return 'code', position + 1, close, None, close + 1
+            return None
+        link = self._link_at(position, len(text))
+        if link is None:
+            return None
+        text_end, url_end = link
+        return 'link', position + 1, text_end, text[text_end + 2:url_end], url_end + 1
+
+    def _line_end(self, position: int) -> int:
+        newline = self._find('\n', position)
+        return len(self.text) if newline == -1 else newline
+
+    def _link_at(self, position: int, limit: int):
+        """Matches [text](url) at position within text[:limit]; returns the ']' and ')' positions."""
+        text_end = self._find(']', position + 1)
+        if text_end == -1 or text_end == position + 1 or text_end + 1 >= limit or self.text[text_end + 1] != '(':
+            return None
+        url_end = self._find(')', text_end + 2)
+        if url_end == -1 or url_end == text_end + 2 or url_end >= limit:
+            return None
+        return text_end, url_end
+
+    def first_link(self, start: int, end: int):
+        """Finds the leftmost link lying entirely within text[start:end]."""
+        position = self.text.find('[', start, end)
+        while position != -1:
+            link = self._link_at(position, end)
+            if link is not None:
+                return position, link[0], link[1]
+            position = self.text.find('[', position + 1, end)
+        return None
+
+def _astral_positions(text: str) -> list:
+    """Positions of the characters outside the BMP, which take two UTF-16 code units each."""
+    if text.isascii():
+        return []
+    return [match.start() for match in ASTRAL_CHARACTER.finditer(text)]
+
 def handle_inline_styles(text: str, start_index: int):
     """
     Correctly handles multiple and nested inline styles like bold, links, and inline code,
     overriding any inherited document styles by explicitly styling every text segment.
     """
     requests = []
-    
-    # Regex to find all markdown tokens (bold, italics, link, or inline code)
-    # Note: ** must be before * in regex to match bold before italic
-    token_regex = r'(\*\*(?:.*?)\*\*|\*(?:.*?)\*|\[[^\]]+\]\([^\)]+\)|`(?:.*?)`)'
-    parts = re.split(token_regex, text)
-    
-    current_pos = start_index
-    for part in parts:
-        if not part:
-            continue
-
-        # Is the part a bold token?
-        bold_match = re.fullmatch(r'\*\*(?P<text>.*?)\*\*', part)
-        if bold_match:
-            bold_content = bold_match.group('text')
-            # Now, recursively handle styles within the bold content
-            # This is a simplified recursion: we just check for links inside.
-            link_in_bold_match = re.match(r'^(.*?)(\[[^\]]+\]\([^\)]+\))(.*?)', bold_content)
-            if link_in_bold_match:
-                # Handle text before, the link, and text after, all as bold
-                before_text, link_token, after_text = link_in_bold_match.groups()
-                
-                # 1. Text before link (bold)
-                if before_text:
-                    u16_len = utf16_len(before_text)
-                    requests.append({'insertText': {'location': {'index': current_pos}, 'text': before_text}})
-                    requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len}, 'textStyle': {'bold': True}, 'fields': 'bold'}})
-                    current_pos += u16_len
-
-                # 2. The link itself (bold and linked)
-                if link_token:
-                    link_full_match = re.fullmatch(r'\[(?P<text>[^\]]+)\]\((?P<url>[^\)]+)\)', link_token)
-                    link_text = link_full_match.group('text')
-                    link_url = link_full_match.group('url')
-                    u16_len = utf16_len(link_text)
-                    requests.append({'insertText': {'location': {'index': current_pos}, 'text': link_text}})
-                    requests.append({
-                        'updateTextStyle': {
-                            'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len},
-                            'textStyle': {'bold': True, 'link': {'url': link_url}},
-                            'fields': 'bold,link'
-                        }
-                    })
-                    current_pos += u16_len
-
-                # 3. Text after link (bold)
-                if after_text:
-                    u16_len = utf16_len(after_text)
-                    requests.append({'insertText': {'location': {'index': current_pos}, 'text': after_text}})
-                    requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len}, 'textStyle': {'bold': True}, 'fields': 'bold'}})
-                    current_pos += u16_len
-            else:
-                # No nesting, just a simple bold token
-                u16_len = utf16_len(bold_content)
-                requests.append({'insertText': {'location': {'index': current_pos}, 'text': bold_content}})
-                requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len}, 'textStyle': {'bold': True}, 'fields': 'bold'}})
-                current_pos += u16_len
-            continue
+    scanner = _InlineScanner(text)
+    # UTF-16 length of text[start:end] is its character count plus the astral characters in it.
+    astral = _astral_positions(text)
+
+    def emit(start, end, style, fields):
+        nonlocal current_pos
+        length = end - start
+        if astral:
+            length += bisect_left(astral, end) - bisect_left(astral, start)
+        requests.append({'insertText': {'location': {'index': current_pos}, 'text': text[start:end]}})
+        requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + length}, 'textStyle': style, 'fields': fields}})
+        current_pos += length
 
-        # Is the part an italic token?
-        italic_match = re.fullmatch(r'\*(?P<text>.*?)\*', part)
-        if italic_match:
-            italic_content = italic_match.group('text')
-            # Check for links inside italic
-            link_in_italic_match = re.match(r'^(.*?)(\[[^\]]+\]\([^\)]+\))(.*?)', italic_content)
-            if link_in_italic_match:
-                before_text, link_token, after_text = link_in_italic_match.groups()
-                if before_text:
-                    u16_len = utf16_len(before_text)
-                    requests.append({'insertText': {'location': {'index': current_pos}, 'text': before_text}})
-                    requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len}, 'textStyle': {'italic': True}, 'fields': 'italic'}})
-                    current_pos += u16_len
-                if link_token:
-                    link_full_match = re.fullmatch(r'\[(?P<text>[^\]]+)\]\((?P<url>[^\)]+)\)', link_token)
-                    link_text = link_full_match.group('text')
-                    link_url = link_full_match.group('url')
-                    u16_len = utf16_len(link_text)
-                    requests.append({'insertText': {'location': {'index': current_pos}, 'text': link_text}})
-                    requests.append({
-                        'updateTextStyle': {
-                            'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len},
-                            'textStyle': {'italic': True, 'link': {'url': link_url}},
-                            'fields': 'italic,link'
-                        }
-                    })
-                    current_pos += u16_len
-                if after_text:
-                    u16_len = utf16_len(after_text)
-                    requests.append({'insertText': {'location': {'index': current_pos}, 'text': after_text}})
-                    requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len}, 'textStyle': {'italic': True}, 'fields': 'italic'}})
-                    current_pos += u16_len
-            else:
-                u16_len = utf16_len(italic_content)
-                requests.append({'insertText': {'location': {'index': current_pos}, 'text': italic_content}})
-                requests.append({'updateTextStyle': {'range': {'startIndex': current_pos, 'endIndex': current_pos + u16_len}, 'textStyle': {'italic': True}, 'fields': 'italic'}})
-                current_pos += u16_len
+    current_pos = start_index
+    for kind, start, end, url in scanner.tokens():
+        if kind in ('bold', 'italic'):
+            # Links are the only style recognised inside bold or italic text.
+            link = scanner.first_link(start, end)
+            if link is None:
+                emit(start, end, {kind: True}, kind)
+                continue
+            link_start, text_end, url_end = link
+            if link_start > start:
+                emit(start, link_start, {kind: True}, kind)
+            emit(link_start + 1, text_end, {kind: True, 'link': {'url': text[text_end + 2:url_end]}}, f'{kind},link')
+        elif start == end:
             continue
-
-        # Is the part a link token (and not inside bold or italic)?
-        link_match = re.fullmatch(r'\[(?P<text>[^\]]+)\]\((?P<url>[^\)]+)\)', part)
-        if link_match:
-            content = link_match.group('text')
-            style = {'link': {'url': link_match.group('url')}}
-            fields = 'link'
-        # Is the part an inline code token?
-        elif (code_match := re.fullmatch(r'`(?P<text>.*?)`', part)):
-            content = code_match.group('text')
-            style = {
-                'weightedFontFamily': {
-                    'fontFamily': 'Courier New'
-                },
-                'backgroundColor': {
-                    'color': {
-                        'rgbColor': {
-                            'red': 0.93, 'green': 0.93, 'blue': 0.93
-                        }
-                    }
-                }
-            }
-            fields = 'weightedFontFamily,backgroundColor'
-        # Otherwise, it's plain text
+        elif kind == 'link':
+            emit(start, end, {'link': {'url': url}}, 'link')
+        elif kind == 'code':
+            emit(start, end, _inline_code_style(), 'weightedFontFamily,backgroundColor')
         else:
-            content = part
-            # Explicitly reset all styles for plain text to avoid inheritance
-            style = {
-                'bold': False,
-                'italic': False,
-                'underline': False,
-                'strikethrough': False,
-                'backgroundColor': {},
-                'link': None,
-                'weightedFontFamily': {
-                    'fontFamily': 'Arial' # Reset font to a default
-                }
-            }
-            fields = 'bold,italic,underline,strikethrough,backgroundColor,link,weightedFontFamily'
+            emit(start, end, _plain_text_style(), PLAIN_TEXT_FIELDS)
 
-        if not content:
-            continue
+    return requests, (current_pos - start_index)
 
-        # 1. Insert the text segment
-        requests.append({'insertText': {'location': {'index': current_pos}, 'text': content}})
-        
-        u16_len = utf16_len(content)
-        segment_start = current_pos
-        segment_end = current_pos + u16_len
-        
-        # 2. Apply the determined style
-        requests.append({
-            'updateTextStyle': {
-                'range': {'startIndex': segment_start, 'endIndex': segment_end},
-                'textStyle': style,
-                'fields': fields
+def get_hr_requests(start_index: int):
+    """Generates API requests for a horizontal rule (an empty paragraph with a bottom border)."""
+    requests = [
+        {'insertText': {'location': {'index': start_index}, 'text': '\n'}},
+        {
+            'updateParagraphStyle': {
+                'range': {'startIndex': start_index, 'endIndex': start_index + 1},
+                'paragraphStyle': {
+                    'borderBottom': {
+                        'color': {'color': {'rgbColor': {'red': 0, 'green': 0, 'blue': 0}}},
+                        'width': {'magnitude': 1, 'unit': 'PT'},
+                        'padding': {'magnitude': 0, 'unit': 'PT'},
+                        'dashStyle': 'SOLID'
+                    }
+                },
+                'fields': 'borderBottom'
             }
-        })
-        
-        current_pos += u16_len
-        
-    return requests, (current_pos - start_index)
+        },
+        {'insertText': {'location': {'index': start_index + 1}, 'text': '\n'}}
+    ]
+    return requests, 2
 
 def get_code_block_requests(code_content: str, start_index: int):
     """Generates API requests for a block of code (multi-line monospace)."""
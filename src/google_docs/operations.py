@@ -1,16 +1,44 @@
+import contextvars
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
+from drive_batch import DriveBatch
+from quota import UncertainWriteError
 
-def execute_batch_update(docs_service, document_id: str, requests: list) -> dict:
-    """Executes a batchUpdate request and returns the API response."""
+# Default caps for one batchUpdate body when a request list is sent in chunks.
+MAX_CHUNK_REQUESTS = 500
+MAX_CHUNK_BYTES = 2 * 1024 * 1024
+
+# Requests that only restyle text already placed by an earlier request. A chunk never starts
+# with one of these, so the text an insert places and its styling are applied together.
+_FOLLOWER_KINDS = ('updateTextStyle', 'updateParagraphStyle', 'createParagraphBullets', 'deleteParagraphBullets')
+
+def execute_batch_update(docs_service, document_id: str, requests: list, required_revision_id: str = None) -> dict:
+    """Executes a batchUpdate request and returns the API response.
+
+    When required_revision_id is given it is sent as writeControl, so the write is rejected
+    instead of landing at stale indices if the document changed since that revision.
+    The revision produced by the write is returned as "revision_id".
+
+    If a server error interrupted the write and its retry was rejected as stale, the document
+    is read again: an unchanged revision means the write never landed and it is sent again,
+    otherwise the result is an error with "uncertain" set and the revision now current.
+    """
     try:
         if not requests:
             return {"status": "success", "message": "No changes were needed."}
         
-        response = docs_service.documents().batchUpdate(documentId=document_id, body={'requests': requests}).execute()
-        return {"status": "success", "message": f"Successfully updated document {document_id}.", "api_response": response}
+        body = {'requests': requests}
+        if required_revision_id:
+            body['writeControl'] = {'requiredRevisionId': required_revision_id}
+        response = docs_service.documents().batchUpdate(documentId=document_id, body=body).execute()
+        revision_id = response.get('writeControl', {}).get('requiredRevisionId')
+        return {"status": "success", "message": f"Successfully updated document {document_id}.", "api_response": response, "revision_id": revision_id}
+    except UncertainWriteError:
+        return _recheck_uncertain_write(docs_service, document_id, requests, required_revision_id)
     except HttpError as err:
         # Extracting the error message from the HttpError
         error_details = str(err)
@@ -23,6 +51,102 @@ def execute_batch_update(docs_service, document_id: str, requests: list) -> dict
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred: {e}"}
 
+def _recheck_uncertain_write(docs_service, document_id: str, requests: list, required_revision_id: str) -> dict:
+    try:
+        doc = docs_service.documents().get(documentId=document_id, fields='revisionId').execute()
+    except Exception:
+        doc = {}
+    current_revision_id = doc.get('revisionId')
+    if current_revision_id and current_revision_id == required_revision_id:
+        return execute_batch_update(docs_service, document_id, requests, required_revision_id)
+    return {"status": "error", "uncertain": True, "current_revision_id": current_revision_id,
+            "message": "A server error interrupted the write and the document has changed since, so it may or may not "
+                       "have been applied. Read the document again before retrying."}
+
+def execute_chunked_batch_update(docs_service, document_id: str, requests: list, required_revision_id: str = None,
+                                 max_requests: int = MAX_CHUNK_REQUESTS, max_bytes: int = MAX_CHUNK_BYTES) -> dict:
+    """Executes a request list as ordered batchUpdate calls that each stay under the size caps.
+
+    Requests inside one batchUpdate are applied one after another, so applying consecutive
+    slices of the list in order gives the same document as a single call. Chunks are cut
+    only in front of a request that places content, never between an insert and the styles
+    that follow it. The revision returned by each chunk is required by the next one, and
+    the next chunk is cut and serialized while the previous one is in flight.
+    Per-chunk request counts, payload sizes and timings are returned as "chunks", and the
+    number of chunks applied as "chunks_applied", so a failed write can be resumed.
+
+    requests may be any iterable, including a generator that compiles requests as they are
+    pulled: only the chunk in flight and the one being cut are held in memory.
+    """
+    chunks = iter_request_chunks(requests, max_requests, max_bytes)
+    try:
+        chunk, payload_bytes = next(chunks, (None, 0))
+    except Exception as e:
+        return {"status": "error", "message": f"An error occurred while preparing the requests: {e}", "chunks": []}
+    if chunk is None:
+        return execute_batch_update(docs_service, document_id, [], required_revision_id)
+
+    timings = []
+    applied = 0
+    revision_id = required_revision_id
+    result = None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while chunk is not None:
+            started = time.perf_counter()
+            # Run in a copy of the caller's context so context-scoped call accounting sees the request.
+            future = executor.submit(contextvars.copy_context().run, execute_batch_update, docs_service, document_id, chunk, revision_id)
+            try:
+                next_chunk, next_payload_bytes = next(chunks, (None, 0))
+                preparation_error = None
+            except Exception as e:
+                next_chunk, next_payload_bytes, preparation_error = None, 0, e
+            result = future.result()
+            timings.append({"requests": len(chunk), "payload_bytes": payload_bytes,
+                            "seconds": round(time.perf_counter() - started, 3)})
+            if result['status'] != 'success':
+                result = dict(result, message=f"Chunk {len(timings)} failed after {len(timings) - 1} applied: {result['message']}")
+                break
+            applied += 1
+            revision_id = result.get('revision_id') or revision_id
+            if preparation_error is not None:
+                result = {"status": "error", "message": f"Preparing chunk {len(timings) + 1} failed after {len(timings)} applied: {preparation_error}"}
+                break
+            chunk, payload_bytes = next_chunk, next_payload_bytes
+
+    # On failure this is the revision left by the last chunk that was applied.
+    return dict(result, chunks=timings, chunks_applied=applied, revision_id=revision_id)
+
+def iter_request_chunks(requests, max_requests: int = MAX_CHUNK_REQUESTS, max_bytes: int = MAX_CHUNK_BYTES):
+    """Yields (chunk, payload_bytes) slices of a request list under the request-count and byte caps.
+
+    A single group (an insert and its trailing style requests) larger than the caps is
+    split between requests rather than sent over the limit.
+    """
+    chunk, chunk_bytes = [], 0
+    for group in _request_groups(requests):
+        sizes = [len(json.dumps(request)) + 2 for request in group]
+        if chunk and (len(chunk) + len(group) > max_requests or chunk_bytes + sum(sizes) > max_bytes):
+            yield chunk, chunk_bytes
+            chunk, chunk_bytes = [], 0
+        for request, size in zip(group, sizes):
+            if chunk and (len(chunk) + 1 > max_requests or chunk_bytes + size > max_bytes):
+                yield chunk, chunk_bytes
+                chunk, chunk_bytes = [], 0
+            chunk.append(request)
+            chunk_bytes += size
+    if chunk:
+        yield chunk, chunk_bytes
+
+def _request_groups(requests):
+    group = []
+    for request in requests:
+        if group and next(iter(request)) not in _FOLLOWER_KINDS:
+            yield group
+            group = []
+        group.append(request)
+    if group:
+        yield group
+
 def create_doc(drive_service, title: str, folder_id: str = None):
     """Creates a new Google Doc."""
     file_metadata = {'name': title, 'mimeType': 'application/vnd.google-apps.document'}
@@ -34,6 +158,30 @@ def create_doc(drive_service, title: str, folder_id: str = None):
     except Exception as e:
         return {"status": "error", "message": f"An error occurred creating the document: {e}"}
 
+def create_docs(drive_service, titles: list, folder_id: str = None) -> list:
+    """Creates several Google Docs through batched Drive requests (up to 100 per round trip).
+
+    Returns one create_doc-style result per title, in the same order.
+    """
+    batch = DriveBatch(drive_service)
+    for position, title in enumerate(titles):
+        file_metadata = {'name': title, 'mimeType': 'application/vnd.google-apps.document'}
+        if folder_id:
+            file_metadata['parents'] = [folder_id]
+        batch.create(file_metadata, key=position)
+    try:
+        responses = batch.execute()
+    except Exception as e:
+        return [{"status": "error", "message": f"An error occurred creating the document: {e}"} for _ in titles]
+    results = []
+    for position in range(len(titles)):
+        response = responses.get(position)
+        if isinstance(response, dict):
+            results.append({"status": "success", "document_id": response.get('id')})
+        else:
+            results.append({"status": "error", "message": f"An error occurred creating the document: {response}"})
+    return results
+
 def upload_public_image(drive_service, file_path: str) -> dict:
     """Uploads an image to Drive, makes it public, and returns info including the webContentLink and dimensions."""
     try:
@@ -58,6 +206,7 @@ def upload_public_image(drive_service, file_path: str) -> dict:
         
         metadata = file.get('imageMediaMetadata', {})
         return {
+            'file_id': file_id,
             'url': file.get('webContentLink'),
             'width': metadata.get('width'),
             'height': metadata.get('height')
@@ -0,0 +1,240 @@
+import difflib
+import hashlib
+from bisect import bisect_left
+from . import markdown_parser
+from .consistency import RevisionTracker
+from .content_installer import compile_operation, compile_operation_plan
+from .plan_cache import block_key
+from .request_optimizer import optimize_requests
+from .text_index import SegmentText, _collect_runs
+
+# Named ranges marking the blocks written here: md-block:<block hash>:<text digest>.
+BLOCK_RANGE_PREFIX = 'md-block:'
+OVERWRITE_FIELDS = 'revisionId,body(content),namedRanges'
+TAG_FIELDS = 'revisionId,body(content)'
+
+class _OldBlock:
+    """A span of the current body: a tagged block that still holds the text it was written with, or untagged content."""
+    __slots__ = ('key', 'start', 'end', 'named_range_id')
+
+    def __init__(self, key, start: int, end: int, named_range_id: str = None):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.named_range_id = named_range_id
+
+def update_google_doc(docs_service, document_id: str, markdown_content: str, revision_tracker: RevisionTracker = None) -> dict:
+    """Overwrites a Google Doc with markdown_content, rewriting only the blocks that changed.
+
+    Every block written here is tagged with a named range holding the hash of its markdown
+    and a digest of its text. The document is read once, its tagged blocks are aligned with
+    the new operation plan by hash, and only the blocks that differ are deleted and inserted,
+    in one batchUpdate; unchanged blocks are not touched and an unchanged document is not
+    written at all. Untagged content, and blocks edited since they were tagged, count as
+    changed, so the first update of an untagged document rewrites all of it. Inserted
+    blocks are tagged in a second batchUpdate.
+    """
+    try:
+        tracker = revision_tracker or RevisionTracker()
+        doc = docs_service.documents().get(documentId=document_id, fields=OVERWRITE_FIELDS).execute()
+        tracker.observe(doc.get('revisionId'))
+
+        operations = _block_operations(markdown_content)
+        new_keys = [_block_hash(operation) for operation in operations]
+        old_blocks, stale_range_ids = _read_blocks(doc)
+
+        matcher = difflib.SequenceMatcher(None, [block.key for block in old_blocks], new_keys, autojunk=False)
+        body_end = _body_end(doc)
+        edits = _edit_script(matcher.get_opcodes(), old_blocks, _paragraph_styles(doc), body_end)
+        if not edits and not stale_range_ids:
+            return {"status": "success", "document_id": document_id, "message": "Document is already up to date.",
+                    "blocks": {"kept": len(old_blocks), "deleted": 0, "inserted": 0}, "consistency": tracker.report()}
+
+        # Work from the end of the body backwards, so each edit only shifts content already handled.
+        requests = [{'deleteNamedRange': {'namedRangeId': named_range_id}} for named_range_id in stale_range_ids]
+        deleted = inserted = 0
+        for i1, i2, j1, j2 in reversed(edits):
+            start = old_blocks[i1].start if i1 < len(old_blocks) else body_end
+            for block in old_blocks[i1:i2]:
+                if block.named_range_id:
+                    requests.append({'deleteNamedRange': {'namedRangeId': block.named_range_id}})
+            if i2 > i1:
+                requests.append({'deleteContentRange': {'range': {'startIndex': start, 'endIndex': old_blocks[i2 - 1].end}}})
+            block_requests, _ = compile_operation_plan(operations[j1:j2], start)
+            tracker.note_blocks(j2 - j1)
+            requests.extend(block_requests)
+            deleted += i2 - i1
+            inserted += j2 - j1
+
+        requests, optimization = optimize_requests(requests)
+        result = tracker.execute(docs_service, document_id, requests)
+        if result['status'] != 'success':
+            return result
+
+        if inserted:
+            result = _tag_inserted_blocks(docs_service, document_id, tracker, edits, old_blocks, operations, new_keys)
+            if result['status'] != 'success':
+                return result
+
+        return {"status": "success", "document_id": document_id,
+                "message": f"Deleted {deleted} and inserted {inserted} block(s); {len(operations) - inserted} unchanged.",
+                "blocks": {"kept": len(operations) - inserted, "deleted": deleted, "inserted": inserted},
+                "consistency": tracker.report(), "optimization": optimization}
+
+    except Exception as e:
+        return {"status": "error", "message": f"An unexpected error occurred during the update: {e}"}
+
+def tag_google_doc_blocks(docs_service, document_id: str, markdown_content: str, revision_tracker: RevisionTracker = None) -> dict:
+    """Tags the blocks of a document whose body install_content has just written from markdown_content.
+
+    A later update_google_doc then recognises them and only rewrites what changed. This
+    costs a read of the body and a batchUpdate with one createNamedRange per block, so
+    only call it for documents meant to be updated incrementally. Nothing is tagged if
+    the body does not line up with the blocks, e.g. because it held other content.
+    """
+    try:
+        tracker = revision_tracker or RevisionTracker()
+        operations = _block_operations(markdown_content)
+        doc = docs_service.documents().get(documentId=document_id, fields=TAG_FIELDS).execute()
+        tracker.observe(doc.get('revisionId'))
+        starts = {element.get('startIndex', 0) for element in doc.get('body', {}).get('content', [])}
+        position, aligned = 1, bool(operations)
+        for operation in operations:
+            aligned = aligned and position in starts
+            position += compile_operation(operation, position)[1]
+        if not aligned or position != _body_end(doc):
+            return {"status": "success", "message": "No blocks to tag.", "tagged": 0}
+        requests = _tag_requests(_body_text(doc), operations, [_block_hash(operation) for operation in operations],
+                                 set(range(len(operations))), iter(()))
+        result = tracker.execute(docs_service, document_id, requests)
+        return dict(result, tagged=len(requests)) if result['status'] == 'success' else result
+    except Exception as e:
+        return {"status": "error", "message": f"An unexpected error occurred while tagging the blocks: {e}"}
+
+def _block_operations(markdown_content: str) -> list:
+    """The blocks update_google_doc aligns, with one block per line of simple text.
+
+    Editing a paragraph then only rewrites that paragraph, but every line of text carries
+    its own named range: a document of a few hundred paragraphs takes as many
+    createNamedRange requests to tag. Pieces that add nothing, such as a lone blank line,
+    cannot be tagged and are dropped.
+    """
+    return [operation for operation in markdown_parser.iter_operation_plan(markdown_content.splitlines(), max_simple_lines=1)
+            if compile_operation(operation, 1)[1]]
+
+def _block_hash(operation: dict) -> str:
+    return block_key(operation, True)[:16]
+
+def _text_digest(text: SegmentText, start: int, end: int) -> str:
+    """Digest of the text and UTF-16 length of [start, end); tables count by their cell text."""
+    first, last = bisect_left(text.indices, start), bisect_left(text.indices, end)
+    payload = f"{end - start}:{''.join(text.chars[first:last])}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _body_text(doc: dict) -> SegmentText:
+    text = SegmentText('')
+    _collect_runs(doc.get('body', {}).get('content', []), text)
+    return text
+
+def _body_end(doc: dict) -> int:
+    """Index of the body's final newline, the point new blocks are appended at."""
+    content = doc.get('body', {}).get('content', [])
+    return max(content[-1].get('endIndex', 2) - 1, 1) if content else 1
+
+def _read_blocks(doc: dict):
+    """Splits the body into tagged blocks and untagged gaps, and lists the tags no longer valid.
+
+    Gaps get unique keys, so they never match a new block and are always replaced.
+    """
+    text = _body_text(doc)
+    body_end = _body_end(doc)
+    tagged, stale_range_ids = [], []
+    for name, ranges in doc.get('namedRanges', {}).items():
+        if not name.startswith(BLOCK_RANGE_PREFIX):
+            continue
+        key, _, digest = name[len(BLOCK_RANGE_PREFIX):].partition(':')
+        for named_range in ranges.get('namedRanges', []):
+            spans = named_range.get('ranges', [])
+            span = spans[0] if len(spans) == 1 else {}
+            start, end = span.get('startIndex', 0), span.get('endIndex', 0)
+            if span.get('segmentId') or not 1 <= start < end <= body_end or _text_digest(text, start, end) != digest:
+                stale_range_ids.append(named_range['namedRangeId'])
+            else:
+                tagged.append(_OldBlock(key, start, end, named_range['namedRangeId']))
+
+    blocks = []
+    position = 1
+    for block in sorted(tagged, key=lambda block: block.start):
+        if block.start < position:
+            stale_range_ids.append(block.named_range_id)
+            continue
+        if block.start > position:
+            blocks.append(_OldBlock(('gap', position), position, block.start))
+        blocks.append(block)
+        position = block.end
+    if position < body_end:
+        blocks.append(_OldBlock(('gap', position), position, body_end))
+    return blocks, stale_range_ids
+
+def _paragraph_styles(doc: dict) -> dict:
+    """Maps the start index of every body paragraph to the styles text inserted there inherits.
+
+    Those are its paragraph style and bullet, and the text style of its first character.
+    """
+    styles = {}
+    for element in doc.get('body', {}).get('content', []):
+        paragraph = element.get('paragraph')
+        if paragraph is not None:
+            runs = paragraph.get('elements', [])
+            text_style = runs[0].get('textRun', {}).get('textStyle') if runs else None
+            styles[element.get('startIndex', 0)] = (paragraph.get('paragraphStyle'), paragraph.get('bullet'), text_style)
+    return styles
+
+def _edit_script(opcodes: list, old_blocks: list, paragraph_styles: dict, body_end: int) -> list:
+    """Turns difflib opcodes into (i1, i2, j1, j2) replacements of old blocks by new ones.
+
+    Inserted text takes the paragraph and text style of the paragraph it is inserted into.
+    A fresh write inserts everything into the final paragraph, so when a kept block after an
+    insertion starts with a paragraph styled differently, such as a heading, a horizontal
+    rule or a line starting in bold, that block is rewritten along with the insertion.
+    """
+    default_style = paragraph_styles.get(body_end)
+    edits = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            while i1 < i2 and edits and edits[-1][1] == i1 and edits[-1][3] > edits[-1][2] and \
+                    paragraph_styles.get(old_blocks[i1].start) != default_style:
+                i1, j1 = i1 + 1, j1 + 1
+                edits[-1] = (edits[-1][0], i1, edits[-1][2], j1)
+            continue
+        if edits and edits[-1][1] == i1 and edits[-1][3] == j1:
+            i1, j1 = edits[-1][0], edits.pop()[2]
+        edits.append((i1, i2, j1, j2))
+    return edits
+
+def _tag_inserted_blocks(docs_service, document_id: str, tracker: RevisionTracker, edits: list, old_blocks: list, operations: list, new_keys: list) -> dict:
+    """Reads the body back and tags every inserted block with its hash and text digest."""
+    inserted = set()
+    for _, _, j1, j2 in edits:
+        inserted.update(range(j1, j2))
+    kept = iter(block for block_index, block in enumerate(old_blocks) if not any(i1 <= block_index < i2 for i1, i2, _, _ in edits))
+
+    doc = docs_service.documents().get(documentId=document_id, fields=TAG_FIELDS).execute()
+    tracker.observe(doc.get('revisionId'))
+    return tracker.execute(docs_service, document_id, _tag_requests(_body_text(doc), operations, new_keys, inserted, kept))
+
+def _tag_requests(text: SegmentText, operations: list, new_keys: list, inserted: set, kept) -> list:
+    """createNamedRange requests for the blocks in inserted; kept yields the old blocks left between them."""
+    requests = []
+    position = 1
+    for j, operation in enumerate(operations):
+        if j in inserted:
+            _, length = compile_operation(operation, position)
+            digest = _text_digest(text, position, position + length)
+            requests.append({'createNamedRange': {'name': f"{BLOCK_RANGE_PREFIX}{new_keys[j]}:{digest}",
+                                                  'range': {'startIndex': position, 'endIndex': position + length}}})
+        else:
+            block = next(kept)
+            length = block.end - block.start
+        position += length
+    return requests
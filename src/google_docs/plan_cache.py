@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Number of compiled blocks kept, and the largest block (in requests) worth keeping.
+PLAN_CACHE_SIZE = int(os.environ.get('GOOGLE_OFFICE_PLAN_CACHE_SIZE', 1024))
+MAX_CACHED_REQUESTS = 5000
+
+# Request fields that hold document indices. Nothing else in a compiled request is an index.
+INDEX_KEYS = frozenset(('index', 'startIndex', 'endIndex'))
+
+class CompiledBlock:
+    """The requests of one block compiled at index 0, and the UTF-16 length the block adds.
+
+    Compilation is translation invariant, so the requests for any other start index are
+    the same requests with every index shifted by that start index. Each request is kept
+    as a record of its kind, its relative location or range and the rest of its body.
+    Rebased copies get fresh request, location and range dicts, but share the style
+    bodies with the cache, so those must not be modified in place.
+    """
+    __slots__ = ('records', 'length')
+
+    def __init__(self, requests: list, length: int):
+        self.records = tuple(_record(request) for request in requests)
+        self.length = length
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def rebase(self, start_index: int) -> list:
+        """Returns the requests anchored at start_index, in one pass over the records."""
+        return [record.rebase(start_index) for record in self.records]
+
+class _Record:
+    __slots__ = ('kind', 'index', 'start', 'end', 'rest')
+
+    def __init__(self, kind: str, index, start, end, rest: dict):
+        self.kind = kind
+        self.index = index
+        self.start = start
+        self.end = end
+        self.rest = rest
+
+    def rebase(self, offset: int) -> dict:
+        payload = dict(self.rest)
+        if self.index is not None:
+            payload['location'] = {'index': self.index + offset}
+        if self.start is not None:
+            payload['range'] = {'startIndex': self.start + offset, 'endIndex': self.end + offset}
+        return {self.kind: payload}
+
+class _TemplateRecord:
+    """Fallback for a request with indices anywhere other than a plain location or range."""
+    __slots__ = ('request',)
+
+    def __init__(self, request: dict):
+        self.request = request
+
+    def rebase(self, offset: int) -> dict:
+        return _rebased(self.request, offset)
+
+def _record(request: dict):
+    if len(request) == 1:
+        (kind, payload), = request.items()
+        rest = {key: value for key, value in payload.items() if key not in ('location', 'range')}
+        location = payload.get('location')
+        rng = payload.get('range')
+        if (location is None or location.keys() == {'index'}) and \
+                (rng is None or rng.keys() == {'startIndex', 'endIndex'}) and not _has_index(rest):
+            return _Record(kind, location and location['index'], rng and rng['startIndex'], rng and rng['endIndex'], rest)
+    return _TemplateRecord(request)
+
+def _has_index(value) -> bool:
+    if isinstance(value, dict):
+        return any(key in INDEX_KEYS or _has_index(item) for key, item in value.items())
+    if isinstance(value, list):
+        return any(_has_index(item) for item in value)
+    return False
+
+def _rebased(value, offset: int):
+    if isinstance(value, dict):
+        return {key: item + offset if key in INDEX_KEYS else _rebased(item, offset) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rebased(item, offset) for item in value]
+    return value
+
+class PlanCache:
+    """LRU cache of CompiledBlocks keyed by a hash of the block's content and options."""
+
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compile(self, operation: dict, leading_newline: bool, compile_block) -> CompiledBlock:
+        """Returns the cached block for operation, calling compile_block() to build it on a miss."""
+        key = block_key(operation, leading_newline)
+        with self._lock:
+            block = self._entries.get(key)
+            if block is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return block
+            self.misses += 1
+
+        block = compile_block()
+        if len(block) <= MAX_CACHED_REQUESTS and self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = block
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return block
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+def block_key(operation: dict, leading_newline: bool) -> str:
+    payload = json.dumps([operation, leading_newline], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+_default_cache = PlanCache()
+
+def get_plan_cache() -> PlanCache:
+    """The process-wide cache used when compiling operation plans."""
+    return _default_cache
+
+def configure_plan_cache(max_entries: int):
+    """Replaces the process-wide cache with an empty one holding up to max_entries blocks (0 disables it)."""
+    global _default_cache
+    _default_cache = PlanCache(max_entries)
+
+def plan_cache_stats() -> dict:
+    """Hit, miss and eviction counts of the process-wide plan cache."""
+    return _default_cache.stats()
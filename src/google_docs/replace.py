@@ -1,120 +1,125 @@
-import re
-import time
 from . import markdown_parser
-from .operations import execute_batch_update
+from .consistency import RevisionTracker
+from .content_installer import compile_operation_plan
+from .request_optimizer import optimize_requests
+from .text_index import INDEX_FIELDS, DocumentTextIndex
 
-def replace_markdown_placeholders(docs_service, document_id: str, replacements: dict):
-    """Finds and replaces a placeholder with complex content."""
+def replace_markdown_placeholders(docs_service, document_id: str, replacements: dict, revision_tracker: RevisionTracker = None):
+    """Finds and replaces placeholders with complex content.
+
+    Every occurrence of every key in `replacements` is located from a single read of the
+    document, including keys split across differently styled runs and keys in tables,
+    headers, footers and footnotes. Matches are replaced in descending index order, so each
+    deletion and insertion only shifts text that has already been handled, and the whole set
+    of replacements goes out in one batchUpdate. A replacement that is a single line of text
+    is put inline, in the placeholder's own style, with only its markdown styles applied on
+    top. Block-level replacements (several lines, headings, lists, code, quotes, horizontal
+    rules and tables) start a new paragraph where the placeholder follows other text, and
+    take over the placeholder paragraph's newline where it ends the paragraph.
+    The result reports how many occurrences of each key were replaced.
+    """
     try:
-        key_to_replace, markdown_content = next(iter(replacements.items()))
+        tracker = revision_tracker or RevisionTracker()
+        replacements = {key: markdown_content for key, markdown_content in replacements.items() if key}
+        if not replacements:
+            return {"status": "error", "message": "No placeholders given."}
+
+        # 1. Find every placeholder's location in one read.
+        doc = docs_service.documents().get(documentId=document_id, fields=INDEX_FIELDS).execute()
+        tracker.observe(doc.get('revisionId'))
+        matches = DocumentTextIndex(doc).find(replacements, context=True)
 
-        # 1. Find the placeholder's location.
-        doc = docs_service.documents().get(documentId=document_id, fields='body(content)').execute()
-        content = doc.get('body', {}).get('content', [])
-        found_range = _find_placeholder_range(content, key_to_replace)
+        counts = {key: 0 for key in replacements}
+        for key, *_ in matches:
+            counts[key] += 1
+        missing = [key for key, count in counts.items() if not count]
+        if not matches:
+            return {"status": "error", "message": f"Placeholder(s) not found: {', '.join(repr(key) for key in missing)}."}
 
-        if not found_range:
-            return {"status": "error", "message": f"Placeholder '{key_to_replace}' not found."}
+        # 2. Working from the end of the document backwards, replace each match.
+        plans = {key: markdown_parser.create_operation_plan(replacements[key]) for key in replacements if counts[key]}
+        inline_texts = {key: _inline_text(plan) for key, plan in plans.items()}
+        requests = []
+        for key, found_range, before, after in sorted(matches, key=lambda match: match[1]['startIndex'], reverse=True):
+            if inline_texts[key] is not None:
+                block_requests = _inline_requests(inline_texts[key], key, found_range)
+            else:
+                block_requests = _block_requests(plans[key], found_range, before, after)
+            requests.extend(_in_segment(block_requests, found_range.get('segmentId')))
+            tracker.note_blocks(len(plans[key]))
 
-        # 2. Delete the placeholder.
-        delete_request = [{'deleteContentRange': {'range': found_range}}]
-        delete_result = execute_batch_update(docs_service, document_id, delete_request)
-        if delete_result['status'] != 'success':
-            return delete_result
-        
-        time.sleep(1) # Pause for consistency
+        requests, optimization = optimize_requests(requests)
+        result = tracker.execute(docs_service, document_id, requests)
+        if result['status'] != 'success':
+            return result
 
-        # 3. Install the new content at the placeholder's original start index.
-        return _install_content_at_index(docs_service, document_id, markdown_content, found_range['startIndex'])
+        return {"status": "success", "message": f"Replaced {len(matches)} placeholder occurrence(s).",
+                "replacements": counts, "missing": missing,
+                "consistency": tracker.report(), "optimization": optimization}
 
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred during replace: {e}"}
 
-def _find_placeholder_range(content: list, key: str) -> dict:
-    for element in content:
-        if 'paragraph' in element:
-            for run in element['paragraph']['elements']:
-                if 'textRun' in run and run['textRun']['content']:
-                    if key in run['textRun']['content']:
-                        for match in re.finditer(re.escape(key), run['textRun']['content']):
-                            start = run['startIndex'] + match.start()
-                            end = run['startIndex'] + match.end()
-                            return {'startIndex': start, 'endIndex': end}
-    return None
-
-def _install_content_at_index(docs_service, document_id: str, markdown_content: str, start_index: int):
-    """A dedicated installer for inserting mixed content at a specific index."""
-    operation_plan = markdown_parser.create_operation_plan(markdown_content)
+def _inline_text(operation_plan: list):
+    """The text of a replacement that fits inside a paragraph: one line of simple text that is not a heading."""
     if not operation_plan:
-        return {"status": "success", "message": "No content to install."}
+        return ''
+    if len(operation_plan) != 1 or operation_plan[0]['type'] != 'simple':
+        return None
+    lines = operation_plan[0]['content'].splitlines()
+    if len(lines) != 1 or markdown_parser.handle_paragraph_style(lines[0])[1]:
+        return None
+    return lines[0]
 
-    current_index = start_index
-    for operation in operation_plan:
-        # For each block, we must refetch the document to get correct indices.
-        # This is inefficient but necessary for mid-document insertion.
-        doc = docs_service.documents().get(documentId=document_id).execute()
-        doc_body = doc.get('body', {})
+def _inline_requests(text: str, key: str, found_range: dict) -> list:
+    """Replaces a match with text inside its paragraph, keeping the match's style.
 
-        if operation['type'] == 'simple':
-            requests, _ = markdown_parser.get_simple_markdown_requests(operation['content'], current_index)
-            result = execute_batch_update(docs_service, document_id, requests)
-        elif operation['type'] == 'table':
-            table_data = operation['data']
-            num_rows, num_cols, cell_contents = table_data
-            requests_insert = [{'insertTable': {'rows': num_rows, 'columns': num_cols, 'location': {'index': current_index}}}]
-            result = execute_batch_update(docs_service, document_id, requests_insert)
-            if result['status'] != 'success': return result
-            
-            time.sleep(1)
-            doc_after_table = docs_service.documents().get(documentId=document_id).execute()
-            populate_requests = markdown_parser.find_table_and_get_cell_requests(doc_after_table.get('body', {}), num_rows, num_cols, cell_contents, current_index)
-            if not populate_requests: return {"status": "error", "message": "Could not find table to populate."}
-            result = execute_batch_update(docs_service, document_id, populate_requests)
-        elif operation['type'] == 'hr':
-            requests = [
-                {'insertText': {'location': {'index': current_index}, 'text': '\n'}},
-                {
-                    'updateParagraphStyle': {
-                        'range': {'startIndex': current_index, 'endIndex': current_index + 1},
-                        'paragraphStyle': {
-                            'borderBottom': {
-                                'color': {'color': {'rgbColor': {'red': 0, 'green': 0, 'blue': 0}}},
-                                'width': {'magnitude': 1, 'unit': 'PT'},
-                                'padding': {'magnitude': 0, 'unit': 'PT'},
-                                'dashStyle': 'SOLID'
-                            }
-                        },
-                        'fields': 'borderBottom'
-                    }
-                },
-                {'insertText': {'location': {'index': current_index + 1}, 'text': '\n'}}
-            ]
-            result = execute_batch_update(docs_service, document_id, requests)
-        elif operation['type'] == 'code_block':
-            requests, _ = markdown_parser.get_code_block_requests(operation['content'], current_index)
-            result = execute_batch_update(docs_service, document_id, requests)
-        elif operation['type'] == 'blockquote':
-            requests, _ = markdown_parser.get_blockquote_requests(operation['content'], current_index)
-            result = execute_batch_update(docs_service, document_id, requests)
+    The text goes in after the match's first character, so it takes that character's style,
+    and the match is then deleted around it. Plain parts of the text are not restyled.
+    """
+    if not text:
+        return [{'deleteContentRange': {'range': found_range}}]
+    start, end = found_range['startIndex'], found_range['endIndex']
+    first_end = start + markdown_parser.utf16_len(key[0])
+    inline_requests, length = markdown_parser.handle_inline_styles(text, first_end)
+    requests = [request for request in inline_requests
+                if request.get('updateTextStyle', {}).get('fields') != markdown_parser.PLAIN_TEXT_FIELDS]
+    if end > first_end:
+        requests.append({'deleteContentRange': {'range': {'startIndex': first_end + length, 'endIndex': end + length}}})
+    requests.append({'deleteContentRange': {'range': {'startIndex': start, 'endIndex': first_end}}})
+    return requests
 
-        if result['status'] != 'success':
-            return result
-        time.sleep(1)
-        # After each block, we have to find the new insertion point. This is the hard part.
-        # For now, we will assume the next block just continues, which is wrong.
-        # A truly robust solution requires calculating the growth from the response, which is beyond this scope.
-        # Let's just re-fetch the end index as a simple (but incorrect for replace) strategy.
-        current_index = _get_end_index(docs_service, document_id) # This line is still problematic for replace.
+def _block_requests(operation_plan: list, found_range: dict, before: str, after: str) -> list:
+    """Replaces a match with blocks that get paragraphs of their own."""
+    start = found_range['startIndex']
+    requests = [{'deleteContentRange': {'range': found_range}}]
+    if before not in ('', '\n'):
+        # The match follows other text, which keeps its paragraph.
+        requests.append({'insertText': {'location': {'index': start}, 'text': '\n'}})
+        start += 1
+    block_requests, _ = compile_operation_plan(operation_plan, start, leading_newlines=False)
+    if after == '\n' and operation_plan[-1]['type'] != 'table':
+        # The match ends its paragraph, whose newline then ends the last block; a table
+        # always needs a paragraph after it.
+        _drop_final_newline(block_requests)
+    requests.extend(block_requests)
+    return requests
 
-    return {"status": "success", "message": "Successfully installed all content blocks."}
+def _drop_final_newline(requests: list):
+    """Removes the newline a compiled block inserts last, so the text after the block closes it."""
+    for position in range(len(requests) - 1, -1, -1):
+        if 'insertText' in requests[position]:
+            if requests[position]['insertText']['text'] == '\n':
+                del requests[position]
+            return
 
-def _get_end_index(docs_service, document_id: str) -> int:
-    try:
-        doc = docs_service.documents().get(documentId=document_id, fields='body(content(endIndex))').execute()
-        body_content = doc.get('body', {}).get('content', [])
-        for element in reversed(body_content):
-            if 'endIndex' in element:
-                return element['endIndex'] - 1
-        return 1
-    except Exception:
-        return 1
\ No newline at end of file
+def _in_segment(requests: list, segment_id: str) -> list:
+    """Points body-relative requests at a header, footer or footnote segment."""
+    if not segment_id:
+        return requests
+    for request in requests:
+        for payload in request.values():
+            for key in ('location', 'range'):
+                if key in payload:
+                    payload[key]['segmentId'] = segment_id
+    return requests
@@ -0,0 +1,214 @@
+import json
+from .markdown_parser import utf16_len
+
+# Requests optimized together when optimizing a stream.
+OPTIMIZER_WINDOW = 1000
+
+# Style requests that may be held back while a run of contiguous inserts is still growing.
+_STYLE_KINDS = ('updateTextStyle', 'updateParagraphStyle')
+
+def request_stats(requests: list) -> dict:
+    """Returns the request count and JSON payload size of a request list."""
+    return {"requests": len(requests), "payload_bytes": len(json.dumps(requests))}
+
+def optimize_requests(requests: list):
+    """Peephole pass over compiled Docs API requests.
+
+    - Adjacent insertText requests at contiguous indices are merged into one insert.
+      Style requests issued in between are moved after the merged insert; this is safe
+      because their ranges end at or before the point where the following text goes in.
+      Text inserted piece by piece inherits the style of the piece before it, so every
+      piece that relied on inheritance gets the inherited fields set explicitly.
+    - Consecutive identical style updates over touching or overlapping ranges are merged.
+    - Empty inserts, empty ranges, exact duplicates and updates fully overwritten by the
+      next update are dropped.
+
+    Any other request (tables, bullets, deletes, ...) is a barrier and keeps its position.
+    Returns the optimized list and a before/after report.
+    """
+    optimized = []
+    run = None
+
+    def flush():
+        nonlocal run
+        if run is None:
+            return
+        if run['text']:
+            location = {'index': run['index']}
+            if run['segment_id']:
+                location['segmentId'] = run['segment_id']
+            optimized.append({'insertText': {'location': location, 'text': run['text']}})
+        styles = []
+        for piece in run['pieces']:
+            if piece['inherited'] and piece['end'] > piece['start']:
+                styles.append(_text_style_request(piece['start'], piece['end'], run['segment_id'], piece['inherited']))
+            styles.extend(piece['styles'])
+        optimized.extend(_coalesce_styles(styles))
+        run = None
+
+    for request in requests:
+        if 'insertText' in request and 'location' in request['insertText']:
+            location = request['insertText']['location']
+            text = request['insertText'].get('text', '')
+            segment_id = location.get('segmentId', '')
+            if run and segment_id == run['segment_id'] and location['index'] == run['end']:
+                _extend_run(run, text)
+                continue
+            flush()
+            run = {'index': location['index'], 'end': location['index'], 'segment_id': segment_id,
+                   'text': '', 'paragraph_ends': set(), 'pieces': [], 'last_char_style': {}}
+            _extend_run(run, text)
+            continue
+
+        if run and _can_hold(request, run):
+            _hold_style(run, request)
+            continue
+
+        flush()
+        optimized.append(request)
+
+    flush()
+
+    before, after = request_stats(requests), request_stats(optimized)
+    report = {
+        "requests_before": before["requests"],
+        "requests_after": after["requests"],
+        "payload_bytes_before": before["payload_bytes"],
+        "payload_bytes_after": after["payload_bytes"],
+    }
+    return optimized, report
+
+def optimize_request_stream(requests, reports: list, window: int = OPTIMIZER_WINDOW):
+    """Runs optimize_requests over consecutive windows of a request stream, yielding the results.
+
+    Once a window holds `window` requests it is closed in front of the next insert that
+    starts a new paragraph. Text inserted at the start of a paragraph takes its style from
+    what follows, whether it is sent alone or merged, so optimizing each window on its own
+    gives the same document as optimizing the whole stream. Each window's report is
+    appended to `reports`.
+    """
+    pending = []
+    paragraph_start = False
+    for request in requests:
+        insert = request.get('insertText')
+        if insert is not None:
+            if paragraph_start and len(pending) >= window:
+                optimized, report = optimize_requests(pending)
+                reports.append(report)
+                yield from optimized
+                pending = []
+            paragraph_start = insert.get('text', '').endswith('\n')
+        pending.append(request)
+    if pending:
+        optimized, report = optimize_requests(pending)
+        reports.append(report)
+        yield from optimized
+
+def combine_reports(reports: list) -> dict:
+    """Sums several optimize_requests reports into one."""
+    combined = {"requests_before": 0, "requests_after": 0, "payload_bytes_before": 0, "payload_bytes_after": 0}
+    for report in reports:
+        for key in combined:
+            combined[key] += report.get(key, 0)
+    return combined
+
+def _extend_run(run: dict, text: str):
+    """Appends one insert to a run, recording the text style it would have inherited.
+
+    The first piece of a run, and any piece that starts a new paragraph, inherits from
+    the text around the anchor exactly as the merged insert will, so nothing is recorded.
+    """
+    starts_paragraph = not run['pieces'] or run['text'].endswith('\n')
+    inherited = {} if starts_paragraph else dict(run['last_char_style'])
+    length = utf16_len(text)
+    run['pieces'].append({'start': run['end'], 'end': run['end'] + length, 'inherited': inherited, 'styles': []})
+    if length:
+        run['last_char_style'] = dict(inherited)
+    if '\n' in text:
+        position = run['end']
+        for char in text:
+            position += utf16_len(char)
+            if char == '\n':
+                run['paragraph_ends'].add(position)
+    run['text'] += text
+    run['end'] += length
+
+def _hold_style(run: dict, request: dict):
+    """Defers a style request and tracks the explicit style of the run's last character."""
+    run['pieces'][-1]['styles'].append(request)
+    if 'updateTextStyle' not in request:
+        return
+    payload = request['updateTextStyle']
+    rng = payload['range']
+    if rng['startIndex'] <= run['end'] - 1 < rng['endIndex']:
+        text_style = payload.get('textStyle', {})
+        fields = _field_set(payload)
+        if '*' in fields:
+            run['last_char_style'] = dict(text_style)
+        else:
+            for field in fields:
+                run['last_char_style'][field] = text_style.get(field)
+
+def _text_style_request(start: int, end: int, segment_id: str, style: dict) -> dict:
+    rng = {'startIndex': start, 'endIndex': end}
+    if segment_id:
+        rng['segmentId'] = segment_id
+    return {'updateTextStyle': {'range': rng, 'textStyle': dict(style), 'fields': ','.join(style)}}
+
+def _can_hold(request: dict, run: dict) -> bool:
+    """A style request can wait for the run to finish if later inserts cannot change what it covers."""
+    kind = next(iter(request))
+    if kind not in _STYLE_KINDS:
+        return False
+    rng = request[kind]['range']
+    if rng.get('segmentId', '') != run['segment_id'] or rng['endIndex'] > run['end']:
+        return False
+    # Paragraph styles must end on a paragraph boundary; otherwise a later newline insert
+    # would split the paragraph and the style would only reach the first half.
+    if kind == 'updateParagraphStyle':
+        return rng['endIndex'] in run['paragraph_ends']
+    return True
+
+def _coalesce_styles(styles: list) -> list:
+    coalesced = []
+    for request in styles:
+        kind = next(iter(request))
+        rng = request[kind]['range']
+        if rng['startIndex'] >= rng['endIndex']:
+            continue
+        if coalesced:
+            previous = coalesced[-1]
+            previous_kind = next(iter(previous))
+            if previous_kind == kind and _same_style(previous[kind], request[kind]):
+                previous_range = previous[kind]['range']
+                if rng['startIndex'] <= previous_range['endIndex'] and rng['endIndex'] >= previous_range['startIndex']:
+                    merged = dict(previous[kind])
+                    merged['range'] = dict(previous_range,
+                                           startIndex=min(previous_range['startIndex'], rng['startIndex']),
+                                           endIndex=max(previous_range['endIndex'], rng['endIndex']))
+                    coalesced[-1] = {kind: merged}
+                    continue
+            if previous_kind == kind and _overwrites(request[kind], previous[kind]):
+                coalesced[-1] = request
+                continue
+        coalesced.append(request)
+    return coalesced
+
+def _style_body(payload: dict):
+    return payload.get('textStyle', payload.get('paragraphStyle'))
+
+def _field_set(payload: dict) -> set:
+    return {field.strip() for field in payload.get('fields', '').split(',') if field.strip()}
+
+def _same_style(a: dict, b: dict) -> bool:
+    return _field_set(a) == _field_set(b) and _style_body(a) == _style_body(b) \
+        and a['range'].get('segmentId', '') == b['range'].get('segmentId', '')
+
+def _overwrites(later: dict, earlier: dict) -> bool:
+    """True when `later` sets every field `earlier` sets, over a range that contains it."""
+    later_range, earlier_range = later['range'], earlier['range']
+    return later_range.get('segmentId', '') == earlier_range.get('segmentId', '') \
+        and later_range['startIndex'] <= earlier_range['startIndex'] \
+        and later_range['endIndex'] >= earlier_range['endIndex'] \
+        and '*' not in _field_set(earlier) \
+        and (_field_set(later) >= _field_set(earlier) or '*' in _field_set(later))
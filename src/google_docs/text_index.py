@@ -0,0 +1,147 @@
+from collections import deque
+from .markdown_parser import utf16_len
+
+# Partial-response mask covering every segment the index reads.
+INDEX_FIELDS = 'revisionId,body(content),headers,footers,footnotes'
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: finds every occurrence of any number of keys in one linear scan."""
+
+    def __init__(self, keys):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for key in keys:
+            if key:
+                self._add(key)
+        self._link()
+
+    def _add(self, key: str):
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if key not in self._output[state]:
+            self._output[state] += (key,)
+
+    def _link(self):
+        """Breadth-first pass that sets failure links and folds in the outputs they reach."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find_all(self, text: str):
+        """Yields (start, end, key) for every occurrence, with offsets into `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for key in output[state]:
+                yield position + 1 - len(key), position + 1, key
+
+    def find_leftmost_longest(self, text: str) -> list:
+        """Non-overlapping matches, preferring the earliest start and then the longest key."""
+        selected = []
+        covered_until = 0
+        for start, end, key in sorted(self.find_all(text), key=lambda match: (match[0], match[0] - match[1])):
+            if start >= covered_until:
+                selected.append((start, end, key))
+                covered_until = end
+        return selected
+
+class SegmentText:
+    """The text of one segment, with the document index of every character."""
+
+    def __init__(self, segment_id: str):
+        self.segment_id = segment_id
+        self.chars = []
+        self.indices = []
+
+    def add_run(self, content: str, start_index: int):
+        index = start_index
+        for char in content:
+            self.chars.append(char)
+            self.indices.append(index)
+            index += utf16_len(char)
+
+    def document_range(self, start: int, end: int):
+        """Maps a [start, end) character span to a document range, or None if the span is not contiguous.
+
+        A span is not contiguous when it skips over something the index has no text for, such
+        as an inline image or a footnote reference.
+        """
+        start_index = self.indices[start]
+        end_index = self.indices[end - 1] + utf16_len(self.chars[end - 1])
+        expected = sum(utf16_len(char) for char in self.chars[start:end])
+        if end_index - start_index != expected:
+            return None
+        rng = {'startIndex': start_index, 'endIndex': end_index}
+        if self.segment_id:
+            rng['segmentId'] = self.segment_id
+        return rng
+
+class DocumentTextIndex:
+    """Concatenated text of the body, headers, footers and footnotes of a document.
+
+    Text runs are joined across style boundaries and table cells are included, so a
+    placeholder that is partly bold, or sits in a table, header or footer, is still found.
+    """
+
+    def __init__(self, document: dict):
+        self.segments = []
+        self._add_segment('', document.get('body', {}).get('content', []))
+        for kind in ('headers', 'footers', 'footnotes'):
+            for segment_id, segment in document.get(kind, {}).items():
+                self._add_segment(segment_id, segment.get('content', []))
+
+    def _add_segment(self, segment_id: str, content: list):
+        segment = SegmentText(segment_id)
+        _collect_runs(content, segment)
+        self.segments.append(segment)
+
+    def find(self, keys, context: bool = False) -> list:
+        """Returns (key, range) for every non-overlapping occurrence of any key, segment by segment.
+
+        With context=True each match also carries the characters just before and after it,
+        '' at the edges of a segment, as (key, range, before, after).
+        """
+        matcher = keys if isinstance(keys, KeywordMatcher) else KeywordMatcher(keys)
+        matches = []
+        for segment in self.segments:
+            text = ''.join(segment.chars)
+            for start, end, key in matcher.find_leftmost_longest(text):
+                rng = segment.document_range(start, end)
+                if rng is None:
+                    continue
+                if context:
+                    matches.append((key, rng, text[start - 1] if start else '', text[end:end + 1]))
+                else:
+                    matches.append((key, rng))
+        return matches
+
+def _collect_runs(elements: list, segment: SegmentText):
+    for element in elements:
+        if 'paragraph' in element:
+            for run in element['paragraph'].get('elements', []):
+                content = run.get('textRun', {}).get('content')
+                if content:
+                    segment.add_run(content, run['startIndex'])
+        elif 'table' in element:
+            for row in element['table'].get('tableRows', []):
+                for cell in row.get('tableCells', []):
+                    _collect_runs(cell.get('content', []), segment)
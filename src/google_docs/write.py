@@ -1,29 +1,64 @@
-from .operations import create_doc, upload_public_image, add_header_with_image
+import os
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .operations import create_doc, create_docs, add_header_with_image
+from .image_cache import upload_public_image_cached
 from .clear import clear_google_doc
-from .content_installer import install_content
+from .content_installer import install_content, install_content_stream
+from .overwrite import update_google_doc, tag_google_doc_blocks
+from .consistency import RevisionTracker
 
-def write_to_google_doc(docs_service, drive_service, markdown_content: str, title: str = "Untitled Document", document_id: str = None, folder_id: str = None, header_image_path: str = None) -> dict:
-    """Writes content to a Google Doc by clearing it and then calling the content installer."""
+def write_to_google_doc(docs_service, drive_service, markdown_content: str, title: str = "Untitled Document", document_id: str = None, folder_id: str = None, header_image_path: str = None, revision_tracker: RevisionTracker = None, header_image_info: dict = None, new_document: bool = False, incremental: bool = False) -> dict:
+    """Writes content to a Google Doc by clearing it and then calling the content installer.
+
+    The header image is uploaded through the image cache, so an image that is already in
+    Drive is reused; header_image_info, as returned by upload_public_image, skips even the
+    cache lookup. Documents created here, or passed in with new_document=True, are known
+    to be empty and are not cleared. markdown_content may also be an iterable of lines,
+    such as markdown_parser.iter_file_lines(f), which is streamed with install_content_stream.
+    With incremental=True an existing document is not cleared and keeps its header;
+    update_google_doc rewrites only the blocks that changed. A new document written with
+    incremental=True has its blocks tagged, at the cost of one read and one more
+    batchUpdate, so its first update is incremental too; other writes are not tagged.
+    """
     try:
+        tracker = revision_tracker or RevisionTracker()
         if not document_id:
             creation_result = create_doc(drive_service, title, folder_id)
             if creation_result["status"] == "error":
                 return creation_result
             document_id = creation_result["document_id"]
-        
-        clear_result = clear_google_doc(docs_service, document_id)
-        if clear_result["status"] == "error":
-            print(f"Info: Could not clear document (might be empty). {clear_result['message']}")
+            new_document = True
 
-        # Start the installation at the beginning of the document.
-        install_result = install_content(docs_service, document_id, markdown_content, start_index=1)
+        updated_in_place = incremental and not new_document and isinstance(markdown_content, str)
+        if updated_in_place:
+            install_result = update_google_doc(docs_service, document_id, markdown_content, revision_tracker=tracker)
+        else:
+            if not new_document:
+                clear_result = clear_google_doc(docs_service, document_id)
+                if clear_result["status"] == "error":
+                    print(f"Info: Could not clear document (might be empty). {clear_result['message']}")
+                else:
+                    tracker.observe(clear_result.get("revision_id"))
+
+            # Start the installation at the beginning of the document.
+            install = install_content if isinstance(markdown_content, str) else install_content_stream
+            install_result = install(docs_service, document_id, markdown_content, start_index=1, revision_tracker=tracker)
+            if incremental and install_result["status"] == "success" and isinstance(markdown_content, str):
+                # Tag the blocks, so the next incremental write only rewrites the ones that change.
+                tag_result = tag_google_doc_blocks(docs_service, document_id, markdown_content, revision_tracker=tracker)
+                if tag_result["status"] != "success":
+                    print(f"Warning: Failed to tag the written blocks: {tag_result.get('message')}")
         
         if install_result["status"] == "success":
-            # Add header image if requested
-            if header_image_path:
+            # Add header image if requested; a document updated in place already has its header.
+            if (header_image_info or header_image_path) and not updated_in_place:
                 try:
-                    print(f"Uploading header image from {header_image_path}...")
-                    image_info = upload_public_image(drive_service, header_image_path)
+                    image_info = header_image_info
+                    if not image_info:
+                        print(f"Preparing header image from {header_image_path}...")
+                        image_info = upload_public_image_cached(drive_service, header_image_path)
                     print(f"Adding header image to document...")
                     header_result = add_header_with_image(docs_service, document_id, image_info)
                     if header_result["status"] != "success":
@@ -31,9 +66,57 @@ def write_to_google_doc(docs_service, drive_service, markdown_content: str, titl
                 except Exception as e:
                      print(f"Warning: Failed to process header image: {e}")
 
-            return {"status": "success", "document_id": document_id}
+            result = {"status": "success", "document_id": document_id, "consistency": tracker.report()}
+            if "blocks" in install_result:
+                result["blocks"] = install_result["blocks"]
+            return result
         else:
             return install_result
 
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred during the write process: {e}"}
+
+
+def write_many_to_google_docs(docs_service, drive_service, markdown_paths: list, folder_id: str = None, header_image_path: str = None, workers: int = 8, call_counter=None):
+    """Creates one document per markdown file, writing up to `workers` documents at once.
+
+    Documents are titled after their file names and created up front through batched Drive
+    requests. A header image is looked up in the image cache once and shared by every
+    document. Yields one result per file as it finishes, with the file path, its latency
+    in seconds and, when `call_counter` is given, the number of API calls it made.
+    `call_counter()` must return a context manager whose value has a `calls` attribute
+    counting the API calls made inside the block, such as quota.count_calls.
+    """
+    header_image_info = None
+    if header_image_path:
+        try:
+            header_image_info = upload_public_image_cached(drive_service, header_image_path)
+        except Exception as e:
+            print(f"Warning: Failed to upload header image, writing documents without it: {e}")
+
+    titles = [os.path.splitext(os.path.basename(path))[0] for path in markdown_paths]
+    creations = create_docs(drive_service, titles, folder_id)
+
+    def write_one(path, creation):
+        started = time.perf_counter()
+        with (call_counter() if call_counter else nullcontext()) as counter:
+            try:
+                if creation["status"] != "success":
+                    result = dict(creation)
+                else:
+                    with open(path, "r") as f:
+                        markdown_content = f.read()
+                    result = write_to_google_doc(docs_service, drive_service, markdown_content, document_id=creation["document_id"],
+                                                 header_image_info=header_image_info, new_document=True)
+            except Exception as e:
+                result = {"status": "error", "message": f"An unexpected error occurred during the write process: {e}"}
+        result["path"] = path
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        if counter is not None:
+            result["api_calls"] = counter.calls
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(write_one, path, creation) for path, creation in zip(markdown_paths, creations)]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,5 @@
+from .common import EmulatorState, make_http_error
+from .docs import FakeDocsService, FakeDocument
+from .drive import FakeDriveService
+from .slides import FakePresentation, FakeSlidesService
+from .workspace import FakeWorkspace, get_services_with_emulator
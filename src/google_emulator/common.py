@@ -0,0 +1,203 @@
+import json
+import os
+import random
+import threading
+import time
+import httplib2
+from googleapiclient.errors import HttpError
+from quota import call_with_retries, get_bucket, is_idempotent
+
+_STATUS_NAMES = {
+    400: 'INVALID_ARGUMENT',
+    403: 'PERMISSION_DENIED',
+    404: 'NOT_FOUND',
+    409: 'ABORTED',
+    429: 'RESOURCE_EXHAUSTED',
+    500: 'INTERNAL',
+    502: 'BAD_GATEWAY',
+    503: 'UNAVAILABLE',
+    504: 'DEADLINE_EXCEEDED',
+}
+
+# Read by EmulatorState.from_env(), e.g. for `client.py --auth_method emulator`.
+LATENCY_ENV_VAR = 'GOOGLE_OFFICE_EMULATOR_LATENCY'
+ERROR_RATE_ENV_VAR = 'GOOGLE_OFFICE_EMULATOR_ERROR_RATE'
+APPLIED_ERROR_RATE_ENV_VAR = 'GOOGLE_OFFICE_EMULATOR_APPLIED_ERROR_RATE'
+
+def make_http_error(status: int, message: str, uri: str = None) -> HttpError:
+    """Builds an HttpError with the JSON error body the Google APIs send."""
+    resp = httplib2.Response({'status': status})
+    resp.reason = _STATUS_NAMES.get(status, 'ERROR')
+    content = json.dumps({'error': {'code': status, 'message': message, 'status': resp.reason}}).encode('utf-8')
+    return HttpError(resp, content, uri=uri)
+
+def raise_http_error(status: int, message: str, uri: str = None):
+    raise make_http_error(status, message, uri)
+
+def parse_fields(fields: str) -> dict:
+    """Parses a partial-response field mask such as 'revisionId,body(content(endIndex))' into a tree.
+
+    Each name maps to the mask of its own fields, or to None when it is selected whole.
+    """
+    tree = {}
+    stack = [tree]
+    name = ''
+    last = None
+
+    def close():
+        nonlocal name, last
+        path = [part.strip() for part in name.split('/') if part.strip()]
+        if path:
+            node = stack[-1]
+            for part in path[:-1]:
+                if node.get(part) is None:
+                    node[part] = {}
+                node = node[part]
+            last = (node, path[-1])
+            node.setdefault(path[-1], None)
+        name = ''
+
+    for char in fields:
+        if char == '(':
+            close()
+            node, key = last
+            if node[key] is None:
+                node[key] = {}
+            stack.append(node[key])
+        elif char == ')':
+            close()
+            stack.pop()
+        elif char == ',':
+            close()
+        else:
+            name += char
+    close()
+    return tree
+
+def apply_fields(value, mask: dict):
+    """Keeps only the parts of value named by a parsed mask; lists apply the mask to each item."""
+    if mask is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(item, mask) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {name: apply_fields(value[name], sub) for name, sub in mask.items() if name in value}
+
+def select_fields(resource: dict, fields: str = None) -> dict:
+    """Applies a partial-response field mask such as 'revisionId,body(content)'."""
+    if not fields or fields.strip() == '*':
+        return resource
+    return apply_fields(resource, parse_fields(fields))
+
+class EmulatorState:
+    """Call log, latency and fault injection shared by every emulated service.
+
+    Each call sleeps for latency seconds, plus up to jitter more, or for the entry of
+    method_latency matching its method ('docs.documents.batchUpdate'). Calls then fail with
+    error_status at error_rate, and calls queued with fail_next() fail first. Those faults
+    reject the call before it runs. Faults at applied_error_rate, or queued with
+    fail_next(applied=True), let the call take effect and then return the error, as a
+    server that times out after committing a write does. Calls go through the same retry
+    loop as real services, and with quota=True through the shared quota buckets too.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 method_latency: dict = None, quota: bool = False, seed: int = None, applied_error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.applied_error_rate = applied_error_rate
+        self.error_status = error_status
+        self.method_latency = dict(method_latency or {})
+        self.quota = quota
+        self.calls = []
+        self._scripted_errors = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "EmulatorState":
+        return cls(latency=float(os.environ.get(LATENCY_ENV_VAR, 0)), error_rate=float(os.environ.get(ERROR_RATE_ENV_VAR, 0)),
+                   applied_error_rate=float(os.environ.get(APPLIED_ERROR_RATE_ENV_VAR, 0)))
+
+    def fail_next(self, status: int = 503, count: int = 1, method: str = None, applied: bool = False):
+        """Makes the next count calls, or the next count calls of method, fail with status.
+
+        With applied=True each of those calls takes effect before the error is returned.
+        """
+        with self._lock:
+            self._scripted_errors.extend([(status, method, applied)] * count)
+
+    def _pick_error(self, method: str):
+        """Returns (status, applied) of the fault to inject into the next call of method, or (None, False)."""
+        with self._lock:
+            for position, (status, only, applied) in enumerate(self._scripted_errors):
+                if only is None or only == method:
+                    del self._scripted_errors[position]
+                    return status, applied
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self.error_status, False
+            if self.applied_error_rate and self._random.random() < self.applied_error_rate:
+                return self.error_status, True
+            return None, False
+
+    def _delay(self, method: str) -> float:
+        delay = self.method_latency.get(method, self.latency)
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(0, self.jitter)
+        return delay
+
+    def call(self, method: str, body, handler, batched: bool = False):
+        """Logs one call and runs handler() after the configured latency, unless a fault is injected before it.
+
+        Calls inside a Drive batch share the batch's round trip, so they add no latency of their own.
+        """
+        started = time.perf_counter()
+        payload_bytes = len(json.dumps(body, ensure_ascii=False).encode('utf-8')) if body is not None else 0
+        request_count = len(body.get('requests', [])) if isinstance(body, dict) else 0
+        delay = 0.0 if batched else self._delay(method)
+        if delay:
+            time.sleep(delay)
+        status, applied = self._pick_error(method)
+        try:
+            if status is not None and not applied:
+                raise_http_error(status, f'Injected error {status} for {method}.')
+            result = handler()
+            if status is not None:
+                raise_http_error(status, f'Injected error {status} for {method} after it was applied.')
+            status = 200
+            return result
+        except HttpError as err:
+            status = err.resp.status
+            raise
+        finally:
+            with self._lock:
+                self.calls.append({'method': method, 'status': status, 'requests': request_count, 'payload_bytes': payload_bytes,
+                                   'seconds': time.perf_counter() - started, 'batched': batched})
+
+    def count(self, prefix: str = '') -> int:
+        """Number of HTTP round trips made to methods starting with prefix; batched calls share theirs."""
+        with self._lock:
+            return sum(1 for call in self.calls if not call['batched'] and call['method'].startswith(prefix))
+
+    def reset_log(self):
+        with self._lock:
+            self.calls = []
+
+class FakeRequest:
+    """Stands in for googleapiclient's HttpRequest: nothing is sent until execute() is called."""
+
+    def __init__(self, state: EmulatorState, method: str, body, handler, http_method: str = 'POST'):
+        self.state = state
+        self.methodId = method
+        self.method = http_method
+        self.body = body
+        self._handler = handler
+
+    def execute(self, http=None, num_retries=0):
+        bucket = get_bucket(self.methodId.split('.')[0], 'read' if self.method == 'GET' else 'write') if self.state.quota else None
+        idempotent = is_idempotent(self.method, self.methodId, self.body)
+        return call_with_retries(lambda: self.state.call(self.methodId, self.body, self._handler), bucket, self.methodId,
+                                 self.body, idempotent)
@@ -0,0 +1,692 @@
+import copy
+import uuid
+from bisect import bisect_right
+from .common import FakeRequest, apply_fields, parse_fields, raise_http_error
+
+DOC_MIME_TYPE = 'application/vnd.google-apps.document'
+
+# Keys that the Docs API reports as absent once they are reset to their default value.
+_RESET_VALUES = (None, False, {})
+
+class _Paragraph:
+    """A paragraph stored as UTF-16 code units; its last unit is always the newline."""
+    __slots__ = ('units', 'styles', 'style', 'bullet')
+
+    def __init__(self, units=None, styles=None, style=None, bullet=None):
+        self.units = units if units is not None else ['\n']
+        self.styles = styles if styles is not None else [{} for _ in self.units]
+        self.style = style or {}
+        self.bullet = bullet
+
+    def length(self) -> int:
+        return len(self.units)
+
+class _Table:
+    """A table; every cell is a list of structural elements, like a segment body."""
+    __slots__ = ('rows',)
+
+    def __init__(self, num_rows: int, num_cols: int):
+        self.rows = [[[_Paragraph()] for _ in range(num_cols)] for _ in range(num_rows)]
+
+    def length(self) -> int:
+        # One index for the table start, one per row start and one per cell start.
+        total = 1
+        for row in self.rows:
+            total += 1
+            for cell in row:
+                total += 1 + _content_length(cell)
+        return total
+
+class _InlineObject:
+    __slots__ = ('object_id',)
+
+    def __init__(self, object_id: str):
+        self.object_id = object_id
+
+def _content_length(elements: list) -> int:
+    return sum(element.length() for element in elements)
+
+def _to_units(text: str) -> list:
+    """Splits text into UTF-16 code units; astral characters own a second, empty unit."""
+    units = []
+    for char in text:
+        units.append(char)
+        if ord(char) > 0xFFFF:
+            units.append('')
+    return units
+
+def _updated_style(old: dict, new_values: dict, fields: str) -> dict:
+    style = dict(old)
+    names = new_values.keys() if fields.strip() == '*' else [f.strip() for f in fields.split(',') if f.strip()]
+    for name in names:
+        value = new_values.get(name)
+        if value in _RESET_VALUES:
+            style.pop(name, None)
+        else:
+            style[name] = copy.deepcopy(value)
+    return style
+
+class _Segment:
+    """The body, a header or a footer: a list of structural elements starting at `base`.
+
+    The start indices of its top-level elements are cached and worked out lazily, up to
+    the element a lookup needs, so a batch that writes front to back never rescans the
+    segment. Whatever changes the length of content[position] calls invalidate(position).
+    """
+
+    def __init__(self, base: int):
+        self.base = base
+        self.content = [_Paragraph()]
+        self._starts = []
+
+    def invalidate(self, position: int):
+        del self._starts[max(position, 0):]
+
+    def locate(self, index: int):
+        """Returns (position, start index) of the top-level element holding index, or the last one."""
+        starts, content = self._starts, self.content
+        if not starts:
+            starts.append(self.base)
+        while len(starts) < len(content) and starts[-1] + content[len(starts) - 1].length() <= index:
+            starts.append(starts[-1] + content[len(starts) - 1].length())
+        position = max(bisect_right(starts, index) - 1, 0)
+        return position, starts[position]
+
+    def end_index(self) -> int:
+        position, start = self.locate(float('inf'))
+        return start + self.content[position].length()
+
+class FakeDocument:
+    """In-memory model of one Google Doc.
+
+    Text is held as UTF-16 code units, so indices behave as in the Docs API: a character
+    outside the BMP takes two, a table takes one index for itself, each row and each cell.
+    Inserted text takes the styles of the text before it, newlines split paragraphs, and
+    named ranges move with inserts and deletes.
+    """
+
+    def __init__(self, document_id: str, title: str = 'Untitled document'):
+        self.document_id = document_id
+        self.title = title
+        self.body = _Segment(base=1)
+        self.headers = {}
+        self.footers = {}
+        self.named_ranges = {}
+        self.inline_objects = {}
+        self.lists = {}
+        self.document_style = {}
+        self.revision = 0
+        self.revision_id = self._new_revision_id()
+        self._last_id = 0
+        self._journal = None
+
+    def _new_revision_id(self) -> str:
+        return f'ALm37B{uuid.uuid4().hex[:20]}'
+
+    def _next_id(self, prefix: str) -> str:
+        self._last_id += 1
+        return f'{prefix}.{self._last_id}'
+
+    def _touch(self, paragraph: _Paragraph):
+        """Saves a paragraph's state before its first change in the current batch."""
+        if self._journal is not None and id(paragraph) not in self._journal:
+            self._journal[id(paragraph)] = (paragraph, list(paragraph.units), list(paragraph.styles), paragraph.style, paragraph.bullet)
+
+    def _touch_list(self, elements: list):
+        """Saves a list of elements before its first change in the current batch."""
+        if self._journal is not None and id(elements) not in self._journal:
+            self._journal[id(elements)] = (elements, list(elements))
+
+    def _segment(self, segment_id) -> _Segment:
+        if not segment_id:
+            return self.body
+        segment = self.headers.get(segment_id) or self.footers.get(segment_id)
+        if segment is None:
+            raise_http_error(400, f'Invalid segment ID: {segment_id}')
+        return segment
+
+    def _find(self, segment: _Segment, index: int):
+        """Returns (elements, position, paragraph offset, top-level position) for the paragraph holding index."""
+        top, start = segment.locate(index)
+        element = segment.content[top]
+        if index < segment.base:
+            raise_http_error(400, f'Index {index} must be at least {segment.base}.')
+        if isinstance(element, _Table):
+            return self._locate([element], start, index) + (top,)
+        if index >= start + element.length():
+            raise_http_error(400, f'Index {index} must be less than the end index of the referenced segment, {start + element.length()}.')
+        return segment.content, top, index - start, top
+
+    def _locate(self, elements: list, start: int, index: int):
+        """Returns (elements, position, paragraph offset) for the paragraph holding `index`."""
+        pos = start
+        for i, element in enumerate(elements):
+            length = element.length()
+            if index < pos + length:
+                if isinstance(element, _Paragraph):
+                    return elements, i, index - pos
+                if index > pos:
+                    pos += 1
+                    for row in element.rows:
+                        if index == pos:
+                            break
+                        pos += 1
+                        for cell in row:
+                            if index == pos:
+                                break
+                            pos += 1
+                            cell_length = _content_length(cell)
+                            if index < pos + cell_length:
+                                return self._locate(cell, pos, index)
+                            pos += cell_length
+                raise_http_error(400, f'The insertion index {index} must be inside the bounds of an existing paragraph.')
+            pos += length
+        raise_http_error(400, f'Index {index} must be less than the end index of the referenced segment, {pos}.')
+
+    def _iter_paragraphs(self, elements: list, start: int):
+        """Yields (paragraph, start index) for every paragraph, descending into tables."""
+        pos = start
+        for element in elements:
+            if isinstance(element, _Paragraph):
+                yield element, pos
+                pos += element.length()
+                continue
+            inner = pos + 1
+            for row in element.rows:
+                inner += 1
+                for cell in row:
+                    inner += 1
+                    yield from self._iter_paragraphs(cell, inner)
+                    inner += _content_length(cell)
+            pos += element.length()
+
+    def _shift_ranges(self, segment_id, index: int, inserted: int = 0, deleted_end: int = None):
+        for entries in self.named_ranges.values():
+            for entry in entries:
+                kept = []
+                for rng in entry['ranges']:
+                    if (rng.get('segmentId') or '') != (segment_id or ''):
+                        kept.append(rng)
+                        continue
+                    if deleted_end is None:
+                        if rng['startIndex'] >= index:
+                            rng['startIndex'] += inserted
+                        if rng['endIndex'] > index:
+                            rng['endIndex'] += inserted
+                    else:
+                        removed = deleted_end - index
+                        for key in ('startIndex', 'endIndex'):
+                            if rng[key] > deleted_end:
+                                rng[key] -= removed
+                            elif rng[key] > index:
+                                rng[key] = index
+                    if rng['endIndex'] > rng['startIndex']:
+                        kept.append(rng)
+                entry['ranges'] = kept
+        for name in list(self.named_ranges):
+            entries = [entry for entry in self.named_ranges[name] if entry['ranges']]
+            if entries:
+                self.named_ranges[name] = entries
+            else:
+                del self.named_ranges[name]
+
+    def _insert_units(self, segment_id, index: int, units: list, style=None):
+        segment = self._segment(segment_id)
+        elements, position, offset, top = self._find(segment, index)
+        paragraph = elements[position]
+        segment.invalidate(top)
+        self._touch(paragraph)
+        if style is None:
+            source = offset - 1 if offset > 0 else offset
+            style = paragraph.styles[source]
+        paragraph.units[offset:offset] = units
+        paragraph.styles[offset:offset] = [style] * len(units)
+        # Split on every newline that is not the paragraph's own terminator.
+        if '\n' in units:
+            split = []
+            current_units, current_styles = [], []
+            for unit, unit_style in zip(paragraph.units, paragraph.styles):
+                current_units.append(unit)
+                current_styles.append(unit_style)
+                if unit == '\n':
+                    split.append(_Paragraph(current_units, current_styles, dict(paragraph.style),
+                                            copy.deepcopy(paragraph.bullet)))
+                    current_units, current_styles = [], []
+            self._touch_list(elements)
+            elements[position:position + 1] = split
+        self._shift_ranges(segment_id, index, inserted=len(units))
+
+    def _insert_text(self, request: dict):
+        text = request.get('text', '')
+        if not text:
+            raise_http_error(400, 'Invalid requests[0].insertText: Insert text requests must specify text to insert.')
+        segment_id, index = self._location(request)
+        self._insert_units(segment_id, index, _to_units(text))
+
+    def _location(self, request: dict):
+        if 'location' in request:
+            location = request['location']
+            return location.get('segmentId', ''), location['index']
+        segment_id = request.get('endOfSegmentLocation', {}).get('segmentId', '')
+        return segment_id, self._segment(segment_id).end_index() - 1
+
+    def _delete_content_range(self, request: dict):
+        rng = request['range']
+        segment_id = rng.get('segmentId', '')
+        start, end = rng['startIndex'], rng['endIndex']
+        segment = self._segment(segment_id)
+        if start >= end:
+            raise_http_error(400, 'Invalid deletion range: the range must not be empty.')
+        if end >= segment.end_index():
+            raise_http_error(400, 'Invalid requests[0].deleteContentRange: The range cannot include the newline character at the end of the segment.')
+        # Only the elements from the one holding start to the one after end can change.
+        first, first_start = segment.locate(start)
+        last, _ = segment.locate(end)
+        affected = segment.content[first:last + 2]
+        self._delete_in(affected, first_start, start, end)
+        self._touch_list(segment.content)
+        segment.content[first:last + 2] = affected
+        segment.invalidate(first)
+        self._shift_ranges(segment_id, start, deleted_end=end)
+
+    def _delete_in(self, elements: list, base: int, start: int, end: int):
+        pos = base
+        kept = []
+        merge_pending = False
+        for element in elements:
+            length = element.length()
+            el_start, el_end = pos, pos + length
+            pos = el_end
+            if el_end <= start or el_start >= end:
+                if merge_pending:
+                    if not isinstance(element, _Paragraph):
+                        raise_http_error(400, 'Invalid deletion range: cannot delete the newline before a table.')
+                    previous = kept.pop()
+                    element = _Paragraph(previous.units + element.units, previous.styles + element.styles,
+                                         element.style, element.bullet)
+                    merge_pending = False
+                kept.append(element)
+                continue
+            if isinstance(element, _Table):
+                if start <= el_start and el_end <= end:
+                    continue
+                inner = el_start + 1
+                for row in element.rows:
+                    inner += 1
+                    for c, cell in enumerate(row):
+                        inner += 1
+                        cell_length = _content_length(cell)
+                        if inner <= start and end <= inner + cell_length - 1:
+                            self._delete_in(cell, inner, start, end)
+                            break
+                        inner += cell_length
+                    else:
+                        continue
+                    break
+                else:
+                    raise_http_error(400, 'Invalid deletion range: a table can only be deleted as a whole.')
+                kept.append(element)
+                continue
+            lo, hi = max(start, el_start) - el_start, min(end, el_end) - el_start
+            units = element.units[:lo] + element.units[hi:]
+            styles = element.styles[:lo] + element.styles[hi:]
+            if merge_pending:
+                previous = kept.pop()
+                units = previous.units + units
+                styles = previous.styles + styles
+                merge_pending = False
+            paragraph = _Paragraph(units, styles, element.style, element.bullet)
+            kept.append(paragraph)
+            if hi == length:
+                merge_pending = True
+        if merge_pending:
+            raise_http_error(400, 'Invalid deletion range: cannot delete the final newline of a segment or table cell.')
+        self._touch_list(elements)
+        elements[:] = kept
+
+    def _paragraphs_from(self, segment: _Segment, start: int, end: int):
+        """Yields (paragraph, start index) for the paragraphs of the top-level elements overlapping [start, end]."""
+        position, pos = segment.locate(start)
+        while position < len(segment.content) and pos <= end:
+            element = segment.content[position]
+            yield from self._iter_paragraphs([element], pos)
+            pos += element.length()
+            position += 1
+
+    def _update_text_style(self, request: dict):
+        rng = request['range']
+        segment = self._segment(rng.get('segmentId', ''))
+        start, end = rng['startIndex'], rng['endIndex']
+        if start > end:
+            raise_http_error(400, 'Invalid range: startIndex must not exceed endIndex.')
+        cache = {}
+        for paragraph, p_start in self._paragraphs_from(segment, start, end):
+            p_end = p_start + paragraph.length()
+            if p_end <= start or p_start >= end:
+                continue
+            for i in range(max(start, p_start) - p_start, min(end, p_end) - p_start):
+                self._touch(paragraph)
+                old = paragraph.styles[i]
+                if id(old) not in cache:
+                    cache[id(old)] = (old, _updated_style(old, request.get('textStyle', {}), request['fields']))
+                paragraph.styles[i] = cache[id(old)][1]
+
+    def _paragraphs_in(self, rng: dict):
+        segment = self._segment(rng.get('segmentId', ''))
+        start, end = rng['startIndex'], rng['endIndex']
+        for paragraph, p_start in self._paragraphs_from(segment, start, end):
+            p_end = p_start + paragraph.length()
+            if p_start < end and p_end > start or p_start <= start < p_end:
+                yield paragraph, p_start
+
+    def _update_paragraph_style(self, request: dict):
+        for paragraph, _ in list(self._paragraphs_in(request['range'])):
+            self._touch(paragraph)
+            paragraph.style = _updated_style(paragraph.style, request.get('paragraphStyle', {}), request['fields'])
+
+    def _create_paragraph_bullets(self, request: dict):
+        rng = request['range']
+        segment_id = rng.get('segmentId', '')
+        list_id = self._next_id('kix.list')
+        self.lists[list_id] = {'listProperties': {'bulletPreset': request.get('bulletPreset')}}
+        # Leading tabs become the nesting level and are removed, from the last paragraph backwards.
+        segment = self._segment(segment_id)
+        first, _ = segment.locate(rng['startIndex'])
+        for paragraph, p_start in reversed(list(self._paragraphs_in(rng))):
+            self._touch(paragraph)
+            tabs = 0
+            while paragraph.units[tabs] == '\t':
+                tabs += 1
+            if tabs:
+                del paragraph.units[:tabs]
+                del paragraph.styles[:tabs]
+                self._shift_ranges(segment_id, p_start, deleted_end=p_start + tabs)
+            paragraph.bullet = {'listId': list_id}
+            if tabs:
+                paragraph.bullet['nestingLevel'] = tabs
+        segment.invalidate(first)
+
+    def _delete_paragraph_bullets(self, request: dict):
+        for paragraph, _ in self._paragraphs_in(request['range']):
+            self._touch(paragraph)
+            paragraph.bullet = None
+
+    def _insert_table(self, request: dict):
+        segment_id, index = self._location(request)
+        segment = self._segment(segment_id)
+        elements, position, offset, top = self._find(segment, index)
+        paragraph = elements[position]
+        segment.invalidate(top)
+        # The API inserts a newline before the table, which then starts at index + 1.
+        before = _Paragraph(paragraph.units[:offset] + ['\n'], paragraph.styles[:offset] + [paragraph.styles[offset]],
+                            dict(paragraph.style), copy.deepcopy(paragraph.bullet))
+        after = _Paragraph(paragraph.units[offset:], paragraph.styles[offset:], paragraph.style, paragraph.bullet)
+        table = _Table(request['rows'], request['columns'])
+        self._touch_list(elements)
+        elements[position:position + 1] = [before, table, after]
+        self._shift_ranges(segment_id, index, inserted=1 + table.length())
+
+    def _create_header(self, request: dict, footer: bool = False):
+        segment_id = self._next_id('kix.ftr' if footer else 'kix.hdr')
+        (self.footers if footer else self.headers)[segment_id] = _Segment(base=0)
+        key = 'defaultFooterId' if footer else 'defaultHeaderId'
+        self.document_style[key] = segment_id
+        return {'createFooter' if footer else 'createHeader': {'footerId' if footer else 'headerId': segment_id}}
+
+    def _insert_inline_image(self, request: dict):
+        object_id = self._next_id('kix.img')
+        self.inline_objects[object_id] = {
+            'objectId': object_id,
+            'inlineObjectProperties': {'embeddedObject': {'imageProperties': {'sourceUri': request.get('uri')},
+                                                           'size': request.get('objectSize', {})}}
+        }
+        segment_id, index = self._location(request)
+        self._insert_units(segment_id, index, [_InlineObject(object_id)])
+        return {'insertInlineImage': {'objectId': object_id}}
+
+    def _create_named_range(self, request: dict):
+        named_range_id = self._next_id('kix.nr')
+        rng = dict(request['range'])
+        self.named_ranges.setdefault(request['name'], []).append(
+            {'namedRangeId': named_range_id, 'name': request['name'], 'ranges': [rng]})
+        return {'createNamedRange': {'namedRangeId': named_range_id}}
+
+    def _delete_named_range(self, request: dict):
+        if 'name' in request:
+            self.named_ranges.pop(request['name'], None)
+            return
+        for name in list(self.named_ranges):
+            entries = [e for e in self.named_ranges[name] if e['namedRangeId'] != request.get('namedRangeId')]
+            if entries:
+                self.named_ranges[name] = entries
+            else:
+                del self.named_ranges[name]
+
+    def _replace_all_text(self, request: dict):
+        needle = request['containsText']['text']
+        match_case = request['containsText'].get('matchCase', False)
+        replacement = request.get('replaceText', '')
+        changed = 0
+        for segment_id in [''] + list(self.headers) + list(self.footers):
+            segment = self._segment(segment_id)
+            hits = []
+            for paragraph, p_start in self._iter_paragraphs(segment.content, segment.base):
+                text = ''.join(u if isinstance(u, str) else '￼' for u in paragraph.units)
+                haystack, pattern = (text, needle) if match_case else (text.lower(), needle.lower())
+                pos = haystack.find(pattern)
+                while pos != -1:
+                    hits.append(p_start + _units_before(paragraph, pos))
+                    pos = haystack.find(pattern, pos + len(pattern))
+            for start in reversed(hits):
+                length = len(_to_units(needle))
+                self._delete_content_range({'range': {'segmentId': segment_id, 'startIndex': start, 'endIndex': start + length}})
+                if replacement:
+                    self._insert_units(segment_id, start, _to_units(replacement))
+            changed += len(hits)
+        return {'replaceAllText': {'occurrencesChanged': changed}}
+
+    _HANDLERS = {
+        'insertText': _insert_text,
+        'deleteContentRange': _delete_content_range,
+        'updateTextStyle': _update_text_style,
+        'updateParagraphStyle': _update_paragraph_style,
+        'createParagraphBullets': _create_paragraph_bullets,
+        'deleteParagraphBullets': _delete_paragraph_bullets,
+        'insertTable': _insert_table,
+        'createHeader': _create_header,
+        'createFooter': lambda self, request: self._create_header(request, footer=True),
+        'insertInlineImage': _insert_inline_image,
+        'createNamedRange': _create_named_range,
+        'deleteNamedRange': _delete_named_range,
+        'replaceAllText': _replace_all_text,
+    }
+
+    def apply(self, requests: list) -> list:
+        """Applies requests in order, all or none: if one fails, the document is rolled back and the error raised.
+
+        Only what the batch changes is saved for the rollback, so a batch costs the same in a
+        large document as in a small one.
+        """
+        saved = (copy.deepcopy(self.named_ranges), dict(self.headers), dict(self.footers), dict(self.inline_objects),
+                 dict(self.lists), dict(self.document_style), self._last_id)
+        self._journal = {}
+        try:
+            replies = []
+            for i, request in enumerate(requests):
+                if len(request) != 1:
+                    raise_http_error(400, f'Invalid requests[{i}]: exactly one request kind must be set.')
+                (kind, payload), = request.items()
+                handler = self._HANDLERS.get(kind)
+                if handler is None:
+                    raise_http_error(400, f'Invalid requests[{i}]: {kind} is not supported by the emulator.')
+                reply = handler(self, payload)
+                replies.append(reply or {})
+            return replies
+        except Exception:
+            for entry in self._journal.values():
+                if len(entry) == 2:
+                    entry[0][:] = entry[1]
+                else:
+                    paragraph, paragraph.units, paragraph.styles, paragraph.style, paragraph.bullet = entry
+            (self.named_ranges, self.headers, self.footers, self.inline_objects, self.lists, self.document_style,
+             self._last_id) = saved
+            for segment in [self.body, *self.headers.values(), *self.footers.values()]:
+                segment.invalidate(0)
+            raise
+        finally:
+            self._journal = None
+
+    def _render_content(self, elements: list, start: int) -> list:
+        rendered = []
+        pos = start
+        for element in elements:
+            if isinstance(element, _Paragraph):
+                rendered.append(self._render_paragraph(element, pos))
+            else:
+                rendered.append(self._render_table(element, pos))
+            pos += element.length()
+        return rendered
+
+    def _render_paragraph(self, paragraph: _Paragraph, start: int) -> dict:
+        elements = []
+        run_units, run_style, run_start = [], None, start
+        for offset, (unit, style) in enumerate(zip(paragraph.units, paragraph.styles)):
+            index = start + offset
+            if isinstance(unit, _InlineObject) or style is not run_style and style != run_style:
+                if run_units:
+                    elements.append({'startIndex': run_start, 'endIndex': index,
+                                     'textRun': {'content': ''.join(run_units), 'textStyle': dict(run_style)}})
+                run_units, run_style, run_start = [], style, index
+            if isinstance(unit, _InlineObject):
+                elements.append({'startIndex': index, 'endIndex': index + 1,
+                                 'inlineObjectElement': {'inlineObjectId': unit.object_id, 'textStyle': dict(style)}})
+                run_start = index + 1
+                run_style = None
+                continue
+            run_units.append(unit)
+        if run_units:
+            elements.append({'startIndex': run_start, 'endIndex': start + paragraph.length(),
+                             'textRun': {'content': ''.join(run_units), 'textStyle': dict(run_style)}})
+        rendered = {'elements': elements, 'paragraphStyle': dict(paragraph.style)}
+        rendered['paragraphStyle'].setdefault('namedStyleType', 'NORMAL_TEXT')
+        if paragraph.bullet:
+            rendered['bullet'] = dict(paragraph.bullet)
+        return {'startIndex': start, 'endIndex': start + paragraph.length(), 'paragraph': rendered}
+
+    def _render_table(self, table: _Table, start: int) -> dict:
+        rows = []
+        pos = start + 1
+        for row in table.rows:
+            row_start = pos
+            pos += 1
+            cells = []
+            for cell in row:
+                cell_start = pos
+                pos += 1
+                content = self._render_content(cell, pos)
+                pos += _content_length(cell)
+                cells.append({'startIndex': cell_start, 'endIndex': pos, 'content': content})
+            rows.append({'startIndex': row_start, 'endIndex': pos, 'tableCells': cells})
+        return {'startIndex': start, 'endIndex': pos,
+                'table': {'rows': len(table.rows), 'columns': len(table.rows[0]) if table.rows else 0, 'tableRows': rows}}
+
+    def _render_outline(self) -> list:
+        """The body's top-level elements with only their indices, for masks that ask for nothing else."""
+        outline = [{'endIndex': 1}]
+        pos = self.body.base
+        for element in self.body.content:
+            outline.append({'startIndex': pos, 'endIndex': pos + element.length()})
+            pos += element.length()
+        return outline
+
+    def _render_body(self, mask: dict = None) -> dict:
+        content_mask = (mask or {}).get('content')
+        if content_mask and set(content_mask) <= {'startIndex', 'endIndex'}:
+            return {'content': self._render_outline()}
+        body = [{'endIndex': 1, 'sectionBreak': {'sectionStyle': {}}}]
+        body.extend(self._render_content(self.body.content, self.body.base))
+        return {'content': body}
+
+    def to_json(self, fields: str = None) -> dict:
+        """The document resource, limited to a partial-response field mask if one is given.
+
+        Parts the mask leaves out are never rendered, so a small read of a large document stays cheap.
+        """
+        mask = parse_fields(fields) if fields and fields.strip() != '*' else None
+        parts = {
+            'documentId': lambda: self.document_id,
+            'title': lambda: self.title,
+            'revisionId': lambda: self.revision_id,
+            'body': lambda: self._render_body(mask and mask['body']),
+            'headers': lambda: {sid: {'headerId': sid, 'content': self._render_content(seg.content, seg.base)}
+                                for sid, seg in self.headers.items()},
+            'footers': lambda: {sid: {'footerId': sid, 'content': self._render_content(seg.content, seg.base)}
+                                for sid, seg in self.footers.items()},
+            'namedRanges': lambda: {name: {'name': name, 'namedRanges': copy.deepcopy(entries)}
+                                    for name, entries in self.named_ranges.items()},
+            'inlineObjects': lambda: copy.deepcopy(self.inline_objects),
+            'lists': lambda: copy.deepcopy(self.lists),
+            'documentStyle': lambda: dict(self.document_style),
+        }
+        if mask is None:
+            return {name: render() for name, render in parts.items()}
+        return apply_fields({name: render() for name, render in parts.items() if name in mask}, mask)
+
+    def plain_text(self) -> str:
+        """Concatenated body text; tables contribute their cell text in reading order."""
+        parts = []
+        for paragraph, _ in self._iter_paragraphs(self.body.content, self.body.base):
+            parts.append(''.join(u if isinstance(u, str) else '￼' for u in paragraph.units))
+        return ''.join(parts)
+
+def _units_before(paragraph: _Paragraph, char_offset: int) -> int:
+    """Converts a character offset in the paragraph text to a UTF-16 unit offset."""
+    seen = 0
+    for i, unit in enumerate(paragraph.units):
+        if seen == char_offset:
+            return i
+        if unit != '':
+            seen += 1
+    return len(paragraph.units)
+
+class _DocumentsResource:
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def get(self, documentId: str, fields: str = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                return self._workspace.document(documentId).to_json(fields)
+        return FakeRequest(self._workspace.state, 'docs.documents.get', None, handler, 'GET')
+
+    def create(self, body: dict = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                entry = self._workspace.add_file({'name': (body or {}).get('title', 'Untitled document'), 'mimeType': DOC_MIME_TYPE})
+                return self._workspace.document(entry['id']).to_json()
+        return FakeRequest(self._workspace.state, 'docs.documents.create', body, handler)
+
+    def batchUpdate(self, documentId: str, body: dict, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                doc = self._workspace.document(documentId)
+                write_control = body.get('writeControl') or {}
+                required = write_control.get('requiredRevisionId')
+                if required and required != doc.revision_id:
+                    raise_http_error(400, 'The document was modified since the required revision. '
+                                          'Please re-fetch the document and retry.')
+                replies = doc.apply(body.get('requests', []))
+                doc.revision += 1
+                doc.revision_id = doc._new_revision_id()
+                return {'documentId': documentId, 'replies': replies,
+                        'writeControl': {'requiredRevisionId': doc.revision_id}}
+        return FakeRequest(self._workspace.state, 'docs.documents.batchUpdate', body, handler)
+
+class FakeDocsService:
+    """Stand-in for build('docs', 'v1')."""
+
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def documents(self):
+        return _DocumentsResource(self._workspace)
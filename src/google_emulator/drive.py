@@ -0,0 +1,156 @@
+import struct
+from googleapiclient.errors import HttpError
+from .common import FakeRequest, raise_http_error, select_fields
+
+# Drive v3 returns these fields when a request names none.
+DEFAULT_FILE_FIELDS = 'kind,id,name,mimeType'
+# Drive accepts at most 100 calls in one batch request.
+MAX_BATCH_SIZE = 100
+
+def _image_size(data: bytes):
+    """Width and height of a PNG, read from its IHDR chunk, or None for anything else."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+        return struct.unpack('>II', data[16:24])
+    return None
+
+def _media_metadata(media_body) -> dict:
+    """Size, MIME type and image dimensions of a MediaFileUpload, from the local file it points at."""
+    path = getattr(media_body, '_filename', None)
+    if path is None:
+        return {}
+    with open(path, 'rb') as f:
+        data = f.read()
+    metadata = {'size': str(len(data)), 'mimeType': media_body.mimetype()}
+    size = _image_size(data)
+    if size:
+        metadata['imageMediaMetadata'] = {'width': size[0], 'height': size[1]}
+    return metadata
+
+class _FilesResource:
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def _request(self, method: str, body, handler, http_method: str = 'POST') -> FakeRequest:
+        return FakeRequest(self._workspace.state, f'drive.files.{method}', body, handler, http_method)
+
+    def create(self, body: dict = None, media_body=None, fields: str = None, **kwargs):
+        def handler():
+            metadata = dict(body or {})
+            media = _media_metadata(media_body) if media_body is not None else {}
+            if media.get('mimeType') and 'mimeType' not in metadata:
+                metadata['mimeType'] = media['mimeType']
+            with self._workspace.lock:
+                entry = self._workspace.add_file(metadata)
+                entry.update({key: value for key, value in media.items() if key != 'mimeType'})
+                if media_body is not None:
+                    entry['webContentLink'] = f"https://drive.google.com/uc?id={entry['id']}&export=download"
+                return select_fields(dict(entry), fields or DEFAULT_FILE_FIELDS)
+        return self._request('create', body, handler)
+
+    def copy(self, fileId: str, body: dict = None, fields: str = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                return select_fields(dict(self._workspace.copy_file(fileId, body)), fields or DEFAULT_FILE_FIELDS)
+        return self._request('copy', body, handler)
+
+    def get(self, fileId: str, fields: str = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                return select_fields(dict(self._workspace.file(fileId)), fields or DEFAULT_FILE_FIELDS)
+        return self._request('get', None, handler, 'GET')
+
+    def update(self, fileId: str, body: dict = None, addParents: str = None, removeParents: str = None, fields: str = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                entry = self._workspace.file(fileId)
+                metadata = dict(body or {})
+                if 'appProperties' in metadata:
+                    properties = dict(entry['appProperties'], **metadata.pop('appProperties'))
+                    entry['appProperties'] = {key: value for key, value in properties.items() if value is not None}
+                if 'name' in metadata:
+                    title = metadata['name']
+                    content = self._workspace.documents.get(fileId) or self._workspace.presentations.get(fileId)
+                    if content is not None:
+                        content.title = title
+                entry.update(metadata)
+                parents = [parent for parent in entry['parents'] if parent not in (removeParents or '').split(',')]
+                entry['parents'] = parents + [parent for parent in (addParents or '').split(',') if parent and parent not in parents]
+                return select_fields(dict(entry), fields or DEFAULT_FILE_FIELDS)
+        return self._request('update', body, handler, 'PATCH')
+
+    def delete(self, fileId: str, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                self._workspace.file(fileId)
+                for store in (self._workspace.files, self._workspace.documents, self._workspace.presentations):
+                    store.pop(fileId, None)
+                return ''
+        return self._request('delete', None, handler, 'DELETE')
+
+class _PermissionsResource:
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def create(self, fileId: str, body: dict, fields: str = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                entry = self._workspace.file(fileId)
+                permission = dict(body, id='anyoneWithLink' if body.get('type') == 'anyone' else self._workspace.new_id(),
+                                  kind='drive#permission')
+                entry['permissions'].append(permission)
+                return select_fields(permission, fields or 'kind,id,type,role')
+        return FakeRequest(self._workspace.state, 'drive.permissions.create', body, handler)
+
+class FakeBatchHttpRequest:
+    """Stands in for googleapiclient's BatchHttpRequest.
+
+    The batch is one round trip: its latency and injected faults apply once, and then every
+    call runs in order and reports to its callback, failed calls with their HttpError. A
+    fault injected after the calls ran leaves them applied but reports none of them.
+    """
+
+    def __init__(self, state, callback=None):
+        self.state = state
+        self._callback = callback
+        self._calls = []
+
+    def add(self, request: FakeRequest, callback=None, request_id: str = None):
+        request_id = request_id if request_id is not None else str(len(self._calls) + 1)
+        if any(existing == request_id for _, _, existing in self._calls):
+            raise KeyError(f'A request with this ID already exists: {request_id}')
+        self._calls.append((request, callback, request_id))
+
+    def execute(self, http=None):
+        def handler():
+            if len(self._calls) > MAX_BATCH_SIZE:
+                raise_http_error(400, f'A batch request may hold at most {MAX_BATCH_SIZE} calls.')
+            outcomes = []
+            for request, callback, request_id in self._calls:
+                response, exception = None, None
+                try:
+                    response = self.state.call(request.methodId, request.body, request._handler, batched=True)
+                except HttpError as err:
+                    exception = err
+                outcomes.append((callback, request_id, response, exception))
+            return outcomes
+        # Callbacks only see the responses if the batch response itself arrives.
+        outcomes = self.state.call('drive.batch', [request.body for request, _, _ in self._calls], handler)
+        for callback, request_id, response, exception in outcomes:
+            for target in (callback, self._callback):
+                if target is not None:
+                    target(request_id, response, exception)
+
+class FakeDriveService:
+    """Stand-in for build('drive', 'v3')."""
+
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def files(self):
+        return _FilesResource(self._workspace)
+
+    def permissions(self):
+        return _PermissionsResource(self._workspace)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchHttpRequest(self._workspace.state, callback)
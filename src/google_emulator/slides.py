@@ -0,0 +1,330 @@
+import copy
+import uuid
+from .common import FakeRequest, raise_http_error, select_fields
+from .docs import _to_units, _updated_style
+
+SLIDES_MIME_TYPE = 'application/vnd.google-apps.presentation'
+
+# Placeholders each predefined layout of the default theme puts on a new slide.
+LAYOUT_PLACEHOLDERS = {
+    'BLANK': (),
+    'CAPTION_ONLY': ('BODY',),
+    'TITLE': ('CENTERED_TITLE', 'SUBTITLE'),
+    'TITLE_AND_BODY': ('TITLE', 'BODY'),
+    'TITLE_AND_TWO_COLUMNS': ('TITLE', 'BODY', 'BODY'),
+    'TITLE_ONLY': ('TITLE',),
+    'SECTION_HEADER': ('TITLE',),
+    'SECTION_TITLE_AND_DESCRIPTION': ('TITLE', 'SUBTITLE', 'BODY'),
+    'ONE_COLUMN_TEXT': ('TITLE', 'BODY'),
+    'MAIN_POINT': ('TITLE',),
+    'BIG_NUMBER': ('TITLE', 'BODY'),
+}
+
+PAGE_SIZE = {'width': {'magnitude': 9144000, 'unit': 'EMU'}, 'height': {'magnitude': 5143500, 'unit': 'EMU'}}
+
+class _Element:
+    """A shape or image on a slide; shape text is held as UTF-16 code units and ends with a newline once set."""
+    __slots__ = ('object_id', 'shape_type', 'placeholder', 'units', 'styles', 'image_url')
+
+    def __init__(self, object_id: str, shape_type: str = 'TEXT_BOX', placeholder: str = None, image_url: str = None):
+        self.object_id = object_id
+        self.shape_type = shape_type
+        self.placeholder = placeholder
+        self.units = []
+        self.styles = []
+        self.image_url = image_url
+
+    def text_range(self, text_range: dict, request: str) -> tuple:
+        """Resolves a Range to (start, end) code unit offsets."""
+        kind = (text_range or {}).get('type', 'ALL')
+        if kind == 'ALL':
+            return 0, len(self.units)
+        start = text_range.get('startIndex', 0)
+        end = text_range.get('endIndex', len(self.units)) if kind == 'FIXED_RANGE' else len(self.units)
+        if kind not in ('FIXED_RANGE', 'FROM_START_INDEX') or not 0 <= start <= end <= len(self.units):
+            raise_http_error(400, f'Invalid {request}: the text range is out of bounds for object {self.object_id}.')
+        return start, end
+
+    def to_json(self) -> dict:
+        rendered = {'objectId': self.object_id, 'size': {'width': {'magnitude': 3000000, 'unit': 'EMU'},
+                                                          'height': {'magnitude': 3000000, 'unit': 'EMU'}},
+                    'transform': {'scaleX': 1, 'scaleY': 1, 'unit': 'EMU'}}
+        if self.image_url is not None:
+            rendered['image'] = {'contentUrl': self.image_url, 'sourceUrl': self.image_url}
+            return rendered
+        shape = {'shapeType': self.shape_type}
+        if self.placeholder:
+            shape['placeholder'] = {'type': self.placeholder}
+        if self.units:
+            shape['text'] = {'textElements': self._text_elements()}
+        rendered['shape'] = shape
+        return rendered
+
+    def _text_elements(self) -> list:
+        elements = []
+        start = 0
+        while start < len(self.units):
+            end = self.units.index('\n', start) + 1
+            elements.append(_indexed({'paragraphMarker': {'style': {}}}, start, end))
+            run_start = start
+            for offset in range(start + 1, end + 1):
+                if offset == end or self.styles[offset] != self.styles[run_start]:
+                    elements.append(_indexed({'textRun': {'content': ''.join(self.units[run_start:offset]),
+                                                          'style': dict(self.styles[run_start])}}, run_start, offset))
+                    run_start = offset
+            start = end
+        return elements
+
+def _indexed(element: dict, start: int, end: int) -> dict:
+    # Like the API, a zero start index is left out.
+    indexed = {'startIndex': start} if start else {}
+    indexed['endIndex'] = end
+    indexed.update(element)
+    return indexed
+
+class FakePresentation:
+    """In-memory model of one Google Slides presentation, starting with a single title slide.
+
+    Only the predefined layouts named in layouts can be used by createSlide.
+    """
+
+    def __init__(self, presentation_id: str, title: str = 'Untitled presentation', layouts=None):
+        self.presentation_id = presentation_id
+        self.title = title
+        self.layouts = tuple(layouts if layouts is not None else LAYOUT_PLACEHOLDERS)
+        self.slides = []
+        self.revision_id = uuid.uuid4().hex[:20]
+        self._last_id = 0
+        if 'TITLE' in self.layouts:
+            self._create_slide({'slideLayoutReference': {'predefinedLayout': 'TITLE'}})
+
+    def _next_id(self) -> str:
+        self._last_id += 1
+        return f'g{self.presentation_id[:8]}_{self._last_id}'
+
+    def _new_object_id(self, requested: str) -> str:
+        if requested is None:
+            return self._next_id()
+        if not 5 <= len(requested) <= 50 or self._find(requested) is not None:
+            raise_http_error(400, f'Invalid object ID: {requested} is not unique or not 5 to 50 characters long.')
+        return requested
+
+    def _find(self, object_id: str):
+        """Returns (slide, element) for a page element, (slide, None) for a slide, or None."""
+        for slide in self.slides:
+            if slide['objectId'] == object_id:
+                return slide, None
+            for element in slide['elements']:
+                if element.object_id == object_id:
+                    return slide, element
+        return None
+
+    def _shape(self, object_id: str, request: str) -> _Element:
+        found = self._find(object_id)
+        if found is None or found[1] is None or found[1].image_url is not None:
+            raise_http_error(400, f'Invalid {request}: The object ({object_id}) could not be found or holds no text.')
+        return found[1]
+
+    def _create_slide(self, request: dict):
+        layout = request.get('slideLayoutReference', {}).get('predefinedLayout', 'BLANK')
+        if layout not in self.layouts:
+            raise_http_error(400, f'Invalid requests[0].createSlide: The predefined layout ({layout}) is not present in the current master.')
+        slide_id = self._new_object_id(request.get('objectId'))
+        slide = {'objectId': slide_id, 'layout': layout,
+                 'elements': [_Element(self._next_id(), placeholder=placeholder) for placeholder in LAYOUT_PLACEHOLDERS.get(layout, ())]}
+        position = int(request.get('insertionIndex', len(self.slides)))
+        if not 0 <= position <= len(self.slides):
+            raise_http_error(400, f'Invalid requests[0].createSlide: insertion index {position} is out of range.')
+        self.slides.insert(position, slide)
+        return {'createSlide': {'objectId': slide_id}}
+
+    def _delete_object(self, request: dict):
+        found = self._find(request['objectId'])
+        if found is None:
+            raise_http_error(400, f"Invalid requests[0].deleteObject: The object ({request['objectId']}) could not be found.")
+        slide, element = found
+        if element is None:
+            self.slides.remove(slide)
+        else:
+            slide['elements'].remove(element)
+
+    def _insert_text(self, request: dict):
+        shape = self._shape(request['objectId'], 'insertText')
+        units = _to_units(request.get('text', ''))
+        index = request.get('insertionIndex', 0)
+        if not shape.units:
+            if index:
+                raise_http_error(400, 'Invalid requests[0].insertText: The insertion index must be 0 for an empty shape.')
+            units.append('\n')
+            style = {}
+        elif not 0 <= index < len(shape.units):
+            raise_http_error(400, f'Invalid requests[0].insertText: The insertion index {index} must be less than {len(shape.units)}.')
+        else:
+            style = shape.styles[index - 1 if index else 0]
+        shape.units[index:index] = units
+        shape.styles[index:index] = [style] * len(units)
+
+    def _delete_text(self, request: dict):
+        shape = self._shape(request['objectId'], 'deleteText')
+        start, end = shape.text_range(request.get('textRange'), 'deleteText')
+        del shape.units[start:end]
+        del shape.styles[start:end]
+        if shape.units and shape.units[-1] != '\n':
+            shape.units.append('\n')
+            shape.styles.append(shape.styles[-1])
+
+    def _update_text_style(self, request: dict):
+        shape = self._shape(request['objectId'], 'updateTextStyle')
+        start, end = shape.text_range(request.get('textRange'), 'updateTextStyle')
+        updated = {}
+        for offset in range(start, end):
+            old = shape.styles[offset]
+            if id(old) not in updated:
+                updated[id(old)] = _updated_style(old, request.get('style', {}), request['fields'])
+            shape.styles[offset] = updated[id(old)]
+
+    def _create_element(self, request: dict, image_url: str = None):
+        page_id = request.get('elementProperties', {}).get('pageObjectId')
+        found = self._find(page_id) if page_id else None
+        if found is None or found[1] is not None:
+            raise_http_error(400, f'Invalid request: The page ({page_id}) could not be found.')
+        object_id = self._new_object_id(request.get('objectId'))
+        found[0]['elements'].append(_Element(object_id, request.get('shapeType', 'TEXT_BOX'), image_url=image_url))
+        return object_id
+
+    def _replace_all_text(self, request: dict):
+        needle = request['containsText']['text']
+        match_case = request['containsText'].get('matchCase', False)
+        replacement = _to_units(request.get('replaceText', ''))
+        pages = request.get('pageObjectIds')
+        changed = 0
+        for slide in self.slides:
+            if pages and slide['objectId'] not in pages:
+                continue
+            for shape in slide['elements']:
+                text = ''.join(shape.units)
+                haystack, pattern = (text, needle) if match_case else (text.lower(), needle.lower())
+                found = []
+                position = haystack.find(pattern)
+                while pattern and position != -1:
+                    found.append(position)
+                    position = haystack.find(pattern, position + len(pattern))
+                for position in reversed(found):
+                    # Code units and characters line up here, as astral characters own an empty second unit.
+                    start = _unit_offset(shape.units, position)
+                    end = _unit_offset(shape.units, position + len(pattern))
+                    style = shape.styles[start]
+                    shape.units[start:end] = replacement
+                    shape.styles[start:end] = [style] * len(replacement)
+                changed += len(found)
+        return {'replaceAllText': {'occurrencesChanged': changed}}
+
+    _HANDLERS = {
+        'createSlide': _create_slide,
+        'deleteObject': _delete_object,
+        'insertText': _insert_text,
+        'deleteText': _delete_text,
+        'updateTextStyle': _update_text_style,
+        'createShape': lambda self, request: {'createShape': {'objectId': self._create_element(request)}},
+        'createImage': lambda self, request: {'createImage': {'objectId': self._create_element(request, request['url'])}},
+        'replaceAllText': _replace_all_text,
+    }
+
+    def apply(self, requests: list) -> list:
+        """Applies requests in order; a failing request raises and the caller keeps the old state."""
+        replies = []
+        for position, request in enumerate(requests):
+            if len(request) != 1:
+                raise_http_error(400, f'Invalid requests[{position}]: exactly one request kind must be set.')
+            (kind, payload), = request.items()
+            handler = self._HANDLERS.get(kind)
+            if handler is None:
+                raise_http_error(400, f'Invalid requests[{position}]: {kind} is not supported by the emulator.')
+            replies.append(handler(self, payload) or {})
+        return replies
+
+    def page_json(self, slide: dict) -> dict:
+        return {'objectId': slide['objectId'], 'pageType': 'SLIDE',
+                'pageElements': [element.to_json() for element in slide['elements']],
+                'slideProperties': {'layoutObjectId': f"layout_{slide['layout']}"}, 'revisionId': self.revision_id}
+
+    def to_json(self) -> dict:
+        return {
+            'presentationId': self.presentation_id,
+            'title': self.title,
+            'pageSize': copy.deepcopy(PAGE_SIZE),
+            'slides': [self.page_json(slide) for slide in self.slides],
+            'layouts': [{'objectId': f'layout_{layout}', 'pageType': 'LAYOUT',
+                         'layoutProperties': {'name': layout, 'displayName': layout.replace('_', ' ').title()}}
+                        for layout in self.layouts],
+            'revisionId': self.revision_id,
+        }
+
+def _unit_offset(units: list, char_offset: int) -> int:
+    """Converts a character offset in the joined text of units to a code unit offset."""
+    seen = 0
+    for position, unit in enumerate(units):
+        if seen == char_offset:
+            return position
+        if unit != '':
+            seen += 1
+    return len(units)
+
+class _PagesResource:
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def get(self, presentationId: str, pageObjectId: str, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                presentation = self._workspace.presentation(presentationId)
+                found = presentation._find(pageObjectId)
+                if found is None or found[1] is not None:
+                    raise_http_error(404, f'Requested entity was not found: {pageObjectId}.')
+                return presentation.page_json(found[0])
+        return FakeRequest(self._workspace.state, 'slides.presentations.pages.get', None, handler, 'GET')
+
+class _PresentationsResource:
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def get(self, presentationId: str, fields: str = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                return select_fields(self._workspace.presentation(presentationId).to_json(), fields)
+        return FakeRequest(self._workspace.state, 'slides.presentations.get', None, handler, 'GET')
+
+    def create(self, body: dict = None, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                entry = self._workspace.add_file({'name': (body or {}).get('title', 'Untitled presentation'), 'mimeType': SLIDES_MIME_TYPE})
+                return self._workspace.presentation(entry['id']).to_json()
+        return FakeRequest(self._workspace.state, 'slides.presentations.create', body, handler)
+
+    def batchUpdate(self, presentationId: str, body: dict, **kwargs):
+        def handler():
+            with self._workspace.lock:
+                presentation = self._workspace.presentation(presentationId)
+                required = (body.get('writeControl') or {}).get('requiredRevisionId')
+                if required and required != presentation.revision_id:
+                    raise_http_error(400, 'The presentation was modified since the required revision.')
+                # batchUpdate is atomic: apply to a copy and only keep it if every request succeeds.
+                working = copy.deepcopy(presentation)
+                replies = working.apply(body.get('requests', []))
+                working.revision_id = uuid.uuid4().hex[:20]
+                self._workspace.presentations[presentationId] = working
+                return {'presentationId': presentationId, 'replies': replies,
+                        'writeControl': {'requiredRevisionId': working.revision_id}}
+        return FakeRequest(self._workspace.state, 'slides.presentations.batchUpdate', body, handler)
+
+    def pages(self):
+        return _PagesResource(self._workspace)
+
+class FakeSlidesService:
+    """Stand-in for build('slides', 'v1')."""
+
+    def __init__(self, workspace):
+        self._workspace = workspace
+
+    def presentations(self):
+        return _PresentationsResource(self._workspace)
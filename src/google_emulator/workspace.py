@@ -0,0 +1,92 @@
+import copy
+import itertools
+import threading
+import uuid
+from .common import EmulatorState, raise_http_error
+from .docs import DOC_MIME_TYPE, FakeDocsService, FakeDocument
+from .drive import FakeDriveService
+from .slides import SLIDES_MIME_TYPE, FakePresentation, FakeSlidesService
+
+class FakeWorkspace:
+    """Every emulated file, so the Docs, Slides and Drive fakes built on it see the same state.
+
+    One lock guards all of it; each emulated call holds it only while it runs, after its latency.
+    """
+
+    def __init__(self, state: EmulatorState = None):
+        self.state = state or EmulatorState()
+        self.files = {}
+        self.documents = {}
+        self.presentations = {}
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    def new_id(self) -> str:
+        return f'{next(self._ids):04d}{uuid.uuid4().hex[:24]}'
+
+    def add_file(self, metadata: dict, content=None) -> dict:
+        """Adds a Drive file; documents and presentations also get an empty model, or content if given."""
+        file_id = self.new_id()
+        entry = {'kind': 'drive#file', 'id': file_id, 'name': metadata.get('name', 'Untitled'),
+                 'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+                 'parents': list(metadata.get('parents') or ['root']), 'trashed': False,
+                 'appProperties': dict(metadata.get('appProperties') or {}), 'permissions': []}
+        self.files[file_id] = entry
+        if entry['mimeType'] == DOC_MIME_TYPE:
+            self.documents[file_id] = content or FakeDocument(file_id, entry['name'])
+            self.documents[file_id].document_id = file_id
+        elif entry['mimeType'] == SLIDES_MIME_TYPE:
+            self.presentations[file_id] = content or FakePresentation(file_id, entry['name'])
+            self.presentations[file_id].presentation_id = file_id
+        return entry
+
+    def copy_file(self, file_id: str, metadata: dict) -> dict:
+        source = self.file(file_id)
+        content = self.documents.get(file_id) or self.presentations.get(file_id)
+        merged = {'name': f"Copy of {source['name']}", 'mimeType': source['mimeType'], 'parents': source['parents']}
+        merged.update(metadata or {})
+        entry = self.add_file(merged, copy.deepcopy(content) if content is not None else None)
+        if content is not None:
+            (self.documents.get(entry['id']) or self.presentations[entry['id']]).title = entry['name']
+        return entry
+
+    def file(self, file_id: str) -> dict:
+        entry = self.files.get(file_id)
+        if entry is None:
+            raise_http_error(404, f'File not found: {file_id}.')
+        return entry
+
+    def document(self, document_id: str) -> FakeDocument:
+        doc = self.documents.get(document_id)
+        if doc is None:
+            raise_http_error(404, f'Requested entity was not found: {document_id}.')
+        return doc
+
+    def presentation(self, presentation_id: str) -> FakePresentation:
+        presentation = self.presentations.get(presentation_id)
+        if presentation is None:
+            raise_http_error(404, f'Requested entity was not found: {presentation_id}.')
+        return presentation
+
+    def new_document(self, title: str = 'Untitled document') -> str:
+        """Creates an empty document directly, without logging an API call."""
+        with self.lock:
+            return self.add_file({'name': title, 'mimeType': DOC_MIME_TYPE})['id']
+
+    def new_presentation(self, title: str = 'Untitled presentation', layouts=None) -> str:
+        """Creates a presentation directly, e.g. to use as a template offering only the given layouts."""
+        with self.lock:
+            entry = self.add_file({'name': title, 'mimeType': SLIDES_MIME_TYPE},
+                                  FakePresentation('', title, layouts) if layouts is not None else None)
+            return entry['id']
+
+    def services(self) -> dict:
+        """The {"docs", "slides", "drive"} services dict that the auth helpers return."""
+        return {'docs': FakeDocsService(self), 'slides': FakeSlidesService(self), 'drive': FakeDriveService(self)}
+
+def get_services_with_emulator(state: EmulatorState = None) -> dict:
+    """Returns Docs, Slides and Drive services backed by a new in-memory workspace, like the auth helpers.
+
+    Without a state, latency and error rate are read from the environment.
+    """
+    return FakeWorkspace(state or EmulatorState.from_env()).services()
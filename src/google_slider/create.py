@@ -72,8 +72,11 @@ def create_presentation_from_markdown(services, markdown_file, drive_folder_id=N
         slides_service = services["slides"]
         drive_service = services["drive"]
 
+        # The deck is created directly in the target folder, so it never needs to be moved.
         if template_id:
             body = {'name': presentation_title}
+            if drive_folder_id:
+                body['parents'] = [drive_folder_id]
             presentation = drive_service.files().copy(fileId=template_id, body=body).execute()
             presentation_id = presentation.get('id')
             presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
@@ -90,35 +93,32 @@ def create_presentation_from_markdown(services, markdown_file, drive_folder_id=N
                     presentationId=presentation_id, body={'requests': requests}
                 ).execute()
         else:
-            body = {"title": presentation_title}
-            presentation = (
-                slides_service.presentations().create(body=body).execute()
-            )
+            if drive_folder_id:
+                body = {'name': presentation_title, 'mimeType': 'application/vnd.google-apps.presentation', 'parents': [drive_folder_id]}
+                file = drive_service.files().create(body=body, fields='id').execute()
+                presentation = slides_service.presentations().get(presentationId=file.get('id')).execute()
+            else:
+                body = {"title": presentation_title}
+                presentation = (
+                    slides_service.presentations().create(body=body).execute()
+                )
             presentation_id = presentation.get('presentationId')
             requests = [
                 {
                     'deleteObject': {
-                        'objectId': presentation.get('slides')[0].get('objectId')
+                        'objectId': slide.get('objectId')
                     }
                 }
+                for slide in presentation.get('slides', [])[:1]
             ]
-            slides_service.presentations().batchUpdate(
-                presentationId=presentation_id, body={'requests': requests}
-            ).execute()
+            if requests:
+                slides_service.presentations().batchUpdate(
+                    presentationId=presentation_id, body={'requests': requests}
+                ).execute()
 
         
         print(f"Created presentation with ID: {presentation_id}")
 
-        if drive_folder_id:
-            file = drive_service.files().get(fileId=presentation_id, fields='parents').execute()
-            previous_parents = ",".join(file.get('parents'))
-            drive_service.files().update(
-                fileId=presentation_id,
-                addParents=drive_folder_id,
-                removeParents=previous_parents,
-                fields='id, parents'
-            ).execute()
-
         slide_index = 0
         for i, slide_content in enumerate(slides_content):
             slide_content = slide_content.strip()
@@ -1,7 +1,12 @@
+import asyncio
+import contextlib
+import functools
+import inspect
 import os
 import sys
 import tempfile
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Dynamic sys.path Correction ---
 # Calculate the repository root (the 'code' directory) by going up two levels.
@@ -11,27 +16,49 @@ _repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')
 # Add the repository root to the Python path if it's not already there.
 if _repo_root not in sys.path:
     sys.path.insert(0, _repo_root)
+# Top-level modules under src/ (e.g. quota) are imported the same way the CLI imports them.
+_src_dir = os.path.join(_repo_root, 'src')
+if _src_dir not in sys.path:
+    sys.path.insert(1, _src_dir)
 # --- End Correction ---
 
 from fastmcp import FastMCP
 
-from src.auth import get_services_with_oauth
+from src.auth import oauth_service_registry
+from src.google_emulator import get_services_with_emulator
 from src.google_docs.write import write_to_google_doc
 from src.google_docs.append import append_to_google_doc
 from src.google_docs.clear import clear_google_doc
 from src.google_docs.replace import replace_markdown_placeholders
 from src.google_docs.read import read_google_doc
 from src.google_slider.create import create_presentation_from_markdown
+from src.google_docs.plan_cache import plan_cache_stats
+from metrics import metrics_snapshot, prometheus_text, run_tool
+from quota import quota_stats
 
 mcp = FastMCP("Google Office Tool 🚀")
 
 # --- Helper function for authentication ---
+# One registry per (credentials, token) path pair, kept for the life of the server process.
+_service_registries = {}
+# When set, tools run against one in-memory fake of the Google APIs instead, e.g. for offline
+# tests; its documents last as long as the server process.
+EMULATOR_ENV_VAR = 'GOOGLE_OFFICE_EMULATOR'
+_emulated_services = get_services_with_emulator() if os.environ.get(EMULATOR_ENV_VAR) else None
+
 def get_services():
     """
     Helper to get authenticated Google services using OAuth 2.0.
     It uses dynamic path calculation to locate the token file and reads
     credentials from a hardcoded path, making it suitable for open-source distribution.
+
+    Services come from a process-lifetime registry: each one is built on first use and
+    reused by later tool calls until the token file changes. With GOOGLE_OFFICE_EMULATOR set,
+    no credentials are read and the emulated services are returned instead.
     """
+    if _emulated_services is not None:
+        return _emulated_services
+
     # --- Dynamic Path Calculation ---
     # The root of the repository is two levels up from this script's directory.
     # (src/mcp-server/ -> src/ -> /)
@@ -52,11 +79,58 @@ def get_services():
     if not os.path.exists(creds_path):
         raise ValueError(f"Credential file not found at: {creds_path}. Please make sure the file exists.")
 
-    return get_services_with_oauth(creds_path, token_path)
+    registry = _service_registries.get((creds_path, token_path))
+    if registry is None:
+        registry = _service_registries.setdefault((creds_path, token_path), oauth_service_registry(creds_path, token_path))
+    return registry.services()
+
+# --- Concurrency ---
+# Tool bodies are blocking Google API calls, so they run on a bounded worker pool instead of
+# the event loop. Writes to the same document are serialized; everything else runs in parallel.
+MAX_TOOL_WORKERS = int(os.environ.get('MCP_TOOL_WORKERS', '8'))
+_tool_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix='mcp-tool')
+# document_id -> [lock, number of calls holding or waiting for it]
+_document_locks = {}
+
+@contextlib.asynccontextmanager
+async def _document_lock(document_id: str):
+    # Only used from the event loop thread, so the dict needs no extra locking.
+    entry = _document_locks.setdefault(document_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _document_locks[document_id]
+
+def runs_in_pool(document_arg: str = None):
+    """Turns a blocking tool into an async one that runs on the worker pool.
+
+    When `document_arg` names the tool's document ID parameter, calls for the same document
+    wait for each other on an asyncio lock, so queued writes do not tie up pool workers.
+    Each call is timed and its API calls are attributed to it in the metrics.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            call = functools.partial(run_tool, func.__name__, func, *args, **kwargs)
+            if document_arg is None:
+                return await loop.run_in_executor(_tool_executor, call)
+            document_id = signature.bind(*args, **kwargs).arguments[document_arg]
+            async with _document_lock(document_id):
+                return await loop.run_in_executor(_tool_executor, call)
+        return wrapper
+    return decorator
 
 # --- MCP Tools ---
 
 @mcp.tool(tags=["doc"])
+@runs_in_pool()
 def create_google_doc_from_markdown(
     markdown_content: str,
     title: str,
@@ -100,13 +174,16 @@ def create_google_doc_from_markdown(
 
 
 @mcp.tool(tags=["doc"])
+@runs_in_pool(document_arg="document_id")
 def overwrite_google_doc(
     document_id: str,
     markdown_content: str
 ) -> dict:
     """
-    Overwrites an existing Google Doc with new markdown content. 
-    It clears the document first and then writes the new content.
+    Overwrites an existing Google Doc with new markdown content.
+    Only the blocks that differ from the previous content are deleted and rewritten;
+    unchanged blocks are left untouched, and a document whose blocks were not written
+    by this tool is rewritten in full.
 
     Args:
         document_id: The ID of the existing document to overwrite.
@@ -128,13 +205,14 @@ def overwrite_google_doc(
         if os.path.exists(default_logo):
             header_image_path = default_logo
 
-        # By passing document_id, write_to_google_doc will clear it and then write the content
+        # By passing document_id with incremental=True, write_to_google_doc only rewrites the changed blocks
         result = write_to_google_doc(
             docs_service=services["docs"],
             drive_service=services["drive"],
             markdown_content=markdown_content,
             document_id=document_id,
-            header_image_path=header_image_path
+            header_image_path=header_image_path,
+            incremental=True
         )
         return result
 
@@ -143,6 +221,7 @@ def overwrite_google_doc(
 
 
 @mcp.tool(tags=["doc"])
+@runs_in_pool(document_arg="document_id")
 def append_content_to_google_doc(
     document_id: str,
     markdown_content: str
@@ -170,6 +249,7 @@ def append_content_to_google_doc(
 
 
 @mcp.tool(tags=["doc"])
+@runs_in_pool(document_arg="document_id")
 def clear_google_doc_content(document_id: str) -> dict:
     """
     Clears all content from a Google Doc.
@@ -192,13 +272,14 @@ def clear_google_doc_content(document_id: str) -> dict:
 
 
 @mcp.tool(tags=["doc"])
+@runs_in_pool(document_arg="document_id")
 def replace_placeholders_in_google_doc(
     document_id: str,
     placeholder: str,
     markdown_content: str
 ) -> dict:
     """
-    Replaces a placeholder in a Google Doc with markdown content.
+    Replaces every occurrence of a placeholder in a Google Doc with markdown content.
 
     Args:
         document_id: The ID of the document to modify.
@@ -222,6 +303,36 @@ def replace_placeholders_in_google_doc(
 
 
 @mcp.tool(tags=["doc"])
+@runs_in_pool(document_arg="document_id")
+def replace_many_placeholders_in_google_doc(
+    document_id: str,
+    replacements: dict[str, str]
+) -> dict:
+    """
+    Replaces every occurrence of several placeholders in a Google Doc in a single pass.
+
+    Args:
+        document_id: The ID of the document to modify.
+        replacements: Maps each placeholder (e.g., '{{my_placeholder}}') to the markdown content to insert.
+
+    Returns:
+        A dictionary containing the status of the operation and the number of
+        occurrences replaced for each placeholder.
+    """
+    try:
+        services = get_services()
+        result = replace_markdown_placeholders(
+            docs_service=services["docs"],
+            document_id=document_id,
+            replacements=replacements
+        )
+        return result
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@mcp.tool(tags=["doc"])
+@runs_in_pool()
 def read_google_doc_content(document_id: str) -> dict:
     """
     Reads the text content of a Google Doc.
@@ -244,6 +355,7 @@ def read_google_doc_content(document_id: str) -> dict:
 
 
 @mcp.tool(tags=["slider"])
+@runs_in_pool()
 def create_google_slides_presentation(
     markdown_content: str,
     title: str = None,
@@ -294,5 +406,24 @@ def create_google_slides_presentation(
             os.remove(temp_file_path)
         return {"status": "error", "message": str(e)}
 
+@mcp.tool(tags=["metrics"])
+def get_metrics(output_format: str = "json") -> dict:
+    """
+    Reports the Google API calls and tool calls made since the server started.
+
+    Args:
+        output_format: "json" for per-tool and per-method counts, statuses, requests, payload bytes and
+            p50/p99 latencies, or "prometheus" for the same counters and histograms in the
+            Prometheus text format.
+
+    Returns:
+        A dictionary containing the status and the metrics, with plan cache and quota statistics.
+    """
+    if output_format == "prometheus":
+        return {"status": "success", "metrics": prometheus_text()}
+    if output_format != "json":
+        return {"status": "error", "message": f"Unknown output_format: {output_format}. Use 'json' or 'prometheus'."}
+    return {"status": "success", "metrics": metrics_snapshot(), "plan_cache": plan_cache_stats(), "quota": quota_stats()}
+
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
@@ -1,6 +1,13 @@
 import asyncio
 import os
 from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport
+
+# Set GOOGLE_OFFICE_EMULATOR=1 to run against the server's in-memory fake of the Google APIs,
+# with no credentials and no pauses. MCP_TEST_FOLDER_ID puts the test document in a Drive folder.
+EMULATED = bool(os.environ.get('GOOGLE_OFFICE_EMULATOR'))
+FOLDER_ID = os.environ.get('MCP_TEST_FOLDER_ID')
+PAUSE = 0 if EMULATED else 2
 
 async def main():
     """Connects to the local STDIO MCP server and tests the 'doc' tools."""
@@ -28,19 +35,17 @@ My placeholder is: {{placeholder}}
     replacement_markdown = "**REPLACED**"
 
     try:
-        async with Client(server_script_path) as client:
+        # The server is started with a minimal environment, so the emulator switch is passed on explicitly.
+        env = {'GOOGLE_OFFICE_EMULATOR': '1'} if EMULATED else None
+        async with Client(PythonStdioTransport(server_script_path, env=env)) as client:
             print("Successfully connected to server.")
 
             # --- 1. Create the initial document ---
             print("\n--- 1. Creating initial document ---")
-            create_result = await client.call_tool(
-                "create_google_doc_from_markdown",
-                arguments={
-                    "title": "MCP Full Test Document",
-                    "markdown_content": initial_markdown,
-                    "folder_id": "1rLrDv-BO_Pz-5UZTeJOKU56iNkLP2fJx",
-                },
-            )
+            create_arguments = {"title": "MCP Full Test Document", "markdown_content": initial_markdown}
+            if FOLDER_ID:
+                create_arguments["folder_id"] = FOLDER_ID
+            create_result = await client.call_tool("create_google_doc_from_markdown", arguments=create_arguments)
             print("Create response:", create_result.data)
             document_id = create_result.data.get("document_id")
 
@@ -50,7 +55,7 @@ My placeholder is: {{placeholder}}
 
             print(f"Document created with ID: {document_id}")
             # Give Google's API a moment to process
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 2. Read the initial content ---
             print("\n--- 2. Reading initial content ---")
@@ -58,7 +63,7 @@ My placeholder is: {{placeholder}}
                 "read_google_doc_content", arguments={"document_id": document_id}
             )
             print("Read response 1:", read_result_1.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 3. Append content to the document ---
             print("\n--- 3. Appending content ---")
@@ -70,7 +75,7 @@ My placeholder is: {{placeholder}}
                 },
             )
             print("Append response:", append_result.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 4. Replace the placeholder ---
             print("\n--- 4. Replacing placeholder ---")
@@ -83,7 +88,7 @@ My placeholder is: {{placeholder}}
                 },
             )
             print("Replace response:", replace_result.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 5. Read the final content ---
             # --- 5. Reading final content ---
@@ -91,7 +96,7 @@ My placeholder is: {{placeholder}}
                 "read_google_doc_content", arguments={"document_id": document_id}
             )
             print("Read response 2:", read_result_2.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 6. Overwriting the document ---
             print("\n--- 6. Overwriting the document ---")
@@ -101,14 +106,14 @@ My placeholder is: {{placeholder}}
                 arguments={"document_id": document_id, "markdown_content": overwrite_md}
             )
             print("Overwrite response:", overwrite_result.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 7. Reading overwritten content ---
             read_result_3 = await client.call_tool(
                 "read_google_doc_content", arguments={"document_id": document_id}
             )
             print("Read response 3:", read_result_3.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 8. Clearing the document ---
             print("\n--- 8. Clearing the document ---")
@@ -116,7 +121,7 @@ My placeholder is: {{placeholder}}
                 "clear_google_doc_content", arguments={"document_id": document_id}
             )
             print("Clear response:", clear_result.data)
-            await asyncio.sleep(2)
+            await asyncio.sleep(PAUSE)
 
             # --- 9. Final read to confirm clearance ---
             print("\n--- 9. Final read to confirm clearance ---")
@@ -125,6 +130,13 @@ My placeholder is: {{placeholder}}
             )
             print("Read response 4:", read_result_final.data)
 
+            # --- 10. API call metrics of the run ---
+            print("\n--- 10. Reading metrics ---")
+            metrics_result = await client.call_tool("get_metrics", arguments={})
+            for tool in metrics_result.data.get("metrics", {}).get("tools", []):
+                print(f"{tool['tool']}: {tool['count']} calls, {tool['api_calls']} API calls, "
+                      f"p50 {tool['p50'] * 1000:.1f} ms, p99 {tool['p99'] * 1000:.1f} ms")
+
     except Exception as e:
         print(f"\nAn unexpected error occurred: {e}")
 
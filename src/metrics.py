@@ -0,0 +1,208 @@
+import bisect
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from googleapiclient.errors import HttpError
+
+# Upper bounds in seconds of the latency histogram buckets, as in Prometheus' defaults
+# extended to the tens of seconds a large batchUpdate or a backed-off tool call can take.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# p50 and p99 are computed from the most recent samples of each series.
+SAMPLE_WINDOW = 1024
+
+class Histogram:
+    """Cumulative latency buckets plus a window of recent samples for percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self) -> dict:
+        return {"count": self.count, "seconds_total": round(self.sum, 6),
+                "p50": round(self.percentile(0.5), 6), "p99": round(self.percentile(0.99), 6)}
+
+class _ApiSeries:
+    def __init__(self):
+        self.statuses = {}
+        self.requests = 0
+        self.payload_bytes = 0
+        self.latency = Histogram()
+
+class _ToolSeries:
+    def __init__(self):
+        self.statuses = {}
+        self.api_calls = 0
+        self.latency = Histogram()
+
+_api = {}
+_tools = {}
+_lock = threading.Lock()
+# Name of the MCP tool running in the current context, if any.
+_current_tool = contextvars.ContextVar('current_tool', default=None)
+
+def _payload(body):
+    """Size in bytes and number of batchUpdate requests of a request body (a dict or serialized JSON).
+
+    A list stands for the bodies of the calls in a batch request.
+    """
+    if body is None:
+        return 0, 0
+    if isinstance(body, list):
+        return sum(_payload(item)[0] for item in body), 0
+    if isinstance(body, (str, bytes)):
+        encoded = body.encode('utf-8') if isinstance(body, str) else body
+        if b'"requests"' not in encoded:
+            return len(encoded), 0
+        try:
+            body = json.loads(encoded)
+        except ValueError:
+            return len(encoded), 0
+        size = len(encoded)
+    else:
+        size = len(json.dumps(body, ensure_ascii=False).encode('utf-8'))
+    requests = body.get('requests') if isinstance(body, dict) else None
+    return size, len(requests) if isinstance(requests, list) else 0
+
+def record_call(method: str, status: str, seconds: float, body=None, requests: int = None):
+    """Records one HTTP call to method ('docs.documents.batchUpdate') under the current tool."""
+    payload_bytes, counted = _payload(body)
+    api = method.split('.')[0]
+    tool = _current_tool.get() or ''
+    with _lock:
+        series = _api.get((tool, api, method))
+        if series is None:
+            series = _api[(tool, api, method)] = _ApiSeries()
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+        series.requests += counted if requests is None else requests
+        series.payload_bytes += payload_bytes
+        series.latency.observe(seconds)
+        if tool:
+            _tool_series(tool).api_calls += 1
+
+@contextmanager
+def timed_call(method: str, body=None, requests: int = None):
+    """Times the HTTP call made inside the block and records it with its status.
+
+    The status is '200' on success, the HTTP status of an HttpError, or 'error' for
+    anything else, such as a timeout.
+    """
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        yield
+        status = '200'
+    except HttpError as err:
+        status = str(err.resp.status)
+        raise
+    finally:
+        record_call(method, status, time.perf_counter() - started, body, requests)
+
+def _tool_series(tool: str) -> _ToolSeries:
+    series = _tools.get(tool)
+    if series is None:
+        series = _tools[tool] = _ToolSeries()
+    return series
+
+def run_tool(tool: str, func, *args, **kwargs):
+    """Calls func as the MCP tool named tool, attributing the API calls it makes to the tool.
+
+    A tool counts as failed if it raises or returns {"status": "error", ...}.
+    """
+    token = _current_tool.set(tool)
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        result = func(*args, **kwargs)
+        if not (isinstance(result, dict) and result.get('status') == 'error'):
+            status = 'success'
+        return result
+    finally:
+        seconds = time.perf_counter() - started
+        _current_tool.reset(token)
+        with _lock:
+            series = _tool_series(tool)
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+            series.latency.observe(seconds)
+
+def metrics_snapshot() -> dict:
+    """Per-tool and per-method call counts, statuses, requests, payload bytes and p50/p99 latency."""
+    with _lock:
+        api_calls = [
+            {"tool": tool, "api": api, "method": method, "statuses": dict(series.statuses),
+             "requests": series.requests, "payload_bytes": series.payload_bytes, **series.latency.summary()}
+            for (tool, api, method), series in sorted(_api.items())
+        ]
+        tools = [
+            {"tool": tool, "statuses": dict(series.statuses), "api_calls": series.api_calls, **series.latency.summary()}
+            for tool, series in sorted(_tools.items())
+        ]
+    return {"tools": tools, "api_calls": api_calls}
+
+def reset_metrics():
+    with _lock:
+        _api.clear()
+        _tools.clear()
+
+def _labels(**labels) -> str:
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+def _histogram_lines(name: str, histogram: Histogram, **labels) -> list:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), histogram.counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{_labels(**labels, le=le)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {histogram.sum}')
+    lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
+    return lines
+
+def prometheus_text() -> str:
+    """The metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        lines += ['# HELP google_api_calls_total HTTP calls to Google APIs, including retries.',
+                  '# TYPE google_api_calls_total counter']
+        for (tool, api, method), series in sorted(_api.items()):
+            for status, count in sorted(series.statuses.items()):
+                lines.append(f'google_api_calls_total{_labels(tool=tool, api=api, method=method, status=status)} {count}')
+        lines += ['# HELP google_api_requests_total batchUpdate requests, or calls in a Drive batch, sent to Google APIs.',
+                  '# TYPE google_api_requests_total counter']
+        for (tool, api, method), series in sorted(_api.items()):
+            lines.append(f'google_api_requests_total{_labels(tool=tool, api=api, method=method)} {series.requests}')
+        lines += ['# HELP google_api_payload_bytes_total Bytes of request bodies sent to Google APIs.',
+                  '# TYPE google_api_payload_bytes_total counter']
+        for (tool, api, method), series in sorted(_api.items()):
+            lines.append(f'google_api_payload_bytes_total{_labels(tool=tool, api=api, method=method)} {series.payload_bytes}')
+        lines += ['# HELP google_api_call_seconds Latency of HTTP calls to Google APIs.',
+                  '# TYPE google_api_call_seconds histogram']
+        for (tool, api, method), series in sorted(_api.items()):
+            lines += _histogram_lines('google_api_call_seconds', series.latency, tool=tool, api=api, method=method)
+        lines += ['# HELP mcp_tool_calls_total MCP tool calls by outcome.',
+                  '# TYPE mcp_tool_calls_total counter']
+        for tool, series in sorted(_tools.items()):
+            for status, count in sorted(series.statuses.items()):
+                lines.append(f'mcp_tool_calls_total{_labels(tool=tool, status=status)} {count}')
+        lines += ['# HELP mcp_tool_seconds Latency of MCP tool calls.',
+                  '# TYPE mcp_tool_seconds histogram']
+        for tool, series in sorted(_tools.items()):
+            lines += _histogram_lines('mcp_tool_seconds', series.latency, tool=tool)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,219 @@
+import contextvars
+import functools
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from metrics import timed_call
+
+# Default per-user quotas in requests per minute. Every call made by this process draws from
+# the bucket for its API and kind, so the process as a whole stays under the quota no matter
+# how many tool calls run at once. Raise them with configure_quota() if your project has a
+# larger allocation.
+DEFAULT_QUOTAS = {
+    ("docs", "read"): 300,
+    ("docs", "write"): 60,
+    ("slides", "read"): 600,
+    ("slides", "write"): 60,
+    ("drive", "read"): 12000,
+    ("drive", "write"): 12000,
+}
+
+# A rate-limited call was rejected before it ran, so any call can be sent again.
+RATE_LIMIT_STATUS = 429
+# 403 is only retried for these reasons; any other 403 is a real permission error.
+RETRYABLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# A server error leaves it unknown whether the call ran, so only idempotent calls are sent again.
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+
+MAX_RETRIES = 5
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 32.0
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` calls and refills at `capacity` per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.seconds_waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes one token, sleeping until one is available. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.seconds_waited += waited
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_stats = {"calls": 0, "retries": 0, "seconds_throttled": 0.0, "seconds_backed_off": 0.0}
+_stats_lock = threading.Lock()
+# Counter of the innermost count_calls() block in the current context, if any.
+_call_counter = contextvars.ContextVar('api_call_counter', default=None)
+
+def configure_quota(api: str, kind: str, per_minute: float):
+    """Sets the requests-per-minute budget for one API ('docs', 'slides', 'drive') and kind ('read', 'write')."""
+    with _buckets_lock:
+        DEFAULT_QUOTAS[(api, kind)] = per_minute
+        _buckets[(api, kind)] = TokenBucket(per_minute)
+
+def get_bucket(api: str, kind: str):
+    """Returns the shared bucket for an API and kind, or None for APIs without a quota entry."""
+    key = (api, kind)
+    with _buckets_lock:
+        if key not in _buckets and key in DEFAULT_QUOTAS:
+            _buckets[key] = TokenBucket(DEFAULT_QUOTAS[key])
+        return _buckets.get(key)
+
+def quota_stats() -> dict:
+    """Process-wide counts of calls, retries and time spent throttled or backing off."""
+    with _stats_lock:
+        return dict(_stats)
+
+class CallCounter:
+    def __init__(self):
+        self.calls = 0
+
+@contextmanager
+def count_calls():
+    """Counts the API call attempts made inside the block, including retries.
+
+    The count follows the context, not the thread: work handed to another thread with
+    contextvars.copy_context().run is counted too.
+    """
+    counter = CallCounter()
+    token = _call_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _call_counter.reset(token)
+
+def note_call():
+    """Counts one HTTP call in the process-wide stats and the active count_calls() block."""
+    _record(calls=1)
+    counter = _call_counter.get()
+    if counter is not None:
+        counter.calls += 1
+
+def _record(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+class UncertainWriteError(HttpError):
+    """A write was retried after a server error and the retry was rejected because the revision moved on.
+
+    The first attempt may have been applied before the server error, or another editor may
+    have written in between: the document has to be read again to decide.
+    """
+
+def _error_details(err: HttpError) -> tuple:
+    """The reasons and message of the JSON error body of err."""
+    try:
+        error = json.loads(err.content.decode('utf-8')).get('error', {})
+    except (ValueError, AttributeError):
+        return [], ''
+    return [item.get('reason') for item in error.get('errors', [])], error.get('message', '')
+
+def is_rate_limited(err: HttpError) -> bool:
+    status = err.resp.status
+    if status == RATE_LIMIT_STATUS:
+        return True
+    return status == 403 and any(reason in RETRYABLE_REASONS for reason in _error_details(err)[0])
+
+def is_revision_mismatch(err: HttpError) -> bool:
+    """True for the 400 a batchUpdate gets when its writeControl.requiredRevisionId is stale."""
+    return err.resp.status == 400 and 'revision' in _error_details(err)[1].lower()
+
+def is_idempotent(http_method: str, method_id: str, body=None) -> bool:
+    """True if sending the call twice has the same effect as sending it once.
+
+    That holds for GETs, and for batchUpdates pinned with writeControl.requiredRevisionId: a
+    second copy of a write that did land is rejected because the revision has moved on.
+    targetRevisionId does not qualify, as it merges the write into later revisions.
+    """
+    if http_method == 'GET':
+        return True
+    if not (method_id or '').endswith('.batchUpdate') or not body:
+        return False
+    if isinstance(body, (str, bytes)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return False
+    write_control = body.get('writeControl') if isinstance(body, dict) else None
+    return bool(isinstance(write_control, dict) and write_control.get('requiredRevisionId'))
+
+def is_retryable(err: HttpError, idempotent: bool = False) -> bool:
+    """Rate-limit errors are always retryable; server errors only for idempotent calls."""
+    if is_rate_limited(err):
+        return True
+    return idempotent and err.resp.status in SERVER_ERROR_STATUSES
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """Exponential backoff with full jitter, honouring a Retry-After header when the server sends one."""
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return random.uniform(0, min(MAX_BACKOFF, INITIAL_BACKOFF * 2 ** attempt))
+
+def call_with_retries(send, bucket: TokenBucket = None, method: str = 'unknown', body=None, idempotent: bool = False):
+    """Runs send(), waiting for a bucket token before each attempt and retrying rate-limit errors.
+
+    Server errors are retried only when idempotent is set. If a retry after a server error is
+    rejected as a revision mismatch, UncertainWriteError is raised instead of the 400.
+    Every attempt is recorded in the metrics under method, with the size of body.
+    """
+    attempt = 0
+    server_error = False
+    while True:
+        if bucket is not None:
+            _record(seconds_throttled=bucket.acquire())
+        note_call()
+        try:
+            with timed_call(method, body):
+                return send()
+        except HttpError as err:
+            if server_error and is_revision_mismatch(err):
+                raise UncertainWriteError(err.resp, err.content, uri=err.uri) from err
+            if attempt >= MAX_RETRIES or not is_retryable(err, idempotent):
+                raise
+            server_error = server_error or err.resp.status in SERVER_ERROR_STATUSES
+            delay = backoff_delay(attempt, err.resp.get('retry-after'))
+            _record(retries=1, seconds_backed_off=delay)
+            time.sleep(delay)
+            attempt += 1
+
+class QuotaAwareHttpRequest(HttpRequest):
+    """HttpRequest that waits for quota before each attempt and retries rate-limit errors.
+
+    Server errors are retried for idempotent calls only (see is_idempotent).
+
+    Pass it to googleapiclient.discovery.build as requestBuilder; every request built by that
+    service, including Slides and Drive calls, then goes through the shared buckets.
+    """
+
+    def execute(self, http=None, num_retries=0):
+        api = (self.methodId or '').split('.')[0]
+        bucket = get_bucket(api, 'read' if self.method == 'GET' else 'write')
+        send = functools.partial(super().execute, http=http, num_retries=num_retries)
+        idempotent = is_idempotent(self.method, self.methodId, self.body)
+        return call_with_retries(send, bucket, self.methodId or 'unknown', self.body, idempotent)
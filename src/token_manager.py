@@ -0,0 +1,168 @@
+import datetime
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are still serialized within the process.
+    fcntl = None
+
+# Refresh this long before the access token expires.
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+# How often the refresh thread re-checks when the token has no expiry or a refresh failed.
+RETRY_INTERVAL = 60.0
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock shared by every process that uses the same token file."""
+    with open(path, 'a') as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+def write_atomically(path: str, content: str):
+    """Writes to a temporary file next to `path` and renames it over `path`, so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.token-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as handle:
+            handle.write(content)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+class CredentialManager:
+    """Keeps OAuth user credentials in memory and refreshes them ahead of expiry.
+
+    The first call to credentials() loads token.json, refreshing it or running the consent
+    flow if needed. start() launches a daemon thread that refreshes the token shortly before
+    it expires, so API calls never wait on the token endpoint. Refreshes take an exclusive
+    lock on `<token_path>.lock` and re-read the file first: when several processes share a
+    token, the first one refreshes and the others adopt its result instead of refreshing too.
+    The token file is always replaced atomically.
+    """
+
+    def __init__(self, client_secrets_path: str, token_path: str, scopes: list, refresh_margin=REFRESH_MARGIN):
+        self.client_secrets_path = client_secrets_path
+        self.token_path = token_path
+        self.lock_path = token_path + '.lock'
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+        self._creds = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def identity(self):
+        """Changes only when the credentials belong to a different grant, not on access-token refresh."""
+        creds = self._creds
+        return (creds.client_id, creds.refresh_token) if creds else None
+
+    def credentials(self) -> Credentials:
+        """Returns the in-memory credentials, loading and validating them on first use."""
+        with self._lock:
+            if self._creds is None or self._needs_refresh(self._creds):
+                self._refresh_locked()
+            return self._creds
+
+    def refresh(self):
+        """Refreshes now unless another process already left a fresh token in the file."""
+        with self._lock:
+            self._refresh_locked()
+
+    def start(self):
+        """Starts the background refresh thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._seconds_until_refresh()):
+            try:
+                self.refresh()
+            except Exception:
+                # Leave the current token in place; the request path still refreshes on demand.
+                self._stop.wait(RETRY_INTERVAL)
+
+    def _seconds_until_refresh(self) -> float:
+        creds = self._creds
+        if creds is None or creds.expiry is None:
+            return RETRY_INTERVAL
+        due = creds.expiry - self.refresh_margin - _utcnow()
+        return max(0.0, due.total_seconds())
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if not creds.token or creds.expiry is None:
+            return not creds.valid
+        return creds.expiry - self.refresh_margin <= _utcnow()
+
+    def _refresh_locked(self):
+        with file_lock(self.lock_path):
+            on_disk = self._read_token_file()
+            if on_disk is not None and not self._needs_refresh(on_disk):
+                self._adopt(on_disk)
+                return
+            creds = on_disk or self._creds
+            if creds and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.client_secrets_path, self.scopes)
+                creds = flow.run_local_server(port=0)
+                print(f"OAuth token has been saved to {self.token_path} for future use.")
+            write_atomically(self.token_path, creds.to_json())
+            self.refreshes += 1
+            self._adopt(creds)
+
+    def _adopt(self, creds: Credentials):
+        """Switches to `creds`, updating the current object in place when it is the same grant."""
+        current = self._creds
+        if current is not None and (current.client_id, current.refresh_token) == (creds.client_id, creds.refresh_token):
+            # Services built with `current` pick up the new access token without being rebuilt.
+            current.token = creds.token
+            current.expiry = creds.expiry
+        else:
+            self._creds = creds
+
+    def _read_token_file(self):
+        if not os.path.exists(self.token_path):
+            return None
+        try:
+            return Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        except ValueError:
+            return None
+
+def _utcnow() -> datetime.datetime:
+    # google-auth stores expiry as a naive UTC datetime.
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_credential_manager(client_secrets_path: str, token_path: str, scopes: list) -> CredentialManager:
+    """Returns the process-wide manager for a token file."""
+    key = os.path.abspath(token_path)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = CredentialManager(client_secrets_path, token_path, scopes)
+        return _managers[key]
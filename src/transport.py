@@ -0,0 +1,113 @@
+import os
+import threading
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = httpx is not None
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_TIMEOUT = 60.0
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+
+# 'httpx' or 'httplib2'; the default is httpx when it is installed.
+TRANSPORT_ENV_VAR = 'GOOGLE_OFFICE_HTTP_TRANSPORT'
+
+class PooledHttp:
+    """httplib2.Http-compatible transport backed by one thread-safe httpx connection pool.
+
+    Every service built on it shares the same keep-alive connections, and with h2 installed
+    concurrent requests to one host are multiplexed over a single HTTP/2 connection.
+    googleapiclient and google-auth only call request(), so they need no changes.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, http2: bool = HTTP2_AVAILABLE,
+                 max_connections: int = MAX_CONNECTIONS, max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.client = httpx.Client(http2=http2, timeout=timeout, limits=limits, follow_redirects=True)
+        self.timeout = timeout
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None, **kwargs):
+        if hasattr(body, 'read'):
+            body = body.read()
+        try:
+            response = self.client.request(method, uri, content=body, headers=headers)
+        except httpx.TimeoutException as err:
+            raise TimeoutError(str(err)) from err
+        except httpx.TransportError as err:
+            # googleapiclient retries ConnectionError, as it does for httplib2's socket errors.
+            raise ConnectionError(str(err)) from err
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # The body is already decoded, so the encoding headers no longer describe it.
+        info.pop('content-encoding', None)
+        info.pop('content-length', None)
+        info['status'] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason_phrase
+        resp.version = 20 if response.http_version == 'HTTP/2' else 11
+        return resp, response.content
+
+    def close(self):
+        self.client.close()
+
+class ThreadLocalHttp:
+    """Fallback when httpx is missing: one keep-alive httplib2.Http per thread, so calls from
+    different threads never share a connection object."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _http(self) -> httplib2.Http:
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = httplib2.Http(timeout=self.timeout)
+        return http
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None, **kwargs):
+        return self._http().request(uri, method, body=body, headers=headers, redirections=redirections,
+                                    connection_type=connection_type, **kwargs)
+
+    def close(self):
+        http = getattr(self._local, 'http', None)
+        if http is not None:
+            http.close()
+
+_shared_transport = None
+_transport_lock = threading.Lock()
+_transport_factory = None
+
+def set_transport_factory(factory):
+    """Plugs in a different transport: `factory()` must return an object with httplib2's request() signature."""
+    global _transport_factory, _shared_transport
+    with _transport_lock:
+        _transport_factory = factory
+        _shared_transport = None
+
+def default_transport():
+    name = os.environ.get(TRANSPORT_ENV_VAR, 'httpx' if httpx is not None else 'httplib2')
+    if name == 'httpx' and httpx is not None:
+        return PooledHttp()
+    return ThreadLocalHttp()
+
+def get_transport():
+    """The process-wide transport shared by every service."""
+    global _shared_transport
+    with _transport_lock:
+        if _shared_transport is None:
+            _shared_transport = (_transport_factory or default_transport)()
+        return _shared_transport
+
+def authorized_http(creds) -> AuthorizedHttp:
+    """Wraps the shared transport with `creds`; pass the result to build() as http."""
+    return AuthorizedHttp(creds, http=get_transport())